@@ -0,0 +1,140 @@
+from typing import List, NamedTuple, Sequence
+
+from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtWidgets import (
+    QCheckBox,
+    QDialog,
+    QDoubleSpinBox,
+    QGridLayout,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QSlider,
+    QVBoxLayout,
+)
+
+
+class AdjustmentParameter(NamedTuple):
+    label: str
+    minimum: float
+    maximum: float
+    default: float
+    decimals: int = 0
+
+
+LEVELS_PARAMETERS = (
+    AdjustmentParameter("Input black:", 0, 253, 0),
+    AdjustmentParameter("Input white:", 2, 255, 255),
+    AdjustmentParameter("Gamma:", 0.1, 9.99, 1.0, 2),
+    AdjustmentParameter("Output black:", 0, 255, 0),
+    AdjustmentParameter("Output white:", 0, 255, 255),
+)
+
+# Output values of a curve going through (0, 0), (64, shadows), (128, midtones), (192, highlights) and (255, 255)
+CURVES_PARAMETERS = (
+    AdjustmentParameter("Shadows:", 0, 255, 64),
+    AdjustmentParameter("Midtones:", 0, 255, 128),
+    AdjustmentParameter("Highlights:", 0, 255, 192),
+)
+
+BRIGHTNESS_CONTRAST_PARAMETERS = (
+    AdjustmentParameter("Brightness:", -150, 150, 0),
+    AdjustmentParameter("Contrast:", -100, 100, 0),
+)
+
+HUE_SATURATION_PARAMETERS = (
+    AdjustmentParameter("Hue:", -180, 180, 0),
+    AdjustmentParameter("Saturation:", -100, 100, 0),
+    AdjustmentParameter("Lightness:", -100, 100, 0),
+)
+
+
+class AdjustmentDialog(QDialog):
+    """A dialog editing numeric parameters of an adjustment, each with a spinbox and a slider"""
+
+    # Emitted when any parameter changes
+    params_changed = pyqtSignal()
+    # Emitted when the user is done changing a parameter (e.g. slider released)
+    params_committed = pyqtSignal()
+
+    def __init__(self, title: str, parameters: Sequence[AdjustmentParameter]):
+        super().__init__()
+        self.setWindowTitle(title)
+        self.setWindowFlag(Qt.WindowType.WindowContextHelpButtonHint, False)
+
+        layout = QHBoxLayout()
+        self.setLayout(layout)
+
+        params_layout = QGridLayout()
+        layout.addLayout(params_layout)
+
+        self._parameters = list(parameters)
+        self._spinboxes: List[QDoubleSpinBox] = []
+        for row, parameter in enumerate(self._parameters):
+            spinbox = self.create_parameter_row(params_layout, row, parameter)
+            self._spinboxes.append(spinbox)
+
+        buttons_layout = QVBoxLayout()
+        layout.addLayout(buttons_layout)
+
+        ok_button = QPushButton("OK")
+        ok_button.clicked.connect(lambda: self.accept())
+        buttons_layout.addWidget(ok_button)
+
+        reset_button = QPushButton("Reset")
+        buttons_layout.addWidget(reset_button)
+
+        def on_reset_clicked():
+            for spinbox, parameter in zip(self._spinboxes, self._parameters):
+                spinbox.setValue(parameter.default)
+            self.params_committed.emit()
+
+        reset_button.clicked.connect(on_reset_clicked)
+
+        self.preview_checkbox = QCheckBox("Preview")
+        self.preview_checkbox.setChecked(True)
+        self.preview_checkbox_toggled = self.preview_checkbox.toggled
+        buttons_layout.addWidget(self.preview_checkbox)
+        buttons_layout.addStretch(1)
+
+    def get_values(self) -> List[float]:
+        return [spinbox.value() for spinbox in self._spinboxes]
+
+    def is_preview_enabled(self):
+        return self.preview_checkbox.isChecked()
+
+    def create_parameter_row(
+        self, layout: QGridLayout, row: int, parameter: AdjustmentParameter
+    ) -> QDoubleSpinBox:
+        # Slider positions are integers, scale them to parameter precision
+        slider_scale = 10**parameter.decimals
+
+        spinbox = QDoubleSpinBox()
+        spinbox.setDecimals(parameter.decimals)
+        spinbox.setRange(parameter.minimum, parameter.maximum)
+        spinbox.setValue(parameter.default)
+
+        slider = QSlider()
+        slider.setOrientation(Qt.Orientation.Horizontal)
+        slider.setRange(
+            round(parameter.minimum * slider_scale),
+            round(parameter.maximum * slider_scale),
+        )
+        slider.setValue(round(parameter.default * slider_scale))
+
+        def on_spinbox_value_change(value):
+            slider.setValue(round(value * slider_scale))
+            self.params_changed.emit()
+
+        def on_slider_move(value):
+            spinbox.setValue(value / slider_scale)
+
+        spinbox.valueChanged.connect(on_spinbox_value_change)
+        slider.sliderMoved.connect(on_slider_move)
+        slider.sliderReleased.connect(self.params_committed.emit)
+        spinbox.editingFinished.connect(self.params_committed.emit)
+
+        layout.addWidget(QLabel(parameter.label), row, 0)
+        layout.addWidget(slider, row, 1)
+        layout.addWidget(spinbox, row, 2)
+        return spinbox
@@ -1,4 +1,4 @@
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtWidgets import (
     QCheckBox,
     QDialog,
@@ -12,6 +12,9 @@ from PyQt6.QtWidgets import (
 
 
 class GaussianBlurDialog(QDialog):
+    # Emitted when the user is done changing the radius (e.g. slider released), unlike blur_radius_changed
+    blur_radius_committed = pyqtSignal()
+
     DEFAULT_RADIUS = 7.2
     MIN_RADIUS = 0.1
     MAX_RADIUS = 400.0
@@ -32,6 +35,8 @@ class GaussianBlurDialog(QDialog):
         layout.addLayout(slider_spinbox_layout)
 
         self.blur_radius_changed = self.spinbox.valueChanged
+        slider.sliderReleased.connect(self.blur_radius_committed.emit)
+        self.spinbox.editingFinished.connect(self.blur_radius_committed.emit)
 
         buttons_layout = QVBoxLayout()
         layout.addLayout(buttons_layout)
@@ -46,6 +51,7 @@ class GaussianBlurDialog(QDialog):
         def on_reset_clicked():
             self.spinbox.setValue(self.DEFAULT_RADIUS)
             slider.setValue(int(self.DEFAULT_RADIUS * 10))
+            self.blur_radius_committed.emit()
 
         self.preview_checkbox = QCheckBox("Preview")
         self.preview_checkbox.setChecked(True)
@@ -58,7 +64,7 @@ class GaussianBlurDialog(QDialog):
         return self.spinbox.value()
 
     def is_preview_enabled(self):
-        return self.preview_checkbox.isEnabled()
+        return self.preview_checkbox.isChecked()
 
     def create_spinbox_layout(self):
         layout = QHBoxLayout()
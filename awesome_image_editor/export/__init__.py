@@ -0,0 +1,38 @@
+from .layers import LayerExportJob, export_layers, get_layers_to_export, render_item
+from .presets import (
+    DEFAULT_EXPORT_PRESETS,
+    ExportOutput,
+    ExportPreset,
+    export_preset,
+    get_export_output_path,
+    get_export_output_size,
+    iter_downscale_cascade,
+)
+from .streaming import (
+    STREAMING_FORMATS,
+    BandWriterProtocol,
+    PNGBandWriter,
+    PPMBandWriter,
+    TIFFBandWriter,
+    export_streaming,
+)
+
+__all__ = (
+    "BandWriterProtocol",
+    "DEFAULT_EXPORT_PRESETS",
+    "ExportOutput",
+    "ExportPreset",
+    "LayerExportJob",
+    "PNGBandWriter",
+    "PPMBandWriter",
+    "STREAMING_FORMATS",
+    "TIFFBandWriter",
+    "export_layers",
+    "export_preset",
+    "export_streaming",
+    "get_export_output_path",
+    "get_export_output_size",
+    "get_layers_to_export",
+    "iter_downscale_cascade",
+    "render_item",
+)
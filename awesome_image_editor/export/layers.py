@@ -0,0 +1,206 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Sequence, Set
+
+from PyQt6.QtCore import QRectF, Qt
+from PyQt6.QtGui import QImage, QPainter, QTransform
+from PyQt6.QtWidgets import QGraphicsItem, QGraphicsScene, QStyleOptionGraphicsItem
+
+from ..filters.stack import render_filter_stack
+from ..model_view.items.group import AIEGroupItem
+from ..model_view.items.image import AIEImageItem
+
+__all__ = (
+    "LayerExportJob",
+    "export_layers",
+    "get_layers_to_export",
+    "get_visible_bounds",
+    "render_item",
+)
+
+# Characters that are not allowed in file names on common file systems
+_INVALID_FILENAME_CHARACTERS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+class LayerExportJob(NamedTuple):
+    filepath: str
+    # Gives the layer image cropped to its bounds, called on a worker thread
+    render: Callable[[], QImage]
+
+
+def get_layers_to_export(scene: QGraphicsScene) -> List[QGraphicsItem]:
+    """
+    Selected layers (a selected group is exported as a whole, including its children),
+    or every visible layer that is not a group if none is selected, in layer tree order (top to bottom)
+    """
+    items = scene.items(order=Qt.SortOrder.DescendingOrder)
+    selected_items = set(scene.selectedItems())
+
+    if len(selected_items) == 0:
+        return [
+            item
+            for item in items
+            if not isinstance(item, AIEGroupItem) and item.isVisible()
+        ]
+
+    def has_selected_ancestor(item: QGraphicsItem):
+        parent_item = item.parentItem()
+        while parent_item is not None:
+            if parent_item in selected_items:
+                return True
+            parent_item = parent_item.parentItem()
+        return False
+
+    return [
+        item
+        for item in items
+        if item in selected_items and not has_selected_ancestor(item)
+    ]
+
+
+def get_visible_bounds(item: QGraphicsItem) -> QRectF:
+    """Bounds of an item and its visible children in item coordinates"""
+    # NOTE: QGraphicsItem.childrenBoundingRect (and so group bounds) includes hidden children
+    rect = QRectF() if isinstance(item, AIEGroupItem) else item.boundingRect()
+    for child_item in item.childItems():
+        if child_item.isVisibleTo(item):
+            rect = rect.united(
+                child_item.mapRectToParent(get_visible_bounds(child_item))
+            )
+    return rect
+
+
+def _paint_item_tree(
+    painter: QPainter,
+    root_item: QGraphicsItem,
+    item: QGraphicsItem,
+    transform: QTransform,
+):
+    item_transform, _ = item.itemTransform(root_item)
+    painter.setTransform(item_transform * transform)
+
+    option = QStyleOptionGraphicsItem()
+    # NOTE: image items only paint tiles in the exposed rect
+    option.exposedRect = item.boundingRect()
+    item.paint(painter, option, None)
+
+    # NOTE: children are sorted back-to-front, and layers are never stacked behind their parent
+    for child_item in item.childItems():
+        if child_item.isVisibleTo(item):
+            _paint_item_tree(painter, root_item, child_item, transform)
+
+
+def render_item(item: QGraphicsItem) -> QImage:
+    """
+    Paint an item and its visible children into an image cropped to their bounds, without rendering the scene.
+    NOTE: items are painted, so this must be called from the GUI thread.
+    """
+    rect = get_visible_bounds(item).toAlignedRect()
+    image = QImage(rect.size(), QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(Qt.GlobalColor.transparent)
+    if image.isNull():
+        return image
+
+    painter = QPainter(image)
+    # Same as AIEGraphicsView
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing, True)
+    _paint_item_tree(
+        painter, item, item, QTransform.fromTranslate(-rect.x(), -rect.y())
+    )
+    painter.end()
+    return image
+
+
+def _crop(image: QImage, image_rect: QRectF, bounds: QRectF) -> QImage:
+    """Part of an image covering `image_rect` that is in `bounds`"""
+    return image.copy(bounds.translated(-image_rect.topLeft()).toAlignedRect())
+
+
+def _get_layer_render(
+    item: QGraphicsItem, filter_max_workers: int
+) -> Callable[[], QImage]:
+    if isinstance(item, AIEImageItem):
+        # Read pixels directly on the worker thread, filter stages already rendered are taken from cache
+        source_key = item.get_pixels_key()
+        load_source_image = item.get_image_loader()
+        filters = item.get_filters()
+        # NOTE: item bounds leave transparent padding out
+        bounds = item.boundingRect()
+        if len(filters) == 0:
+            size = item.get_pixels_size()
+            source_rect = QRectF(0, 0, size.width(), size.height())
+            return lambda: _crop(load_source_image(), source_rect, bounds)
+        return lambda: _crop(
+            *render_filter_stack(
+                source_key,
+                load_source_image,
+                filters,
+                max_workers=filter_max_workers,
+            ),
+            bounds,
+        )
+
+    image = render_item(item)
+    return lambda: image
+
+
+def _get_unique_filename(name: str, image_format: str, used_filenames: Set[str]):
+    stem = _INVALID_FILENAME_CHARACTERS.sub("_", name).strip(" .") or "Layer"
+    filename = f"{stem}.{image_format}"
+
+    number = 2
+    while filename.lower() in used_filenames:
+        filename = f"{stem} {number}.{image_format}"
+        number += 1
+
+    used_filenames.add(filename.lower())
+    return filename
+
+
+def _export_layer(job: LayerExportJob, image_format: str):
+    image = job.render()
+    if not image.save(job.filepath, image_format):
+        raise IOError(f"Failed to write {job.filepath}")
+
+
+def export_layers(
+    items: Sequence[QGraphicsItem],
+    directory: str,
+    image_format: str = "png",
+    max_workers: Optional[int] = None,
+) -> List[str]:
+    """
+    Write each layer to its own image file in `directory`, cropped to its bounds and named after the layer,
+    returns written paths. Groups are exported as a whole, layers with empty bounds are skipped.
+
+    Pixels of image layers are read and encoded on a thread pool, so that exporting many layers
+    is bounded by encoding throughput rather than by rendering.
+    """
+    items = [item for item in items if not get_visible_bounds(item).isEmpty()]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    # NOTE: filters run their own thread pools, share workers among layers exported at once
+    filter_max_workers = max(1, max_workers // max(1, min(max_workers, len(items))))
+
+    used_filenames = set()
+    jobs = []
+    for item in items:
+
+        filename = _get_unique_filename(item.name, image_format, used_filenames)
+        jobs.append(
+            LayerExportJob(
+                str(Path(directory) / filename),
+                _get_layer_render(item, filter_max_workers),
+            )
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        exports = [executor.submit(_export_layer, job, image_format) for job in jobs]
+
+    # Raise the first export error, if any
+    for export in exports:
+        export.result()
+
+    return [job.filepath for job in jobs]
@@ -0,0 +1,198 @@
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from PyQt6.QtCore import QSize, Qt
+from PyQt6.QtGui import QImage, QPainter
+
+from ..file_format import AIEProject
+
+__all__ = (
+    "DEFAULT_EXPORT_PRESETS",
+    "ExportOutput",
+    "ExportPreset",
+    "export_preset",
+    "get_export_output_path",
+    "get_export_output_size",
+    "iter_downscale_cascade",
+)
+
+# Formats that cannot store transparency, transparent pixels are composited over white
+OPAQUE_FORMATS = ("jpg", "jpeg", "bmp", "ppm")
+
+
+class ExportOutput(NamedTuple):
+    # Appended to the base file name, e.g. "@2x"
+    suffix: str
+    # File format, as given to QImage.save
+    format: str
+    # Size relative to the document size
+    scale: float = 1.0
+    # Size the output fits in (keeping aspect ratio), instead of scaling the document, e.g. for thumbnails
+    max_size: Optional[QSize] = None
+    # Encoder quality from 0 to 100, -1 for the format default
+    quality: int = -1
+
+
+class ExportPreset(NamedTuple):
+    name: str
+    outputs: Tuple[ExportOutput, ...]
+
+
+DEFAULT_EXPORT_PRESETS = (
+    ExportPreset(
+        "Web",
+        (
+            ExportOutput("", "png"),
+            ExportOutput("@2x", "png", scale=2.0),
+            ExportOutput("", "webp", quality=90),
+            ExportOutput("@2x", "webp", scale=2.0, quality=90),
+            ExportOutput("", "jpg", quality=90),
+            ExportOutput("_thumbnail", "jpg", max_size=QSize(256, 256), quality=85),
+        ),
+    ),
+    ExportPreset(
+        "Thumbnails",
+        (
+            ExportOutput("_small", "png", max_size=QSize(128, 128)),
+            ExportOutput("_medium", "png", max_size=QSize(512, 512)),
+        ),
+    ),
+)
+
+
+def get_export_output_size(output: ExportOutput, document_size: QSize) -> QSize:
+    if output.max_size is None:
+        return QSize(
+            max(1, round(document_size.width() * output.scale)),
+            max(1, round(document_size.height() * output.scale)),
+        )
+
+    # NOTE: documents smaller than max_size are not upscaled
+    if (
+        document_size.width() <= output.max_size.width()
+        and document_size.height() <= output.max_size.height()
+    ):
+        return QSize(document_size)
+    return document_size.scaled(output.max_size, Qt.AspectRatioMode.KeepAspectRatio)
+
+
+def _halve(image: QImage) -> QImage:
+    return image.scaled(
+        image.width() // 2,
+        image.height() // 2,
+        Qt.AspectRatioMode.IgnoreAspectRatio,
+        Qt.TransformationMode.SmoothTransformation,
+    )
+
+
+def iter_downscale_cascade(
+    image: QImage, sizes: Sequence[QSize]
+) -> Iterator[Tuple[QSize, QImage]]:
+    """
+    Downscale an image to each of `sizes` with high quality, largest first, by halving it repeatedly
+    before a final smooth scale. Halved levels are computed once and shared by all sizes.
+
+    Sizes larger than the image are scaled up from it directly.
+    """
+    # Each level is half the size of the previous one
+    levels = [image]
+
+    unique_sizes = set((size.width(), size.height()) for size in sizes)
+    for width, height in sorted(unique_sizes, key=lambda s: s[0] * s[1], reverse=True):
+        # Smallest level that is not smaller than the target
+        level = next(
+            (
+                level
+                for level in reversed(levels)
+                if level.width() >= width and level.height() >= height
+            ),
+            image,
+        )
+
+        # NOTE: smooth scaling is bilinear, it skips source pixels when shrinking by more than half,
+        # so halve first (which averages 2x2 pixels) as long as the result is still at least the target size
+        while (
+            level is levels[-1]
+            and level.width() // 2 >= width
+            and level.height() // 2 >= height
+        ):
+            level = _halve(level)
+            levels.append(level)
+
+        if level.width() != width or level.height() != height:
+            level = level.scaled(
+                width,
+                height,
+                Qt.AspectRatioMode.IgnoreAspectRatio,
+                Qt.TransformationMode.SmoothTransformation,
+            )
+        yield QSize(width, height), level
+
+
+def _encode(image: QImage, filepath: str, output: ExportOutput):
+    if output.format.lower() in OPAQUE_FORMATS and image.hasAlphaChannel():
+        opaque_image = QImage(image.size(), QImage.Format.Format_RGB32)
+        opaque_image.fill(Qt.GlobalColor.white)
+        painter = QPainter(opaque_image)
+        painter.drawImage(0, 0, image)
+        painter.end()
+        image = opaque_image
+
+    if not image.save(filepath, output.format, output.quality):
+        raise IOError(f"Failed to write {filepath}")
+
+
+def get_export_output_path(base_path: str, output: ExportOutput):
+    return f"{base_path}{output.suffix}.{output.format}"
+
+
+def export_preset(
+    project: AIEProject,
+    preset: ExportPreset,
+    base_path: str,
+    max_workers: Optional[int] = None,
+) -> List[str]:
+    """
+    Write every output of a preset, named after `base_path` (a path without extension), returns written paths.
+
+    The project is rendered once, at the largest output size, smaller outputs are downscaled from it
+    and all outputs are encoded in parallel, while smaller ones are still being downscaled.
+    """
+    document_rect = project.get_graphics_scene().itemsBoundingRect()
+    assert not document_rect.isEmpty(), "Nothing to export"
+    document_size = document_rect.size().toSize()
+
+    output_sizes = [
+        get_export_output_size(output, document_size) for output in preset.outputs
+    ]
+    render_scale = max(
+        max(
+            size.width() / document_rect.width(), size.height() / document_rect.height()
+        )
+        for size in output_sizes
+    )
+    composite = project.render(render_scale)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    output_paths = [
+        get_export_output_path(base_path, output) for output in preset.outputs
+    ]
+    encodings: List[Future] = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for size, image in iter_downscale_cascade(composite, output_sizes):
+            for output, output_size, output_path in zip(
+                preset.outputs, output_sizes, output_paths
+            ):
+                if output_size == size:
+                    encodings.append(
+                        executor.submit(_encode, image, output_path, output)
+                    )
+
+    # Raise the first encoding error, if any
+    for encoding in encodings:
+        encoding.result()
+
+    return output_paths
@@ -0,0 +1,368 @@
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Deque, List, Optional, Protocol, Tuple
+
+import numpy as np
+from PyQt6.QtGui import QImage
+
+from ..file_format import AIEProject
+from ..image_buffer import ARGB32_CHANNEL_ORDER, argb32_premultiplied_view
+from ..tiled_image import TILE_SIZE
+
+__all__ = (
+    "BandWriterProtocol",
+    "PNGBandWriter",
+    "PPMBandWriter",
+    "STREAMING_FORMATS",
+    "TIFFBandWriter",
+    "export_streaming",
+)
+
+# Height of bands rendered and written at once
+STREAMING_BAND_HEIGHT = TILE_SIZE
+
+# Size in bytes of TIFF strips, strips are contiguous so their size only matters to readers
+TIFF_STRIP_SIZE = 1024**2
+
+STREAMING_FORMATS = ("png", "tif", "tiff", "ppm")
+
+
+class BandWriterProtocol(Protocol):
+    """Writes an image file from horizontal bands of pixels (QImage.Format_ARGB32_Premultiplied), top to bottom"""
+
+    def write_band(self, band: QImage):
+        ...
+
+    def close(self):
+        """Finish the file, once all rows were written"""
+        ...
+
+
+def _rgba_rows(band: QImage) -> np.ndarray:
+    """Straight alpha RGBA bytes of band rows, with shape (height, width * 4)"""
+    band = band.convertToFormat(QImage.Format.Format_RGBA8888)
+    bits = band.constBits()
+    bits.setsize(band.sizeInBytes())
+    rows = np.frombuffer(bits, np.uint8).reshape(band.height(), band.bytesPerLine())
+    # NOTE: copy, so that rows do not refer to the converted band once it is released
+    return rows[:, : band.width() * 4].copy()
+
+
+# Largest prime smaller than 65536, modulo of Adler-32 sums
+_ADLER_BASE = 65521
+
+
+def _adler32_combine(adler1: int, adler2: int, length2: int) -> int:
+    """Adler-32 of two concatenated pieces of data from their own Adler-32, as zlib adler32_combine"""
+    remainder = length2 % _ADLER_BASE
+    sum1 = adler1 & 0xFFFF
+    sum2 = (remainder * sum1) % _ADLER_BASE
+    sum1 += (adler2 & 0xFFFF) + _ADLER_BASE - 1
+    sum2 += (adler1 >> 16) + (adler2 >> 16) + _ADLER_BASE - remainder
+    return (sum1 % _ADLER_BASE) | ((sum2 % _ADLER_BASE) << 16)
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + chunk_type
+        + data
+        + struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)))
+    )
+
+
+def _compress_png_band(
+    band: QImage, previous_row: Optional[np.ndarray], compression_level: int
+) -> Tuple[bytes, int, int]:
+    """
+    Filter (with the PNG "Up" filter) and deflate band rows into a piece of a raw deflate stream,
+    returns compressed data, Adler-32 and size of filtered data
+    """
+    rows = _rgba_rows(band)
+
+    filtered = np.empty((rows.shape[0], rows.shape[1] + 1), np.uint8)
+    # Filter type byte of each row
+    filtered[:, 0] = 2
+    np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+    if previous_row is None:
+        filtered[0, 1:] = rows[0]
+    else:
+        np.subtract(rows[0], previous_row, out=filtered[0, 1:])
+
+    data = filtered.data
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -15)
+    # NOTE: a sync flush ends the piece on a byte boundary without ending the stream,
+    # so that pieces compressed independently can be concatenated
+    compressed = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return compressed, zlib.adler32(data), filtered.nbytes
+
+
+class PNGBandWriter:
+    """
+    Streams an RGBA PNG, bands are compressed in parallel as independent pieces of the deflate stream
+    (at a small compression ratio cost) and written as IDAT chunks, in order.
+    Memory is bounded by the number of bands being compressed at once.
+    """
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        width: int,
+        height: int,
+        compression_level: int = 6,
+        max_workers: Optional[int] = None,
+    ):
+        self._file = file
+        self._width = width
+        self._height = height
+        self._compression_level = compression_level
+        self._num_written_rows = 0
+        self._previous_row: Optional[np.ndarray] = None
+        self._adler32 = zlib.adler32(b"")
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Bands being compressed, in order, at most two per worker so that workers never wait on writes
+        self._pending_bands: Deque[Future] = deque()
+        self._max_pending_bands = 2 * max_workers
+
+        file.write(b"\x89PNG\r\n\x1a\n")
+        # 8 bits per channel, RGBA, default compression, filtering and no interlacing
+        file.write(
+            _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        )
+        # zlib stream header: deflate with a 32K window, no preset dictionary
+        file.write(_png_chunk(b"IDAT", b"\x78\x9c"))
+
+    def write_band(self, band: QImage):
+        assert band.width() == self._width
+        assert self._num_written_rows + band.height() <= self._height
+
+        self._pending_bands.append(
+            self._executor.submit(
+                _compress_png_band, band, self._previous_row, self._compression_level
+            )
+        )
+        self._previous_row = _rgba_rows(
+            band.copy(0, band.height() - 1, band.width(), 1)
+        )[0]
+        self._num_written_rows += band.height()
+
+        while len(self._pending_bands) > self._max_pending_bands:
+            self._write_pending_band()
+
+    def _write_pending_band(self):
+        compressed, adler32, length = self._pending_bands.popleft().result()
+        self._adler32 = _adler32_combine(self._adler32, adler32, length)
+        self._file.write(_png_chunk(b"IDAT", compressed))
+
+    def close(self):
+        while len(self._pending_bands) > 0:
+            self._write_pending_band()
+        self._executor.shutdown()
+
+        assert self._num_written_rows == self._height, "Missing rows"
+        # An empty final deflate block ends the stream
+        final_block = zlib.compressobj(0, zlib.DEFLATED, -15).flush(zlib.Z_FINISH)
+        self._file.write(
+            _png_chunk(b"IDAT", final_block + struct.pack(">I", self._adler32))
+        )
+        self._file.write(_png_chunk(b"IEND", b""))
+
+
+# TIFF field types and their sizes
+_TIFF_SHORT = 3
+_TIFF_LONG = 4
+_TIFF_RATIONAL = 5
+_TIFF_LONG8 = 16
+_TIFF_TYPE_SIZES = {_TIFF_SHORT: 2, _TIFF_LONG: 4, _TIFF_RATIONAL: 8, _TIFF_LONG8: 8}
+_TIFF_TYPE_FORMATS = {
+    _TIFF_SHORT: "H",
+    _TIFF_LONG: "I",
+    _TIFF_RATIONAL: "II",
+    _TIFF_LONG8: "Q",
+}
+
+
+def _tiff_header(
+    width: int, height: int, rows_per_strip: int, is_big_tiff: bool
+) -> bytes:
+    """
+    Header and IFD of an uncompressed RGBA TIFF whose pixels follow right after, in a single block.
+    Classic TIFF offsets are 32-bit, BigTIFF is needed for files over 4 GiB.
+    """
+    row_size = width * 4
+    num_strips = -(-height // rows_per_strip)
+    strip_sizes = [rows_per_strip * row_size] * num_strips
+    strip_sizes[-1] = (height - rows_per_strip * (num_strips - 1)) * row_size
+
+    offset_type = _TIFF_LONG8 if is_big_tiff else _TIFF_LONG
+    # (tag, type, values), sorted by tag, values of strip offsets are filled once the data offset is known
+    entries = [
+        (256, _TIFF_LONG, [width]),
+        (257, _TIFF_LONG, [height]),
+        (258, _TIFF_SHORT, [8, 8, 8, 8]),
+        # No compression
+        (259, _TIFF_SHORT, [1]),
+        # RGB
+        (262, _TIFF_SHORT, [2]),
+        (273, offset_type, [0] * num_strips),
+        (277, _TIFF_SHORT, [4]),
+        (278, _TIFF_LONG, [rows_per_strip]),
+        (279, offset_type, strip_sizes),
+        (282, _TIFF_RATIONAL, [72, 1]),
+        (283, _TIFF_RATIONAL, [72, 1]),
+        # Chunky pixels (RGBARGBA...)
+        (284, _TIFF_SHORT, [1]),
+        # Inches
+        (296, _TIFF_SHORT, [2]),
+        # Unassociated (straight) alpha
+        (338, _TIFF_SHORT, [2]),
+    ]
+
+    if is_big_tiff:
+        header_format, entry_format, offset_format = "<2sHHHQ", "<HHQ", "<Q"
+        ifd_size = 8 + 20 * len(entries) + 8
+        header_size = 16
+    else:
+        header_format, entry_format, offset_format = "<2sHI", "<HHI", "<I"
+        ifd_size = 2 + 12 * len(entries) + 4
+        header_size = 8
+    inline_size = struct.calcsize(offset_format)
+
+    def get_values_size(field_type: int, values: List[int]):
+        # NOTE: rationals are given as (numerator, denominator) pairs
+        num_values = len(values) // 2 if field_type == _TIFF_RATIONAL else len(values)
+        return num_values * _TIFF_TYPE_SIZES[field_type]
+
+    # Values that do not fit in an entry are stored after the IFD, at word boundaries
+    data_offset = header_size + ifd_size
+    for field_type, values in ((e[1], e[2]) for e in entries):
+        values_size = get_values_size(field_type, values)
+        if values_size > inline_size:
+            data_offset += values_size + values_size % 2
+
+    strip_offsets = []
+    offset = data_offset
+    for strip_size in strip_sizes:
+        strip_offsets.append(offset)
+        offset += strip_size
+    entries[5] = (273, offset_type, strip_offsets)
+
+    if is_big_tiff:
+        header = struct.pack(header_format, b"II", 43, 8, 0, header_size)
+        ifd = [struct.pack("<Q", len(entries))]
+    else:
+        header = struct.pack(header_format, b"II", 42, header_size)
+        ifd = [struct.pack("<H", len(entries))]
+
+    out_of_line_values = []
+    out_of_line_offset = header_size + ifd_size
+    for tag, field_type, values in entries:
+        num_values = len(values) // 2 if field_type == _TIFF_RATIONAL else len(values)
+        packed_values = struct.pack(
+            "<" + _TIFF_TYPE_FORMATS[field_type] * num_values, *values
+        )
+        ifd.append(struct.pack(entry_format, tag, field_type, num_values))
+        if len(packed_values) <= inline_size:
+            ifd.append(packed_values.ljust(inline_size, b"\x00"))
+        else:
+            ifd.append(struct.pack(offset_format, out_of_line_offset))
+            packed_values += b"\x00" * (len(packed_values) % 2)
+            out_of_line_values.append(packed_values)
+            out_of_line_offset += len(packed_values)
+
+    # No next IFD
+    ifd.append(struct.pack(offset_format, 0))
+
+    result = header + b"".join(ifd) + b"".join(out_of_line_values)
+    assert len(result) == data_offset
+    return result
+
+
+class TIFFBandWriter:
+    """Streams an uncompressed RGBA TIFF (BigTIFF when over 4 GiB), the header is written up front"""
+
+    def __init__(self, file: BinaryIO, width: int, height: int):
+        self._file = file
+        self._width = width
+        self._height = height
+        self._num_written_rows = 0
+
+        rows_per_strip = max(1, min(height, TIFF_STRIP_SIZE // max(1, width * 4)))
+        header = _tiff_header(width, height, rows_per_strip, is_big_tiff=False)
+        if len(header) + width * height * 4 > 0xFFFFFFFF:
+            header = _tiff_header(width, height, rows_per_strip, is_big_tiff=True)
+        file.write(header)
+
+    def write_band(self, band: QImage):
+        assert band.width() == self._width
+        assert self._num_written_rows + band.height() <= self._height
+        self._file.write(_rgba_rows(band).data)
+        self._num_written_rows += band.height()
+
+    def close(self):
+        assert self._num_written_rows == self._height, "Missing rows"
+
+
+class PPMBandWriter:
+    """Streams a binary RGB PPM, transparent pixels are composited over white"""
+
+    def __init__(self, file: BinaryIO, width: int, height: int):
+        self._file = file
+        self._width = width
+        self._height = height
+        self._num_written_rows = 0
+        file.write(f"P6\n{width} {height}\n255\n".encode())
+
+    def write_band(self, band: QImage):
+        assert band.width() == self._width
+        assert self._num_written_rows + band.height() <= self._height
+
+        pixels = argb32_premultiplied_view(band)
+        blue_index, green_index, red_index, alpha_index = ARGB32_CHANNEL_ORDER
+        # Premultiplied colors over white: color + (255 - alpha)
+        rgb = np.ascontiguousarray(pixels[..., [red_index, green_index, blue_index]])
+        rgb += 255 - pixels[..., alpha_index : alpha_index + 1]
+        self._file.write(rgb.data)
+        self._num_written_rows += band.height()
+
+    def close(self):
+        assert self._num_written_rows == self._height, "Missing rows"
+
+
+def export_streaming(
+    project: AIEProject,
+    filepath: str,
+    scale: float = 1.0,
+    band_height: int = STREAMING_BAND_HEIGHT,
+    max_workers: Optional[int] = None,
+):
+    """
+    Render the project band by band straight into a PNG, TIFF or PPM file (chosen by extension),
+    so that the whole image is never in memory, e.g. for very large print files
+    """
+    image_format = Path(filepath).suffix[1:].lower()
+    assert image_format in STREAMING_FORMATS, f"Unsupported format {image_format}"
+
+    size = project.get_render_size(scale)
+    assert not size.isEmpty(), "Nothing to export"
+
+    with open(filepath, "wb") as file:
+        if image_format == "png":
+            writer: BandWriterProtocol = PNGBandWriter(
+                file, size.width(), size.height(), max_workers=max_workers
+            )
+        elif image_format == "ppm":
+            writer = PPMBandWriter(file, size.width(), size.height())
+        else:
+            writer = TIFFBandWriter(file, size.width(), size.height())
+
+        for band in project.iter_render_bands(band_height, scale):
+            writer.write_band(band)
+        writer.close()
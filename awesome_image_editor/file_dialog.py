@@ -42,3 +42,23 @@ def create_open_file_dialog(default_directory: Union[str, QDir], name_filter: st
         name_filter,
         QFileDialog.AcceptMode.AcceptOpen,
     )
+
+
+def create_open_files_dialog(default_directory: Union[str, QDir], name_filter: str):
+    return create_file_dialog(
+        QFileDialog.FileMode.ExistingFiles,
+        default_directory,
+        name_filter,
+        QFileDialog.AcceptMode.AcceptOpen,
+    )
+
+
+def create_open_directory_dialog(default_directory: Union[str, QDir]):
+    dlg = create_file_dialog(
+        QFileDialog.FileMode.Directory,
+        default_directory,
+        "",
+        QFileDialog.AcceptMode.AcceptOpen,
+    )
+    dlg.setOption(QFileDialog.Option.ShowDirsOnly, True)
+    return dlg
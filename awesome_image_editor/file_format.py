@@ -1,13 +1,27 @@
 from io import BufferedReader, BufferedWriter
+from typing import Any, List, NamedTuple, Optional, Union
 
-from PyQt6.QtCore import QBuffer, QByteArray, QIODevice, Qt
-from PyQt6.QtGui import QImage, QPainter
-from PyQt6.QtWidgets import QGraphicsView
+from PyQt6.QtCore import (
+    QBuffer,
+    QByteArray,
+    QDataStream,
+    QIODevice,
+    QRectF,
+    QSize,
+    QSizeF,
+    Qt,
+)
+from PyQt6.QtGui import QColor, QImage, QPainter, QPainterPath
+from PyQt6.QtWidgets import QGraphicsItem, QGraphicsView
 
 from .model_view.graphics_scene import AIEGraphicsScene
 from .model_view.graphics_view import AIEGraphicsView
+from .model_view.items.group import AIEGroupItem
 from .model_view.items.image import AIEImageItem
+from .model_view.items.shape import AIEShapeItem
+from .model_view.items.text import AIETextItem
 from .model_view.tree_model import TreeModel
+from .tiled_image import TiledImage
 from .widgets.layers import LayersWidget
 from .binary_io.write import (
     write_pascal_string,
@@ -25,8 +39,220 @@ from .binary_io.read import (
 MAGIC_BYTES = b"\x89AIE\r\n\x1a\n"  # Similar to PNG magic bytes
 
 # Chunk Types
-LAYERS_CHUNK_TYPE = b"LAYERS"
+LAYERS_CHUNK_TYPE = b"LAYERS"  # Legacy flat list of image layers
+LAYER_TREE_CHUNK_TYPE = b"LAYERTREE"
 IMAGE_CHUNK_TYPE = b"IMAGE"
+GROUP_CHUNK_TYPE = b"GROUP"
+SHAPE_CHUNK_TYPE = b"SHAPE"
+TEXT_CHUNK_TYPE = b"TEXT"
+
+# Version of layer tree chunk contents, bump when changing how layers are written
+# 2: image layers are followed by their filter stack
+# 3: image layers are written as tiles, only tiles that are not fully transparent are written
+LAYER_TREE_FORMAT_VERSION = 3
+
+
+class LayerSnapshot(NamedTuple):
+    """A plain data copy of a layer item, which can be written to a file off the GUI thread"""
+
+    chunk_type: bytes
+    name: str
+    x: float
+    y: float
+    is_visible: bool
+    # Depends on chunk type:
+    # (tiles loader callable, filters) for images, (path, stroke color) for shapes, HTML string for texts, None for groups
+    data: Any
+    children: List["LayerSnapshot"]
+
+
+def snapshot_item(item: QGraphicsItem) -> Optional[LayerSnapshot]:
+    """Plain data copy of an item and its children, None for items that are not layers"""
+    children = []
+
+    if isinstance(item, AIEImageItem):
+        chunk_type = IMAGE_CHUNK_TYPE
+        data = (item.get_tiles_loader(), item.get_filters())
+
+    elif isinstance(item, AIEShapeItem):
+        chunk_type = SHAPE_CHUNK_TYPE
+        data = (QPainterPath(item.path), QColor(item.stroke_color))
+
+    elif isinstance(item, AIETextItem):
+        chunk_type = TEXT_CHUNK_TYPE
+        data = item.document().toHtml()
+
+    elif isinstance(item, AIEGroupItem):
+        chunk_type = GROUP_CHUNK_TYPE
+        data = None
+        # NOTE: child items are sorted by stacking order, back-to-front
+        for child_item in item.childItems():
+            child_snapshot = snapshot_item(child_item)
+            if child_snapshot is not None:
+                children.append(child_snapshot)
+
+    else:
+        return None
+
+    return LayerSnapshot(
+        chunk_type,
+        item.name,
+        item.pos().x(),
+        item.pos().y(),
+        item.isVisible(),
+        data,
+        children,
+    )
+
+
+def _write_tiled_image(tiled_image: TiledImage, writer: BufferedWriter):
+    write_uint32_le(tiled_image.width(), writer)
+    write_uint32_le(tiled_image.height(), writer)
+    write_uint32_le(tiled_image.tile_size, writer)
+
+    write_uint32_le(tiled_image.get_num_tiles(), writer)
+    for tile_rect, tile in tiled_image.iter_tiles():
+        write_uint32_le(tile_rect.x() // tiled_image.tile_size, writer)
+        write_uint32_le(tile_rect.y() // tiled_image.tile_size, writer)
+
+        # Uniform tiles are written as a single color
+        if isinstance(tile, QColor):
+            write_uint32_le(1, writer)
+            write_uint32_le(tile.rgba(), writer)
+            continue
+
+        write_uint32_le(0, writer)
+        byte_array = QByteArray()
+        buffer = QBuffer(byte_array)
+        buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+        tile.save(buffer, "PNG")
+        write_pascal_string(byte_array.data(), writer)
+
+
+def _read_tiled_image(reader: BufferedReader) -> TiledImage:
+    width = read_uint32_le(reader)
+    height = read_uint32_le(reader)
+    tile_size = read_uint32_le(reader)
+
+    tiles = {}
+    num_tiles = read_uint32_le(reader)
+    for i in range(num_tiles):
+        column = read_uint32_le(reader)
+        row = read_uint32_le(reader)
+        is_uniform = bool(read_uint32_le(reader))
+        if is_uniform:
+            tiles[column, row] = QColor.fromRgba(read_uint32_le(reader))
+        else:
+            tiles[column, row] = QImage.fromData(
+                read_pascal_string(reader), "PNG"
+            ).convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+
+    return TiledImage(width, height, tiles, tile_size)
+
+
+def _write_layer_snapshot(snapshot: LayerSnapshot, writer: BufferedWriter):
+    write_pascal_string(snapshot.chunk_type, writer)
+    write_unicode_string(snapshot.name, writer)
+    write_float_le(snapshot.x, writer)
+    write_float_le(snapshot.y, writer)
+    write_uint32_le(int(snapshot.is_visible), writer)
+
+    if snapshot.chunk_type == IMAGE_CHUNK_TYPE:
+        tiles_loader, filters = snapshot.data
+        _write_tiled_image(tiles_loader(), writer)
+
+        # NOTE: filters pull in numpy, they are only imported once needed to keep startup fast
+        from .filters.stack import filter_to_json
+
+        write_uint32_le(len(filters), writer)
+        for layer_filter in filters:
+            write_pascal_string(layer_filter.KIND, writer)
+            write_unicode_string(filter_to_json(layer_filter), writer)
+
+    elif snapshot.chunk_type == SHAPE_CHUNK_TYPE:
+        path, stroke_color = snapshot.data
+        byte_array = QByteArray()
+        stream = QDataStream(byte_array, QIODevice.OpenModeFlag.WriteOnly)
+        stream << path
+        stream << stroke_color
+        write_pascal_string(byte_array.data(), writer)
+
+    elif snapshot.chunk_type == TEXT_CHUNK_TYPE:
+        write_unicode_string(snapshot.data, writer)
+
+    elif snapshot.chunk_type == GROUP_CHUNK_TYPE:
+        write_uint32_le(len(snapshot.children), writer)
+        for child_snapshot in snapshot.children:
+            _write_layer_snapshot(child_snapshot, writer)
+
+
+def _read_layer_item(reader: BufferedReader, version: int) -> QGraphicsItem:
+    chunk_type = read_pascal_string(reader)
+    name = read_unicode_string(reader)
+    x = read_float_le(reader)
+    y = read_float_le(reader)
+    is_visible = bool(read_uint32_le(reader))
+
+    if chunk_type == IMAGE_CHUNK_TYPE:
+        if version >= 3:
+            item = AIEImageItem(_read_tiled_image(reader), name)
+        else:
+            image = QImage.fromData(read_pascal_string(reader), "PNG")
+            item = AIEImageItem(image, name)
+
+        if version >= 2:
+            from .filters.stack import filter_from_json
+
+            num_filters = read_uint32_le(reader)
+            item.set_filters(
+                [
+                    filter_from_json(
+                        read_pascal_string(reader), read_unicode_string(reader)
+                    )
+                    for i in range(num_filters)
+                ]
+            )
+
+    elif chunk_type == SHAPE_CHUNK_TYPE:
+        stream = QDataStream(QByteArray(read_pascal_string(reader)))
+        path = QPainterPath()
+        stroke_color = QColor()
+        stream >> path
+        stream >> stroke_color
+        assert stream.status() == QDataStream.Status.Ok
+        item = AIEShapeItem(path, name)
+        item.stroke_color = stroke_color
+
+    elif chunk_type == TEXT_CHUNK_TYPE:
+        html = read_unicode_string(reader)
+        item = AIETextItem("", name)
+        item.document().setUseDesignMetrics(True)
+        with item.deferred_layout():
+            item.document().setHtml(html)
+
+    elif chunk_type == GROUP_CHUNK_TYPE:
+        item = AIEGroupItem(name)
+        num_children = read_uint32_le(reader)
+        for i in range(num_children):
+            _read_layer_item(reader, version).setParentItem(item)
+
+    else:
+        assert False, f"Unknown layer chunk type {chunk_type}"
+
+    item.setPos(x, y)
+    item.setVisible(is_visible)
+    return item
+
+
+def write_layer_snapshots(snapshots: List[LayerSnapshot], writer: BufferedWriter):
+    """Write a project from snapshots of its top level layers, safe to call off the GUI thread"""
+    writer.write(MAGIC_BYTES)
+    write_pascal_string(LAYER_TREE_CHUNK_TYPE, writer)
+    write_uint32_le(LAYER_TREE_FORMAT_VERSION, writer)
+
+    write_uint32_le(len(snapshots), writer)
+    for snapshot in snapshots:
+        _write_layer_snapshot(snapshot, writer)
 
 
 class AIEProject:
@@ -37,8 +263,18 @@ class AIEProject:
         self._graphics_scene_model = TreeModel(self._graphics_scene)
         self._layers_widget = LayersWidget(self._graphics_scene_model)
 
-    def add_image_layer(self, image: QImage, layer_name: str):
-        self._graphics_scene.addItem(AIEImageItem(image, layer_name))
+    def add_image_layer(self, image: Union[QImage, TiledImage], layer_name: str):
+        item = AIEImageItem(image, layer_name)
+        self._graphics_scene.addItem(item)
+        return item
+
+    def remove_layer(self, item: QGraphicsItem):
+        """Remove a top level layer without recording it in undo history (e.g. a layer that failed to import)"""
+        # NOTE: deselect before resetting the model, removing selected items syncs selection to views
+        item.setSelected(False)
+        self._graphics_scene_model.beginResetModel()
+        self._graphics_scene.removeItem(item)
+        self._graphics_scene_model.endResetModel()
 
     def get_layers_widget(self):
         return self._layers_widget
@@ -49,58 +285,117 @@ class AIEProject:
     def get_graphics_scene(self):
         return self._graphics_scene
 
-    def render(self):
+    def render(self, scale: float = 1.0):
+        """Render all layers into an image fitting their bounds, `scale` times the size of the document"""
         scene = self._graphics_scene
         # Fit scene to items
         scene.setSceneRect(scene.itemsBoundingRect())
+        target_rect = QRectF(
+            0, 0, scene.sceneRect().width() * scale, scene.sceneRect().height() * scale
+        )
 
         # Create new empty image to render the scene into
         image = QImage(
-            scene.sceneRect().size().toSize(),
+            target_rect.size().toSize(),
             QImage.Format.Format_ARGB32_Premultiplied,
         )
         assert image is not None  # In case creation of image fails
         image.fill(Qt.GlobalColor.transparent)
 
         painter = QPainter(image)
-        scene.render(painter)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, scale != 1)
+        scene.render(painter, target_rect, scene.sceneRect())
         # NOTE: End painter explicitly to fix "QPaintDevice: Cannot destroy paint device that is being painted"
         painter.end()
 
         return image
 
-    def serialize(self, writer: BufferedWriter):
-        writer.write(MAGIC_BYTES)
-        write_pascal_string(LAYERS_CHUNK_TYPE, writer)
-        num_layers = len(self._graphics_scene.items())
-        write_uint32_le(num_layers, writer)
+    def get_render_size(self, scale: float = 1.0) -> QSize:
+        """Size of images given by `render` and `iter_render_bands`"""
+        rect = self._graphics_scene.itemsBoundingRect()
+        return QSizeF(rect.width() * scale, rect.height() * scale).toSize()
+
+    def iter_render_bands(self, band_height: int, scale: float = 1.0):
+        """
+        Render all layers as `render` does, one horizontal band of `band_height` rows at a time (top to bottom),
+        so that the whole image is never in memory
+        """
+        scene = self._graphics_scene
+        # Fit scene to items
+        scene.setSceneRect(scene.itemsBoundingRect())
+        scene_rect = scene.sceneRect()
+        size = self.get_render_size(scale)
+
+        for y in range(0, size.height(), band_height):
+            band = QImage(
+                size.width(),
+                min(band_height, size.height() - y),
+                QImage.Format.Format_ARGB32_Premultiplied,
+            )
+            band.fill(Qt.GlobalColor.transparent)
+
+            # NOTE: only render the part of the scene in the band, so that items and tiles outside of it are skipped
+            source_rect = QRectF(
+                scene_rect.x(),
+                scene_rect.y() + y / scale,
+                scene_rect.width(),
+                band.height() / scale,
+            )
+            painter = QPainter(band)
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, scale != 1)
+            scene.render(
+                painter,
+                QRectF(0, 0, scene_rect.width() * scale, band.height()),
+                source_rect,
+                Qt.AspectRatioMode.IgnoreAspectRatio,
+            )
+            painter.end()
+            yield band
+
+    def snapshot_layers(self) -> List[LayerSnapshot]:
+        """Take plain data copies of top level layers (and their children), pixels are shared, not copied"""
+        snapshots = []
 
         # NOTE: save in back-to-front (AscendingOrder) order to preserve same layer order when importing back
-        # TODO: order independent file format? (e.g. save layer index in file?)
         for item in self._graphics_scene.items(Qt.SortOrder.AscendingOrder):
-            if isinstance(item, AIEImageItem):
-                write_pascal_string(IMAGE_CHUNK_TYPE, writer)
-                write_unicode_string(item.name, writer)
+            if item.parentItem() is not None:
+                continue
 
-                write_float_le(item.pos().x(), writer)
-                write_float_le(item.pos().y(), writer)
+            snapshot = snapshot_item(item)
+            if snapshot is not None:
+                snapshots.append(snapshot)
 
-                byte_array = QByteArray()
-                buffer = QBuffer(byte_array)
-                buffer.open(QIODevice.OpenModeFlag.WriteOnly)
-                item.image.save(buffer, "PNG")
+        return snapshots
 
-                write_uint32_le(len(byte_array), writer)
-                writer.write(byte_array.data())
+    def serialize(self, writer: BufferedWriter):
+        write_layer_snapshots(self.snapshot_layers(), writer)
 
     @staticmethod
     def deserialize(reader: BufferedReader):
         assert reader.read(len(MAGIC_BYTES)) == MAGIC_BYTES
 
-        # Expecting layers chunk
         chunk_type = read_pascal_string(reader)
-        assert chunk_type == LAYERS_CHUNK_TYPE
+        if chunk_type == LAYERS_CHUNK_TYPE:
+            return AIEProject._deserialize_legacy_layers(reader)
+
+        # Expecting layer tree chunk
+        assert chunk_type == LAYER_TREE_CHUNK_TYPE
+        version = read_uint32_le(reader)
+        assert (
+            1 <= version <= LAYER_TREE_FORMAT_VERSION
+        ), f"Unsupported version {version}"
+
+        project = AIEProject()
+        scene = project.get_graphics_scene()
+        num_layers = read_uint32_le(reader)
+
+        for i in range(num_layers):
+            scene.addItem(_read_layer_item(reader, version))
+
+        return project
 
+    @staticmethod
+    def _deserialize_legacy_layers(reader: BufferedReader):
         project = AIEProject()
         scene = project.get_graphics_scene()
         num_layers = read_uint32_le(reader)
@@ -0,0 +1,44 @@
+from .adjustments import (
+    AdjustmentsFilter,
+    BrightnessContrastAdjustment,
+    CurvesAdjustment,
+    HueSaturationAdjustment,
+    LevelsAdjustment,
+    apply_adjustments_in_place,
+)
+from .base import FilterCancelled
+from .batch import FilterStackBatchRenderer
+from .gaussian_blur import (
+    GaussianBlurFilter,
+    apply_gaussian_blur,
+    gaussian_blur_array,
+    gaussian_blur_image,
+    gaussian_blur_padding,
+    gaussian_blur_sigma,
+)
+from .preview import FilterPreviewRenderer
+from .render_queue import FilterStackRenderQueue, filter_stack_render_queue
+from .stack import FilterStageCache, filter_stage_cache, render_filter_stack
+
+__all__ = (
+    "AdjustmentsFilter",
+    "BrightnessContrastAdjustment",
+    "CurvesAdjustment",
+    "FilterCancelled",
+    "FilterPreviewRenderer",
+    "FilterStackBatchRenderer",
+    "FilterStackRenderQueue",
+    "FilterStageCache",
+    "GaussianBlurFilter",
+    "HueSaturationAdjustment",
+    "LevelsAdjustment",
+    "apply_adjustments_in_place",
+    "apply_gaussian_blur",
+    "filter_stack_render_queue",
+    "filter_stage_cache",
+    "gaussian_blur_array",
+    "gaussian_blur_image",
+    "gaussian_blur_padding",
+    "gaussian_blur_sigma",
+    "render_filter_stack",
+)
@@ -0,0 +1,337 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Type, Union
+
+import numpy as np
+from PyQt6.QtCore import QRectF
+from PyQt6.QtGui import QImage
+
+from ..image_buffer import (
+    ARGB32_CHANNEL_ORDER,
+    argb32_premultiplied_view,
+    qimage_from_argb32_premultiplied,
+)
+from .base import IsCancelledCallback, raise_if_cancelled
+
+__all__ = (
+    "ADJUSTMENT_TYPES",
+    "AdjustmentsFilter",
+    "BrightnessContrastAdjustment",
+    "CurvesAdjustment",
+    "HueSaturationAdjustment",
+    "LevelsAdjustment",
+    "apply_adjustments_in_place",
+    "compile_adjustments",
+)
+
+# Number of rows adjusted by each task
+_BAND_HEIGHT = 64
+
+# Color channels that curves can be applied to, as indices of (red, green, blue)
+CURVES_CHANNELS = {"rgb": (0, 1, 2), "red": (0,), "green": (1,), "blue": (2,)}
+
+# A compiled adjustment stage, either per-channel lookup tables of shape (3, 256) for (red, green, blue),
+# or a 3x3 matrix applied to (red, green, blue) column vectors
+AdjustmentStage = Tuple[str, np.ndarray]
+LUT_STAGE = "lut"
+MATRIX_STAGE = "matrix"
+
+# Luminance weights of (red, green, blue), as used by hue rotation and saturation matrices
+_LUMINANCE_WEIGHTS = np.array([0.213, 0.715, 0.072])
+
+
+def _identity_lut() -> np.ndarray:
+    return np.tile(np.arange(256, dtype=np.float64), (3, 1))
+
+
+def _lut_stage(values: np.ndarray) -> AdjustmentStage:
+    return LUT_STAGE, np.clip(np.rint(values), 0, 255).astype(np.uint8)
+
+
+class LevelsAdjustment(NamedTuple):
+    KIND = b"LEVELS"
+
+    input_black: float = 0
+    input_white: float = 255
+    gamma: float = 1.0
+    output_black: float = 0
+    output_white: float = 255
+
+    def compile(self) -> List[AdjustmentStage]:
+        values = _identity_lut()
+        input_range = max(self.input_white - self.input_black, 1)
+        values = np.clip((values - self.input_black) / input_range, 0, 1)
+        values **= 1 / self.gamma
+        values = self.output_black + values * (self.output_white - self.output_black)
+        return [_lut_stage(values)]
+
+
+class BrightnessContrastAdjustment(NamedTuple):
+    KIND = b"BRIGHTNESS_CONTRAST"
+
+    # From -150 to 150
+    brightness: float = 0
+    # From -100 to 100
+    contrast: float = 0
+
+    def compile(self) -> List[AdjustmentStage]:
+        # Contrast slope goes from 0 (flat gray) to 1 (unchanged) to vertical (threshold)
+        contrast = min(max(self.contrast, -100), 99.9)
+        slope = math.tan((contrast / 100 + 1) * math.pi / 4)
+        values = (_identity_lut() + self.brightness - 127.5) * slope + 127.5
+        return [_lut_stage(values)]
+
+
+def _monotone_cubic_interpolate(
+    points: Sequence[Tuple[float, float]], x: np.ndarray
+) -> np.ndarray:
+    """Fritsch-Carlson monotone cubic interpolation, which does not overshoot between control points"""
+    xs = np.array([point[0] for point in points], np.float64)
+    ys = np.array([point[1] for point in points], np.float64)
+    if len(xs) == 1:
+        return np.full(x.shape, ys[0])
+
+    widths = np.diff(xs)
+    slopes = np.diff(ys) / widths
+
+    tangents = np.empty(len(xs))
+    tangents[0] = slopes[0]
+    tangents[-1] = slopes[-1]
+    tangents[1:-1] = (slopes[:-1] + slopes[1:]) / 2
+    # Flat tangents at local extrema
+    tangents[1:-1][slopes[:-1] * slopes[1:] <= 0] = 0
+
+    for k, slope in enumerate(slopes):
+        if slope == 0:
+            tangents[k] = tangents[k + 1] = 0
+            continue
+
+        a = tangents[k] / slope
+        b = tangents[k + 1] / slope
+        norm = a * a + b * b
+        if norm > 9:
+            scale = 3 / math.sqrt(norm)
+            tangents[k] = scale * a * slope
+            tangents[k + 1] = scale * b * slope
+
+    x = np.clip(x, xs[0], xs[-1])
+    k = np.clip(np.searchsorted(xs, x, side="right") - 1, 0, len(xs) - 2)
+    t = (x - xs[k]) / widths[k]
+    t2 = t * t
+    t3 = t2 * t
+    return (
+        (2 * t3 - 3 * t2 + 1) * ys[k]
+        + (t3 - 2 * t2 + t) * widths[k] * tangents[k]
+        + (-2 * t3 + 3 * t2) * ys[k + 1]
+        + (t3 - t2) * widths[k] * tangents[k + 1]
+    )
+
+
+class CurvesAdjustment(NamedTuple):
+    KIND = b"CURVES"
+
+    # (input, output) control points, sorted by input
+    points: Tuple[Tuple[float, float], ...] = ((0, 0), (255, 255))
+    # One of CURVES_CHANNELS
+    channel: str = "rgb"
+
+    def compile(self) -> List[AdjustmentStage]:
+        assert self.channel in CURVES_CHANNELS, f"Unknown channel {self.channel}"
+        assert len(self.points) > 0
+
+        values = _identity_lut()
+        curve = _monotone_cubic_interpolate(self.points, np.arange(256))
+        for channel_index in CURVES_CHANNELS[self.channel]:
+            values[channel_index] = curve
+        return [_lut_stage(values)]
+
+
+class HueSaturationAdjustment(NamedTuple):
+    KIND = b"HUE_SATURATION"
+
+    # In degrees, from -180 to 180
+    hue: float = 0
+    # From -100 (grayscale) to 100
+    saturation: float = 0
+    # From -100 (black) to 100 (white)
+    lightness: float = 0
+
+    def compile(self) -> List[AdjustmentStage]:
+        stages = []
+
+        # Hue rotation and saturation are not per-channel, they are expressed as color matrices
+        # (see feColorMatrix hueRotate and saturate in SVG specification)
+        if self.hue != 0 or self.saturation != 0:
+            angle = math.radians(self.hue)
+            cos, sin = math.cos(angle), math.sin(angle)
+            luminance = np.tile(_LUMINANCE_WEIGHTS, (3, 1))
+            hue_matrix = (
+                luminance
+                + cos * (np.eye(3) - luminance)
+                + sin
+                * np.array(
+                    [
+                        [-0.213, -0.715, 0.928],
+                        [0.143, 0.140, -0.283],
+                        [-0.787, 0.715, 0.072],
+                    ]
+                )
+            )
+            saturation = 1 + self.saturation / 100
+            saturation_matrix = luminance + saturation * (np.eye(3) - luminance)
+            stages.append((MATRIX_STAGE, saturation_matrix @ hue_matrix))
+
+        if self.lightness != 0:
+            values = _identity_lut()
+            if self.lightness < 0:
+                values *= 1 + self.lightness / 100
+            else:
+                values += (255 - values) * (self.lightness / 100)
+            stages.append(_lut_stage(values))
+
+        return stages
+
+
+Adjustment = Union[
+    LevelsAdjustment,
+    BrightnessContrastAdjustment,
+    CurvesAdjustment,
+    HueSaturationAdjustment,
+]
+
+# Adjustment types by their kind, used to read adjustments back from files
+ADJUSTMENT_TYPES: Dict[bytes, Type[Adjustment]] = {
+    adjustment_type.KIND: adjustment_type
+    for adjustment_type in (
+        LevelsAdjustment,
+        BrightnessContrastAdjustment,
+        CurvesAdjustment,
+        HueSaturationAdjustment,
+    )
+}
+
+
+def compile_adjustments(adjustments: Sequence[Adjustment]) -> List[AdjustmentStage]:
+    """
+    Compile a chain of adjustments into as few stages as possible,
+    consecutive lookup tables are combined into one, as are consecutive color matrices
+    """
+    stages: List[AdjustmentStage] = []
+    for adjustment in adjustments:
+        for stage_type, stage_data in adjustment.compile():
+            if len(stages) == 0 or stages[-1][0] != stage_type:
+                stages.append((stage_type, stage_data))
+                continue
+
+            previous_data = stages[-1][1]
+            if stage_type == LUT_STAGE:
+                combined_data = np.stack(
+                    [stage_data[i][previous_data[i]] for i in range(3)]
+                )
+            else:
+                combined_data = stage_data @ previous_data
+            stages[-1] = (stage_type, combined_data)
+
+    return stages
+
+
+# Scale from premultiplied to straight color values by alpha, 0 for transparent pixels
+_UNPREMULTIPLY_SCALES = np.concatenate(
+    [[0], 255 / np.arange(1, 256, dtype=np.float32)]
+).astype(np.float32)
+
+
+def _adjust_band(band: np.ndarray, stages: Sequence[AdjustmentStage]):
+    blue_index, green_index, red_index, alpha_index = ARGB32_CHANNEL_ORDER
+    color_indices = [red_index, green_index, blue_index]
+
+    alpha = band[..., alpha_index]
+    colors = band[..., color_indices]
+    is_opaque = bool((alpha == 255).all())
+
+    # Adjustments apply to straight colors, premultiplied colors of opaque pixels already are
+    if not is_opaque:
+        scales = _UNPREMULTIPLY_SCALES[alpha][..., np.newaxis]
+        colors = np.minimum(colors * scales + 0.5, 255).astype(np.uint8)
+
+    for stage_type, stage_data in stages:
+        if stage_type == LUT_STAGE:
+            for i in range(3):
+                np.take(stage_data[i], colors[..., i], out=colors[..., i])
+        else:
+            transformed = colors @ stage_data.T.astype(np.float32)
+            transformed += 0.5
+            np.clip(transformed, 0, 255, out=transformed)
+            colors = transformed.astype(np.uint8)
+
+    if not is_opaque:
+        # Rounded (color * alpha / 255), see rgba_to_argb32_premultiplied
+        premultiplied = colors * alpha[..., np.newaxis].astype(np.uint16)
+        premultiplied += 128
+        premultiplied += premultiplied >> 8
+        premultiplied >>= 8
+        colors = premultiplied
+
+    band[..., color_indices] = colors
+
+
+def apply_adjustments_in_place(
+    pixels: np.ndarray,
+    adjustments: Sequence[Adjustment],
+    max_workers: Optional[int] = None,
+    is_cancelled: Optional[IsCancelledCallback] = None,
+):
+    """
+    Apply a chain of adjustments to pixels in the memory layout of QImage.Format_ARGB32_Premultiplied
+    with shape (height, width, 4), in place, in a single pass over bands of rows processed in parallel.
+    """
+    assert pixels.ndim == 3 and pixels.shape[2] == 4 and pixels.dtype == np.uint8
+    assert pixels.flags.writeable
+
+    stages = compile_adjustments(adjustments)
+    if len(stages) == 0:
+        return
+
+    def adjust_rows(y: int):
+        raise_if_cancelled(is_cancelled)
+        _adjust_band(pixels[y : y + _BAND_HEIGHT], stages)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # NOTE: consume results so that exceptions raised in bands are propagated
+        for _ in executor.map(adjust_rows, range(0, pixels.shape[0], _BAND_HEIGHT)):
+            pass
+
+
+class AdjustmentsFilter(NamedTuple):
+    """A chain of color adjustments, applied as a single filter so that it costs about as much as one adjustment"""
+
+    KIND = b"ADJUSTMENTS"
+
+    adjustments: Tuple[Adjustment, ...]
+
+    def map_rect(self, rect: QRectF) -> QRectF:
+        return rect
+
+    def apply(
+        self,
+        image: QImage,
+        scale: float = 1.0,
+        is_cancelled: Optional[IsCancelledCallback] = None,
+        max_workers: Optional[int] = None,
+    ) -> Tuple[QImage, QRectF]:
+        if image.format() != QImage.Format.Format_ARGB32_Premultiplied:
+            image = image.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+
+        # NOTE: filter input is a cached stage output which must not change, adjust a copy of it
+        pixels = argb32_premultiplied_view(image).copy()
+        apply_adjustments_in_place(
+            pixels, self.adjustments, max_workers, is_cancelled=is_cancelled
+        )
+        adjusted_image = qimage_from_argb32_premultiplied(
+            pixels, image.width(), image.height()
+        )
+        return adjusted_image, QRectF(image.rect())
@@ -0,0 +1,54 @@
+from typing import Any, Callable, Dict, Optional, Protocol, Tuple
+
+from PyQt6.QtCore import QRectF
+from PyQt6.QtGui import QImage
+
+__all__ = (
+    "FilterCancelled",
+    "IsCancelledCallback",
+    "LayerFilterProtocol",
+    "raise_if_cancelled",
+)
+
+# Called by filters between units of work (e.g. bands), returns True when the result is no longer needed
+IsCancelledCallback = Callable[[], bool]
+
+
+class FilterCancelled(Exception):
+    """Raised by a filter that stopped early because its result is no longer needed"""
+
+
+def raise_if_cancelled(is_cancelled: Optional[IsCancelledCallback]):
+    if is_cancelled is not None and is_cancelled():
+        raise FilterCancelled()
+
+
+class LayerFilterProtocol(Protocol):
+    """
+    A filter of a layer filter stack, filters are immutable and hashable (e.g. NamedTuple of parameters)
+    so that they can be compared and used as cache keys
+    """
+
+    # Identifies filter type in files
+    KIND: bytes
+
+    def _asdict(self) -> Dict[str, Any]:
+        ...
+
+    def map_rect(self, rect: QRectF) -> QRectF:
+        """Rect of filter output for an input image of given rect, without applying the filter"""
+        ...
+
+    def apply(
+        self,
+        image: QImage,
+        scale: float = 1.0,
+        is_cancelled: Optional[IsCancelledCallback] = None,
+        max_workers: Optional[int] = None,
+    ) -> Tuple[QImage, QRectF]:
+        """
+        Apply filter to an image scaled by `scale` relative to the full resolution layer (parameters in pixels
+        are given at full resolution), returns the filtered image and its rect in input image coordinates.
+        `max_workers` bounds the number of threads the filter uses (the number of CPUs by default).
+        """
+        ...
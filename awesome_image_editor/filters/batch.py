@@ -0,0 +1,129 @@
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Hashable, List, Optional, Sequence, Tuple
+
+from PyQt6.QtCore import QObject, QSize, pyqtSignal
+from PyQt6.QtGui import QImage
+
+from .base import FilterCancelled, LayerFilterProtocol
+from .stack import StageOutput, render_filter_stack
+
+__all__ = ("FilterStackBatchRenderer",)
+
+# Source pixels key, source image size, source image loader (called on a worker thread) and the filter stack to render
+FilterStackJob = Tuple[
+    Hashable, QSize, Callable[[], QImage], Sequence[LayerFilterProtocol]
+]
+
+
+class FilterStackBatchRenderer(QObject):
+    """
+    Renders filter stacks of many layers on a thread pool, reporting combined progress.
+
+    Results are only emitted once every job succeeded, so that cancelling (or a failure)
+    leaves all layers untouched. Largest images are started first, so that the batch takes about
+    as long as its slowest jobs, instead of waiting on a large image started last.
+    """
+
+    # Number of finished jobs, total number of jobs
+    progressChanged = pyqtSignal(int, int)
+    # Outputs (filtered image and its rect in source image coordinates) in the same order as jobs
+    finished = pyqtSignal(list)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    # (job index, output or None if the job was cancelled, error message or None), emitted from worker threads
+    _jobFinished = pyqtSignal(int, object, object)
+
+    def __init__(
+        self,
+        jobs: Sequence[FilterStackJob],
+        max_workers: Optional[int] = None,
+        parent: Optional[QObject] = None,
+    ):
+        super().__init__(parent)
+        self._jobs = list(jobs)
+        self._outputs: List[Optional[StageOutput]] = [None] * len(self._jobs)
+        self._num_finished_jobs = 0
+        self._error_messages: List[str] = []
+        self._is_cancelled = False
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # NOTE: filters run their own thread pools, workers are shared among jobs running at once,
+        # so that the batch does not run (jobs x CPUs) threads
+        self._filter_max_workers = max(
+            1, max_workers // max(1, min(max_workers, len(self._jobs)))
+        )
+        self._jobFinished.connect(self._on_job_finished)
+
+    def start(self):
+        if len(self._jobs) == 0:
+            self.finished.emit([])
+            return
+
+        def get_job_size(job_index: int):
+            _, source_size, _, _ = self._jobs[job_index]
+            return source_size.width() * source_size.height()
+
+        for job_index in sorted(range(len(self._jobs)), key=get_job_size, reverse=True):
+            self._executor.submit(self._run_job, job_index)
+
+        # NOTE: does not wait, workers exit once jobs are done
+        self._executor.shutdown(wait=False)
+
+    def cancel(self):
+        """Stop rendering, only `cancelled` is emitted once running jobs stopped"""
+        # NOTE: pending jobs are not cancelled but return right away, so that every job reports back
+        self._is_cancelled = True
+
+    def _is_job_cancelled(self):
+        # NOTE: a failed job cancels the whole batch, as its results would be discarded anyway
+        return self._is_cancelled or len(self._error_messages) > 0
+
+    def _run_job(self, job_index: int):
+        if self._is_job_cancelled():
+            self._jobFinished.emit(job_index, None, None)
+            return
+
+        source_key, _, load_source_image, filters = self._jobs[job_index]
+        try:
+            output = render_filter_stack(
+                source_key,
+                load_source_image,
+                filters,
+                is_cancelled=self._is_job_cancelled,
+                max_workers=self._filter_max_workers,
+            )
+        except FilterCancelled:
+            self._jobFinished.emit(job_index, None, None)
+            return
+        except:
+            self._jobFinished.emit(job_index, None, traceback.format_exc())
+            return
+
+        self._jobFinished.emit(job_index, output, None)
+
+    def _on_job_finished(
+        self,
+        job_index: int,
+        output: Optional[StageOutput],
+        error_message: Optional[str],
+    ):
+        self._num_finished_jobs += 1
+        self._outputs[job_index] = output
+        if error_message is not None:
+            self._error_messages.append(error_message)
+
+        self.progressChanged.emit(self._num_finished_jobs, len(self._jobs))
+        if self._num_finished_jobs < len(self._jobs):
+            return
+
+        if len(self._error_messages) > 0:
+            self.failed.emit(self._error_messages[0])
+        elif self._is_cancelled:
+            self.cancelled.emit()
+        else:
+            self.finished.emit(self._outputs)
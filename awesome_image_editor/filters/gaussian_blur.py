@@ -0,0 +1,285 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PyQt6.QtCore import QRectF
+from PyQt6.QtGui import QImage
+
+from ..image_buffer import argb32_premultiplied_view, qimage_from_argb32_premultiplied
+from .base import IsCancelledCallback, raise_if_cancelled
+
+__all__ = (
+    "GaussianBlurFilter",
+    "apply_gaussian_blur",
+    "gaussian_blur_array",
+    "gaussian_blur_image",
+    "gaussian_blur_padding",
+    "gaussian_blur_sigma",
+)
+
+# Up to this standard deviation, blur is an exact separable convolution (cost grows with radius),
+# above it, successive box blurs approximate it (cost independent of radius)
+MAX_SIGMA_FOR_KERNEL_BLUR = 6.0
+
+NUM_BOX_BLUR_PASSES = 3
+
+# Number of rows (or columns) blurred at once, small bands stay in CPU cache across passes
+_BAND_SIZE = 32
+
+# Size in bytes of the float pixels of a band of rows blurred by each task (extra rows blurred with it included)
+_MAX_BAND_SIZE_IN_BYTES = 16 * 1024**2
+
+
+# Blur radius (the distance over which pixels are spread, as for QGraphicsBlurEffect) in standard deviations
+BLUR_RADIUS_IN_SIGMAS = 3.0
+
+
+def gaussian_blur_sigma(radius: float) -> float:
+    """Standard deviation of the gaussian of a blur radius"""
+    return radius / BLUR_RADIUS_IN_SIGMAS
+
+
+def gaussian_blur_padding(sigma: float) -> int:
+    """Number of pixels an image blurred with a gaussian of standard deviation `sigma` grows by on each side"""
+    return math.ceil(3 * sigma)
+
+
+def _gaussian_kernel(sigma: float) -> np.ndarray:
+    kernel_radius = math.ceil(3 * sigma)
+    x = np.arange(-kernel_radius, kernel_radius + 1, dtype=np.float32)
+    kernel = np.exp(-(x * x) / (2 * sigma * sigma))
+    kernel /= kernel.sum()
+    return kernel
+
+
+def _box_sizes_for_gaussian(sigma: float) -> List[int]:
+    """Odd widths of successive box blurs whose combined variance is closest to sigma^2"""
+    n = NUM_BOX_BLUR_PASSES
+    ideal_width = math.sqrt(12 * sigma * sigma / n + 1)
+    lower_width = math.floor(ideal_width)
+    if lower_width % 2 == 0:
+        lower_width -= 1
+    upper_width = lower_width + 2
+
+    ideal_num_lower = (
+        12 * sigma * sigma - n * lower_width * lower_width - 4 * n * lower_width - 3 * n
+    ) / (-4 * lower_width - 4)
+    num_lower = round(ideal_num_lower)
+    return [lower_width if i < num_lower else upper_width for i in range(n)]
+
+
+def _axis_slice(ndim: int, axis: int, start: int, stop: Optional[int]):
+    index = [slice(None)] * ndim
+    index[axis] = slice(start, stop)
+    return tuple(index)
+
+
+def _convolve_band(band: np.ndarray, kernel: np.ndarray, axis: int) -> np.ndarray:
+    """Convolve a band along an axis with a symmetric kernel, pixels outside the band are transparent"""
+    kernel_radius = len(kernel) // 2
+    length = band.shape[axis]
+
+    pad_width = [(0, 0)] * band.ndim
+    pad_width[axis] = (kernel_radius, kernel_radius)
+    extended = np.pad(band, pad_width)
+
+    def shifted(offset):
+        return extended[_axis_slice(band.ndim, axis, offset, offset + length)]
+
+    result = shifted(kernel_radius) * kernel[kernel_radius]
+    # Kernel is symmetric, sum pixels at opposite offsets before weighting them
+    pair_sum = np.empty_like(result)
+    for i in range(kernel_radius):
+        np.add(shifted(i), shifted(2 * kernel_radius - i), out=pair_sum)
+        pair_sum *= kernel[i]
+        result += pair_sum
+    return result
+
+
+def _box_blur_band(band: np.ndarray, width: int, axis: int) -> np.ndarray:
+    """Average a band along an axis over a sliding window of odd width, using prefix sums"""
+    box_radius = width // 2
+    length = band.shape[axis]
+
+    shape = list(band.shape)
+    shape[axis] += 1
+    prefix_sums = np.empty(shape, np.float32)
+    prefix_sums[_axis_slice(band.ndim, axis, 0, 1)] = 0
+    np.cumsum(band, axis=axis, out=prefix_sums[_axis_slice(band.ndim, axis, 1, None)])
+
+    # Window bounds, clamped to the band, pixels outside the band are transparent
+    positions = np.arange(length)
+    upper = np.minimum(positions + box_radius + 1, length)
+    lower = np.maximum(positions - box_radius, 0)
+
+    result = prefix_sums.take(upper, axis=axis)
+    result -= prefix_sums.take(lower, axis=axis)
+    result *= 1 / width
+    return result
+
+
+def gaussian_blur_array(
+    pixels: np.ndarray,
+    sigma: float,
+    padding: int = 0,
+    max_workers: Optional[int] = None,
+    is_cancelled: Optional[IsCancelledCallback] = None,
+) -> np.ndarray:
+    """
+    Blur premultiplied pixels with shape (height, width, channels) and dtype uint8,
+    returns a new array grown by `padding` transparent pixels on each side before blurring.
+
+    Channels are blurred independently, so any premultiplied channel order works.
+    Raises FilterCancelled as soon as `is_cancelled` returns True.
+    """
+    assert pixels.ndim == 3 and pixels.dtype == np.uint8
+    assert sigma > 0 and padding >= 0
+
+    if sigma <= MAX_SIGMA_FOR_KERNEL_BLUR:
+        kernel = _gaussian_kernel(sigma)
+        # Distance over which a pixel is spread
+        blur_radius = len(kernel) // 2
+
+        def blur_band(band: np.ndarray, axis: int):
+            return _convolve_band(band, kernel, axis)
+
+    else:
+        box_sizes = _box_sizes_for_gaussian(sigma)
+        blur_radius = sum(box_size // 2 for box_size in box_sizes)
+
+        def blur_band(band: np.ndarray, axis: int):
+            # NOTE: box blurs commute, so all passes along an axis are done while the band is in cache
+            for box_size in box_sizes:
+                band = _box_blur_band(band, box_size, axis)
+            return band
+
+    height, width, num_channels = pixels.shape
+    result = np.empty(
+        (height + 2 * padding, width + 2 * padding, num_channels), np.uint8
+    )
+
+    # NOTE: rows of a band are blurred along with `blur_radius` rows above and below it, which the band
+    # is blurred with vertically, so that only bands (not the whole image) are held in float at once.
+    # Bands are tall enough that blurring these extra rows costs at most half as much as blurring the band rows.
+    row_size_in_bytes = result.shape[1] * num_channels * 4
+    band_height = max(
+        _BAND_SIZE,
+        4 * blur_radius,
+        _MAX_BAND_SIZE_IN_BYTES // row_size_in_bytes - 2 * blur_radius,
+    )
+
+    # Columns blurred at once, as many as the rows blurred at once hold pixels
+    num_columns = max(
+        _BAND_SIZE,
+        _BAND_SIZE * result.shape[1] // (band_height + 2 * blur_radius),
+    )
+
+    def blur_band_of_rows(start: int):
+        stop = min(start + band_height, result.shape[0])
+
+        # Rows of the band and around it (within the result, as pixels outside of it are transparent
+        # after each box blur pass), padding rows stay transparent after blurring rows
+        extended_start = max(start - blur_radius, 0)
+        extended_stop = min(stop + blur_radius, result.shape[0])
+        extended_band = np.zeros(
+            (extended_stop - extended_start, result.shape[1], num_channels),
+            np.float32,
+        )
+        first_row = extended_start - padding
+        source_start = max(first_row, 0)
+        source_stop = min(extended_stop - padding, height)
+
+        # NOTE: rows and columns are blurred a few at a time, so that they stay in CPU cache across passes
+        for y in range(source_start, source_stop, _BAND_SIZE):
+            raise_if_cancelled(is_cancelled)
+            rows = np.pad(
+                pixels[y : min(y + _BAND_SIZE, source_stop)].astype(np.float32),
+                ((0, 0), (padding, padding), (0, 0)),
+            )
+            extended_band[y - first_row : y - first_row + len(rows)] = blur_band(
+                rows, 1
+            )
+
+        for x in range(0, result.shape[1], num_columns):
+            raise_if_cancelled(is_cancelled)
+            columns = blur_band(extended_band[:, x : x + num_columns], 0)
+            columns = columns[start - extended_start : stop - extended_start]
+            columns += 0.5
+            np.clip(columns, 0, 255, out=columns)
+            result[start:stop, x : x + num_columns] = columns
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # NOTE: consume results so that exceptions raised in bands are propagated
+        for _ in executor.map(
+            blur_band_of_rows, range(0, result.shape[0], band_height)
+        ):
+            pass
+
+    return result
+
+
+def gaussian_blur_image(
+    image: QImage,
+    sigma: float,
+    is_cancelled: Optional[IsCancelledCallback] = None,
+    max_workers: Optional[int] = None,
+) -> QImage:
+    """
+    Blur an image with a gaussian of standard deviation `sigma` (in pixels),
+    returns a new image grown by `gaussian_blur_padding(sigma)` pixels on each side, so that blur is not clipped.
+    """
+    if image.format() != QImage.Format.Format_ARGB32_Premultiplied:
+        image = image.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+
+    padding = gaussian_blur_padding(sigma)
+    pixels = gaussian_blur_array(
+        argb32_premultiplied_view(image),
+        sigma,
+        padding,
+        max_workers=max_workers,
+        is_cancelled=is_cancelled,
+    )
+    return qimage_from_argb32_premultiplied(pixels, pixels.shape[1], pixels.shape[0])
+
+
+def apply_gaussian_blur(
+    image: QImage,
+    radius: float,
+    scale: float = 1.0,
+    is_cancelled: Optional[IsCancelledCallback] = None,
+    max_workers: Optional[int] = None,
+) -> Tuple[QImage, QRectF]:
+    """
+    Blur an image, `radius` (see GaussianBlurFilter) is given at full resolution and the image is scaled
+    by `scale` relative to it (e.g. a downscaled preview), returns the blurred image and its rect in image coordinates
+    """
+    sigma = gaussian_blur_sigma(radius * scale)
+    padding = gaussian_blur_padding(sigma)
+    blurred_image = gaussian_blur_image(image, sigma, is_cancelled, max_workers)
+    blurred_rect = QRectF(image.rect()).adjusted(-padding, -padding, padding, padding)
+    return blurred_image, blurred_rect
+
+
+class GaussianBlurFilter(NamedTuple):
+    KIND = b"GAUSSIAN_BLUR"
+
+    # Distance in pixels over which pixels are spread (see gaussian_blur_sigma)
+    radius: float
+
+    def map_rect(self, rect: QRectF) -> QRectF:
+        padding = gaussian_blur_padding(gaussian_blur_sigma(self.radius))
+        return rect.adjusted(-padding, -padding, padding, padding)
+
+    def apply(
+        self,
+        image: QImage,
+        scale: float = 1.0,
+        is_cancelled: Optional[IsCancelledCallback] = None,
+        max_workers: Optional[int] = None,
+    ) -> Tuple[QImage, QRectF]:
+        return apply_gaussian_blur(image, self.radius, scale, is_cancelled, max_workers)
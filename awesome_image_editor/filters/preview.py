@@ -0,0 +1,191 @@
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+from PyQt6.QtCore import QObject, QRectF, QSize, QTimer, pyqtSignal
+from PyQt6.QtGui import QImage
+
+from .base import FilterCancelled, IsCancelledCallback
+
+__all__ = ("FilterFunction", "FilterPreviewRenderer", "ScaledImageRenderer")
+
+# Applies a filter with given parameters to an image scaled by a factor relative to the full resolution source,
+# returns the filtered image and its rect in coordinates of the given image
+FilterFunction = Callable[
+    [QImage, Any, float, IsCancelledCallback], Tuple[QImage, QRectF]
+]
+
+# Renders an image scaled to fit in a size keeping aspect ratio (e.g. TiledImage.render_scaled)
+ScaledImageRenderer = Callable[[QSize], QImage]
+
+
+class FilterPreviewRenderer(QObject):
+    """
+    Renders a filter applied to a source image on a worker thread, while its parameters are being edited.
+
+    Rapid parameter changes are coalesced and rendered on a downscaled proxy of the source,
+    full resolution is only rendered when requested (e.g. when a slider is released or a dialog accepted).
+    Jobs made stale by newer requests are cancelled, and their results are never emitted.
+
+    The source is given by callables run on the worker thread, so that a full resolution source
+    is only assembled once a full resolution result is requested, and proxies can be rendered without it.
+    """
+
+    # Image and its rect in source image coordinates
+    previewReady = pyqtSignal(object, object)
+    resultReady = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+
+    # (generation, is full resolution, params, image, rect), emitted from the worker thread
+    _jobFinished = pyqtSignal(int, bool, object, object, object)
+
+    DEBOUNCE_INTERVAL_MS = 40
+    PROXY_MAX_SIZE = QSize(1024, 1024)
+
+    def __init__(
+        self,
+        source_size: QSize,
+        load_source_image: Callable[[], QImage],
+        render_scaled_source: ScaledImageRenderer,
+        filter_function: FilterFunction,
+        parent: Optional[QObject] = None,
+    ):
+        super().__init__(parent)
+        self._source_size = source_size
+        self._load_source_image = load_source_image
+        self._render_scaled_source = render_scaled_source
+        self._filter_function = filter_function
+        # NOTE: source and proxy are only ever accessed from the (single) worker thread
+        self._source_image: Optional[QImage] = None
+        self._proxy: Optional[Tuple[QImage, float, float]] = None
+
+        # Incremented by every request, so that jobs can tell they are stale
+        self._generation = 0
+        self._pending_preview_params: Any = None
+        # Parameters and outputs of the last full resolution result
+        self._last_result: Optional[Tuple[Any, QImage, QRectF]] = None
+
+        self._debounce_timer = QTimer(self)
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(self.DEBOUNCE_INTERVAL_MS)
+        self._debounce_timer.timeout.connect(self._start_preview_job)
+
+        # NOTE: a single worker, so that at most one (non-stale) job competes with the GUI for CPU
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._jobFinished.connect(self._on_job_finished)
+
+    def request_preview(self, params: Any):
+        """Render a downscaled preview with given parameters, once they stop changing"""
+        self._generation += 1
+        self._pending_preview_params = params
+        self._debounce_timer.start()
+
+    def request_result(self, params: Any):
+        """Render the full resolution result with given parameters as soon as possible"""
+        self._debounce_timer.stop()
+        self._generation += 1
+
+        result = self.get_result(params)
+        if result is not None:
+            self.resultReady.emit(*result)
+            return
+
+        self._submit(params, is_full_resolution=True)
+
+    def get_result(self, params: Any) -> Optional[Tuple[QImage, QRectF]]:
+        """Full resolution result with given parameters if it was already rendered, None otherwise"""
+        if self._last_result is not None and self._last_result[0] == params:
+            _, image, rect = self._last_result
+            return image, rect
+        return None
+
+    def cancel(self):
+        """Cancel pending and running jobs, their results are discarded"""
+        self._debounce_timer.stop()
+        self._generation += 1
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _start_preview_job(self):
+        self._submit(self._pending_preview_params, is_full_resolution=False)
+
+    def _get_source_image(self) -> QImage:
+        if self._source_image is None:
+            self._source_image = self._load_source_image()
+        return self._source_image
+
+    def _get_proxy(self) -> Tuple[QImage, float, float]:
+        """Source image downscaled to fit PROXY_MAX_SIZE, with its horizontal and vertical scale factors"""
+        if self._proxy is None:
+            source_size = self._source_size
+            if (
+                source_size.width() <= self.PROXY_MAX_SIZE.width()
+                and source_size.height() <= self.PROXY_MAX_SIZE.height()
+            ):
+                self._proxy = (self._get_source_image(), 1.0, 1.0)
+            else:
+                proxy_image = self._render_scaled_source(self.PROXY_MAX_SIZE)
+                self._proxy = (
+                    proxy_image,
+                    proxy_image.width() / source_size.width(),
+                    proxy_image.height() / source_size.height(),
+                )
+        return self._proxy
+
+    def _submit(self, params: Any, is_full_resolution: bool):
+        generation = self._generation
+
+        def is_cancelled():
+            return generation != self._generation
+
+        def run_job():
+            if is_cancelled():
+                return
+
+            try:
+                if is_full_resolution:
+                    image, rect = self._filter_function(
+                        self._get_source_image(), params, 1.0, is_cancelled
+                    )
+                else:
+                    proxy_image, scale_x, scale_y = self._get_proxy()
+                    image, rect = self._filter_function(
+                        proxy_image, params, min(scale_x, scale_y), is_cancelled
+                    )
+                    rect = QRectF(
+                        rect.x() / scale_x,
+                        rect.y() / scale_y,
+                        rect.width() / scale_x,
+                        rect.height() / scale_y,
+                    )
+            except FilterCancelled:
+                return
+            except:
+                self.failed.emit(traceback.format_exc())
+                return
+
+            self._jobFinished.emit(generation, is_full_resolution, params, image, rect)
+
+        self._executor.submit(run_job)
+
+    def _on_job_finished(
+        self,
+        generation: int,
+        is_full_resolution: bool,
+        params: Any,
+        image: QImage,
+        rect: QRectF,
+    ):
+        if is_full_resolution:
+            self._last_result = (params, image, rect)
+
+        # Parameters changed while the result was queued
+        if generation != self._generation:
+            return
+
+        if is_full_resolution:
+            self.resultReady.emit(image, rect)
+        else:
+            self.previewReady.emit(image, rect)
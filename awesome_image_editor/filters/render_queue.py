@@ -0,0 +1,105 @@
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional, Sequence
+
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtGui import QImage
+
+from .base import LayerFilterProtocol
+from .stack import (
+    FilterStageCache,
+    StageOutput,
+    filter_stage_cache,
+    render_filter_stack,
+)
+
+__all__ = (
+    "FilterStackRenderQueue",
+    "RenderedCallback",
+    "filter_stack_render_queue",
+)
+
+# Called on the GUI thread with the output of a filter stack (filtered image and its rect in source image coordinates)
+RenderedCallback = Callable[[StageOutput], None]
+
+
+class FilterStackRenderQueue(QObject):
+    """
+    Renders filter stacks of layers on a worker thread when they are needed but not cached (e.g. when a layer is painted),
+    so that the GUI thread does not wait for them. Outputs are put in the stage cache as they are rendered.
+
+    A stack requested again while it is being rendered is rendered once, all callbacks are called with its output.
+    """
+
+    failed = pyqtSignal(str)
+
+    # (stage cache key, output or None, error message or None), emitted from the worker thread
+    _jobFinished = pyqtSignal(object, object, object)
+
+    def __init__(
+        self,
+        cache: FilterStageCache = filter_stage_cache,
+        parent: Optional[QObject] = None,
+    ):
+        super().__init__(parent)
+        self._cache = cache
+        # Callbacks of requested stacks by their stage cache key
+        self._callbacks: Dict[Hashable, List[RenderedCallback]] = {}
+        # NOTE: a single worker, filters already use every CPU, and the GUI keeps some of them
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._jobFinished.connect(self._on_job_finished)
+
+    def request(
+        self,
+        source_key: Hashable,
+        load_source_image: Callable[[], QImage],
+        filters: Sequence[LayerFilterProtocol],
+        on_rendered: RenderedCallback,
+    ):
+        """Render a filter stack on the worker thread, `on_rendered` is called with its output (not if it failed)"""
+        filters = tuple(filters)
+        key = self._cache.key(source_key, filters)
+        callbacks = self._callbacks.get(key)
+        if callbacks is not None:
+            callbacks.append(on_rendered)
+            return
+
+        self._callbacks[key] = [on_rendered]
+        self._executor.submit(
+            self._run_job, key, source_key, load_source_image, filters
+        )
+
+    def _run_job(
+        self,
+        key: Hashable,
+        source_key: Hashable,
+        load_source_image: Callable[[], QImage],
+        filters: Sequence[LayerFilterProtocol],
+    ):
+        try:
+            output = render_filter_stack(
+                source_key, load_source_image, filters, cache=self._cache
+            )
+        except:
+            self._jobFinished.emit(key, None, traceback.format_exc())
+            return
+
+        self._jobFinished.emit(key, output, None)
+
+    def _on_job_finished(
+        self,
+        key: Hashable,
+        output: Optional[StageOutput],
+        error_message: Optional[str],
+    ):
+        callbacks = self._callbacks.pop(key)
+        if error_message is not None:
+            self.failed.emit(error_message)
+            return
+
+        for on_rendered in callbacks:
+            on_rendered(output)
+
+
+# Shared by all layers, so that a single stack is rendered at a time
+filter_stack_render_queue = FilterStackRenderQueue()
@@ -0,0 +1,210 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Tuple, Type
+
+from PyQt6.QtCore import QRectF
+from PyQt6.QtGui import QImage
+
+from .adjustments import ADJUSTMENT_TYPES, AdjustmentsFilter
+from .base import IsCancelledCallback, LayerFilterProtocol
+from .gaussian_blur import GaussianBlurFilter
+
+__all__ = (
+    "FILTER_TYPES",
+    "PARAM_TYPES",
+    "FilterStageCache",
+    "filter_from_json",
+    "filter_stage_cache",
+    "filter_to_json",
+    "map_filter_stack_rect",
+    "render_filter_stack",
+)
+
+# Filter types by their kind, used to read filters back from files
+FILTER_TYPES: Dict[bytes, Type[LayerFilterProtocol]] = {
+    GaussianBlurFilter.KIND: GaussianBlurFilter,
+    AdjustmentsFilter.KIND: AdjustmentsFilter,
+}
+
+# Types of parameters that are themselves parameter objects, by their kind
+PARAM_TYPES: Dict[bytes, Type] = dict(ADJUSTMENT_TYPES)
+
+DEFAULT_FILTER_STAGE_CACHE_SIZE = 512 * 1024 * 1024
+
+# Output of a filter stack stage: filtered image and its rect in source image coordinates
+StageOutput = Tuple[QImage, QRectF]
+
+
+class FilterStageCache:
+    """
+    Outputs of filter stack stages, keyed by source pixels version (e.g. TiledImage.pixels_key) and the filters up to the stage,
+    so that changing a filter only invalidates the stages from it down.
+    Bounded by the total size of cached images, least recently used outputs are evicted first.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_FILTER_STAGE_CACHE_SIZE):
+        self.max_size = max_size
+        self._outputs: "OrderedDict[Hashable, StageOutput]" = OrderedDict()
+        self._size = 0
+        # NOTE: stages may be rendered off the GUI thread (e.g. filter previews)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(source_key: Hashable, filters: Sequence[LayerFilterProtocol]) -> Hashable:
+        return source_key, tuple(filters)
+
+    def get(self, key: Hashable) -> Optional[StageOutput]:
+        with self._lock:
+            output = self._outputs.get(key)
+            if output is not None:
+                self._outputs.move_to_end(key)
+            return output
+
+    def put(self, key: Hashable, output: StageOutput):
+        image_size = output[0].sizeInBytes()
+
+        with self._lock:
+            previous_output = self._outputs.pop(key, None)
+            if previous_output is not None:
+                self._size -= previous_output[0].sizeInBytes()
+
+            self._outputs[key] = output
+            self._size += image_size
+            # NOTE: an output larger than the whole cache is evicted right away
+            while self._size > self.max_size:
+                _, evicted_output = self._outputs.popitem(last=False)
+                self._size -= evicted_output[0].sizeInBytes()
+
+    def get_size(self) -> int:
+        """Total size in bytes of cached images"""
+        return self._size
+
+    def clear(self):
+        with self._lock:
+            self._outputs.clear()
+            self._size = 0
+
+
+# Shared by all layers, so that the memory bound applies to the whole application
+filter_stage_cache = FilterStageCache()
+
+
+def map_filter_stack_rect(
+    rect: QRectF, filters: Sequence[LayerFilterProtocol]
+) -> QRectF:
+    """Rect of the output of a filter stack for a source image of given rect, without rendering it"""
+    for layer_filter in filters:
+        rect = layer_filter.map_rect(rect)
+    return rect
+
+
+def _get_stage_filter(
+    filters: Sequence[LayerFilterProtocol], start: int
+) -> Tuple[LayerFilterProtocol, int]:
+    """
+    Filter rendering the stage of a stack starting at filter `start`, and the index of the filter after the stage.
+    Consecutive adjustments filters are merged into one stage, so that their adjustments are compiled together
+    and applied in a single pass over pixels.
+    """
+    stop = start + 1
+    if not isinstance(filters[start], AdjustmentsFilter):
+        return filters[start], stop
+
+    while stop < len(filters) and isinstance(filters[stop], AdjustmentsFilter):
+        stop += 1
+    if stop == start + 1:
+        return filters[start], stop
+
+    adjustments = tuple(
+        adjustment
+        for layer_filter in filters[start:stop]
+        for adjustment in layer_filter.adjustments
+    )
+    return AdjustmentsFilter(adjustments), stop
+
+
+def render_filter_stack(
+    source_key: Hashable,
+    load_source_image: Callable[[], QImage],
+    filters: Sequence[LayerFilterProtocol],
+    is_cancelled: Optional[IsCancelledCallback] = None,
+    cache: FilterStageCache = filter_stage_cache,
+    max_workers: Optional[int] = None,
+) -> StageOutput:
+    """
+    Apply filters one after the other to a source image, returns the output of the last filter
+    and its rect in source image coordinates. Only stages after the last cached one are rendered.
+
+    `source_key` identifies source pixels, the source image is only loaded when no stage is cached.
+    `max_workers` bounds the number of threads each filter uses.
+
+    NOTE: consecutive adjustments filters are rendered as one stage, outputs of filters inside of it are not cached
+    """
+    # Find the deepest cached stage
+    num_cached_filters = 0
+    output = None
+    for i in range(len(filters), 0, -1):
+        cached_output = cache.get(cache.key(source_key, filters[:i]))
+        if cached_output is not None:
+            num_cached_filters = i
+            output = cached_output
+            break
+
+    if output is None:
+        source_image = load_source_image()
+        output = (source_image, QRectF(source_image.rect()))
+
+    i = num_cached_filters
+    while i < len(filters):
+        stage_filter, i = _get_stage_filter(filters, i)
+        input_image, input_rect = output
+        filtered_image, filtered_rect = stage_filter.apply(
+            input_image, is_cancelled=is_cancelled, max_workers=max_workers
+        )
+        output = (filtered_image, filtered_rect.translated(input_rect.topLeft()))
+        cache.put(cache.key(source_key, filters[:i]), output)
+
+    return output
+
+
+def _encode_param(value: Any) -> Any:
+    # Nested parameter objects (e.g. adjustments of an adjustments filter) are written with their kind
+    if isinstance(value, tuple) and hasattr(value, "_asdict"):
+        return {
+            "kind": value.KIND.decode(),
+            "params": {name: _encode_param(v) for name, v in value._asdict().items()},
+        }
+    if isinstance(value, (tuple, list)):
+        return [_encode_param(element) for element in value]
+    return value
+
+
+def _decode_param(value: Any) -> Any:
+    if isinstance(value, dict):
+        param_type = PARAM_TYPES.get(value["kind"].encode())
+        assert param_type is not None, f"Unknown parameter kind {value['kind']}"
+        return param_type(
+            **{name: _decode_param(v) for name, v in value["params"].items()}
+        )
+    # NOTE: JSON arrays are read back as lists, filters must stay hashable
+    if isinstance(value, list):
+        return tuple(_decode_param(element) for element in value)
+    return value
+
+
+def filter_to_json(layer_filter: LayerFilterProtocol) -> str:
+    """Filter parameters as a JSON object"""
+    return json.dumps(
+        {name: _encode_param(value) for name, value in layer_filter._asdict().items()}
+    )
+
+
+def filter_from_json(kind: bytes, params_json: str) -> LayerFilterProtocol:
+    filter_type = FILTER_TYPES.get(kind)
+    assert filter_type is not None, f"Unknown filter kind {kind}"
+
+    params = {
+        name: _decode_param(value) for name, value in json.loads(params_json).items()
+    }
+    return filter_type(**params)
@@ -0,0 +1,94 @@
+import sys
+from typing import Union
+
+import numpy as np
+from PyQt6.QtGui import QImage
+
+__all__ = (
+    "ARGB32_CHANNEL_ORDER",
+    "argb32_premultiplied_view",
+    "qimage_from_argb32_premultiplied",
+    "rgba_to_argb32_premultiplied",
+)
+
+# Byte indices of (blue, green, red, alpha) channels in memory of 32-bit ARGB QImage formats,
+# pixels are stored as native-endian 0xAARRGGBB integers
+if sys.byteorder == "little":
+    ARGB32_CHANNEL_ORDER = (0, 1, 2, 3)
+else:
+    ARGB32_CHANNEL_ORDER = (3, 2, 1, 0)
+
+# Number of rows converted at once, bounds memory used by 16-bit intermediate results
+_CONVERSION_BAND_HEIGHT = 256
+
+
+def rgba_to_argb32_premultiplied(rgba: np.ndarray) -> np.ndarray:
+    """
+    Convert straight alpha RGBA pixels with shape (height, width, 4) and dtype uint8
+    to the memory layout of QImage.Format_ARGB32_Premultiplied, in a single new buffer
+    """
+    assert rgba.ndim == 3 and rgba.shape[2] == 4 and rgba.dtype == np.uint8
+
+    blue_index, green_index, red_index, alpha_index = ARGB32_CHANNEL_ORDER
+    # Destination channel indices of source red, green and blue channels
+    color_indices = [red_index, green_index, blue_index]
+
+    result = np.empty_like(rgba)
+    for y in range(0, rgba.shape[0], _CONVERSION_BAND_HEIGHT):
+        src = rgba[y : y + _CONVERSION_BAND_HEIGHT]
+        dst = result[y : y + _CONVERSION_BAND_HEIGHT]
+        dst[..., alpha_index] = src[..., 3]
+
+        # Rounded (color * alpha / 255), using shifts instead of a (slow) integer division
+        premultiplied = src[..., :3] * src[..., 3:].astype(np.uint16)
+        premultiplied += 128
+        premultiplied += premultiplied >> 8
+        premultiplied >>= 8
+        dst[..., color_indices] = premultiplied
+
+    return result
+
+
+def qimage_from_argb32_premultiplied(
+    pixels: Union[bytes, np.ndarray], width: int, height: int
+) -> QImage:
+    """
+    Wrap a tightly packed buffer in the memory layout of QImage.Format_ARGB32_Premultiplied into a QImage
+    without copying it, the buffer is kept alive as long as the returned QImage object.
+
+    Read-only buffers (bytes) are copied by Qt on first write, numpy arrays are written to in place.
+    NOTE: shallow copies made by Qt itself (e.g. QImage(image)) do not keep the buffer alive.
+    """
+    if isinstance(pixels, np.ndarray):
+        assert pixels.dtype == np.uint8 and pixels.flags.c_contiguous
+        assert pixels.nbytes == width * height * 4
+        data = pixels.data
+    else:
+        assert len(pixels) == width * height * 4
+        data = pixels
+
+    image = QImage(
+        data, width, height, width * 4, QImage.Format.Format_ARGB32_Premultiplied
+    )
+    image._pixels_buffer = pixels
+    return image
+
+
+def argb32_premultiplied_view(image: QImage) -> np.ndarray:
+    """
+    Read-only numpy view with shape (height, width, 4) over pixels of a QImage.Format_ARGB32_Premultiplied image,
+    without copying them.
+
+    NOTE: the view does not keep the image alive, keep a reference to the image while using it.
+    """
+    assert image.format() == QImage.Format.Format_ARGB32_Premultiplied
+
+    width, height = image.width(), image.height()
+    if width == 0 or height == 0:
+        return np.zeros((height, width, 4), np.uint8)
+
+    # NOTE: constBits does not detach the image (unlike bits), so the view is over shared pixels
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    rows = np.frombuffer(bits, np.uint8).reshape(height, image.bytesPerLine())
+    return rows[:, : width * 4].reshape(height, width, 4)
@@ -0,0 +1,281 @@
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+from PyQt6.QtCore import QObject, QRect, QSize, Qt, QThread, pyqtSignal
+from PyQt6.QtGui import QImage, QImageIOHandler, QImageReader
+
+from .tiled_image import TILE_SIZE, TiledImage
+
+__all__ = (
+    "ImageBatchImporter",
+    "ImageImportWorker",
+    "get_image_allocation_limit",
+    "is_image_file",
+    "read_image_preview",
+    "read_image_tiles",
+)
+
+# Size the preview shown while an image is being decoded fits in
+PREVIEW_SIZE = QSize(1024, 1024)
+
+# QImageReader default allocation limit in megabytes
+DEFAULT_ALLOCATION_LIMIT = 256
+
+# Maximum size in bytes of a region decoded at once when an image is decoded region by region
+DECODE_BAND_SIZE = 64 * 1024**2
+
+
+def is_image_file(filepath: str):
+    """Whether a path is a file in a format QImageReader can decode, judging by its extension"""
+    suffix = os.path.splitext(filepath)[1][1:].lower().encode()
+    return os.path.isfile(filepath) and suffix in QImageReader.supportedImageFormats()
+
+
+def get_image_allocation_limit() -> int:
+    """Size in bytes of the largest image QImageReader decodes at once, 0 if unlimited"""
+    # NOTE: QImageReader.allocationLimit is not available in older PyQt6 versions,
+    # Qt then only lets the limit be changed by the QT_IMAGEIO_MAXALLOC environment variable
+    if hasattr(QImageReader, "allocationLimit"):
+        allocation_limit = QImageReader.allocationLimit()
+    else:
+        allocation_limit = int(
+            os.environ.get("QT_IMAGEIO_MAXALLOC", DEFAULT_ALLOCATION_LIMIT)
+        )
+    return allocation_limit * 1024**2
+
+
+def _get_decoded_size_in_bytes(reader: QImageReader, size: QSize):
+    image_format = reader.imageFormat()
+    if image_format == QImage.Format.Format_Invalid:
+        bits_per_pixel = 32
+    else:
+        bits_per_pixel = QImage.toPixelFormat(image_format).bitsPerPixel()
+    return size.width() * size.height() * bits_per_pixel // 8
+
+
+def _read(reader: QImageReader) -> QImage:
+    image = reader.read()
+    if image.isNull():
+        raise IOError(
+            f"Failed to read image {reader.fileName()}: {reader.errorString()}"
+        )
+    return image
+
+
+def read_image_preview(
+    filepath: str, max_size: QSize = PREVIEW_SIZE
+) -> Optional[QImage]:
+    """
+    Decode an image at reduced size to fit in `max_size`, None if its format cannot decode at reduced size directly
+    (e.g. PNG), as decoding at full size just for a preview would take as long as decoding the image itself
+    """
+    reader = QImageReader(filepath)
+    size = reader.size()
+    if not reader.supportsOption(QImageIOHandler.ImageOption.ScaledSize):
+        return None
+    if not size.isValid() or (
+        size.width() <= max_size.width() and size.height() <= max_size.height()
+    ):
+        return None
+
+    reader.setScaledSize(size.scaled(max_size, Qt.AspectRatioMode.KeepAspectRatio))
+    image = reader.read()
+    return None if image.isNull() else image
+
+
+def read_image_tiles(
+    filepath: str, is_cancelled: Optional[Callable[[], bool]] = None
+) -> Optional[TiledImage]:
+    """
+    Decode an image into tiles, images above the QImageReader allocation limit are decoded region by region
+    (in bands of whole tile rows) if their format supports it (e.g. JPEG). Returns None if cancelled.
+    """
+    reader = QImageReader(filepath)
+    size = reader.size()
+    allocation_limit = get_image_allocation_limit()
+
+    if (
+        not size.isValid()
+        or allocation_limit == 0
+        or _get_decoded_size_in_bytes(reader, size) <= allocation_limit
+    ):
+        return TiledImage.from_qimage(_read(reader))
+
+    if not reader.supportsOption(QImageIOHandler.ImageOption.ClipRect):
+        raise IOError(
+            f"Image {filepath} ({size.width()}x{size.height()}) is over the allocation limit of "
+            f"{allocation_limit // 1024**2} MB and its format cannot be decoded region by region"
+        )
+
+    # NOTE: bands are made of whole tile rows, so that band tiles are image tiles
+    tile_row_size_in_bytes = _get_decoded_size_in_bytes(
+        reader, QSize(size.width(), TILE_SIZE)
+    )
+    # Bands are decoded by QImageReader too, so they must be within the allocation limit as well
+    max_band_size_in_bytes = min(DECODE_BAND_SIZE, allocation_limit)
+    if tile_row_size_in_bytes > max_band_size_in_bytes:
+        raise IOError(
+            f"Image {filepath} ({size.width()}x{size.height()}) is over the allocation limit of "
+            f"{allocation_limit // 1024**2} MB, even a single row of tiles of it is"
+        )
+    band_height = TILE_SIZE * (max_band_size_in_bytes // tile_row_size_in_bytes)
+
+    tiled_image = TiledImage(size.width(), size.height())
+    for y in range(0, size.height(), band_height):
+        if is_cancelled is not None and is_cancelled():
+            return None
+
+        # NOTE: a reader decodes a single image, each band needs its own
+        band_reader = QImageReader(filepath)
+        band_reader.setClipRect(
+            QRect(0, y, size.width(), min(band_height, size.height() - y))
+        )
+        band_tiles = TiledImage.from_qimage(_read(band_reader))
+
+        first_row = y // TILE_SIZE
+        for column, row in band_tiles.get_tile_positions():
+            tiled_image.set_tile(
+                column, first_row + row, band_tiles.get_tile(column, row)
+            )
+
+    return tiled_image
+
+
+class ImageImportWorker(QThread):
+    """
+    Decode an image file off the GUI thread, a reduced size preview is decoded first when it is cheap to do so.
+
+    Cancel with `requestInterruption()`, `was_cancelled()` tells whether import ended early.
+    """
+
+    # Image width and height, emitted once the image header is read
+    opened = pyqtSignal(int, int)
+    # Reduced size QImage, emitted before the full size image
+    previewReady = pyqtSignal(object)
+    # Full size TiledImage
+    imageReady = pyqtSignal(object)
+    # Formatted traceback
+    failed = pyqtSignal(str)
+
+    def __init__(self, filepath: str):
+        super().__init__()
+        self._filepath = filepath
+        self._was_cancelled = False
+
+    def was_cancelled(self):
+        return self._was_cancelled
+
+    def run(self) -> None:
+        try:
+            self._import()
+        except Exception:
+            self.failed.emit(traceback.format_exc())
+
+    def _import(self):
+        size = QImageReader(self._filepath).size()
+        if size.isValid():
+            self.opened.emit(size.width(), size.height())
+
+            preview = read_image_preview(self._filepath)
+            if preview is not None:
+                self.previewReady.emit(preview)
+
+        tiled_image = read_image_tiles(self._filepath, self.isInterruptionRequested)
+        if tiled_image is None:
+            self._was_cancelled = True
+            return
+
+        self.imageReady.emit(tiled_image)
+
+
+class ImageBatchImporter(QObject):
+    """
+    Decodes many image files on a thread pool, reporting combined progress.
+
+    Images are emitted at once in the same order as files, whichever finishes decoding first,
+    so that they can be added to a scene in a single batch. Files that fail to decode are skipped and reported,
+    cancelling discards all images.
+    """
+
+    # Number of decoded files, total number of files
+    progressChanged = pyqtSignal(int, int)
+    # TiledImage of each file in the same order as files (None for files that failed), formatted tracebacks
+    finished = pyqtSignal(list, list)
+    cancelled = pyqtSignal()
+
+    # (file index, TiledImage or None, error message or None), emitted from worker threads
+    _fileDecoded = pyqtSignal(int, object, object)
+
+    def __init__(
+        self,
+        filepaths: Sequence[str],
+        max_workers: Optional[int] = None,
+        parent: Optional[QObject] = None,
+    ):
+        super().__init__(parent)
+        self._filepaths = list(filepaths)
+        self._images: List[Optional[TiledImage]] = [None] * len(self._filepaths)
+        self._num_decoded_files = 0
+        self._error_messages: List[str] = []
+        self._is_cancelled = False
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._fileDecoded.connect(self._on_file_decoded)
+
+    def start(self):
+        if len(self._filepaths) == 0:
+            self.finished.emit([], [])
+            return
+
+        for file_index in range(len(self._filepaths)):
+            self._executor.submit(self._decode_file, file_index)
+
+        # NOTE: does not wait, workers exit once files are decoded
+        self._executor.shutdown(wait=False)
+
+    def cancel(self):
+        """Stop decoding, only `cancelled` is emitted once running decodes stopped"""
+        # NOTE: pending files are not cancelled but return right away, so that every file reports back
+        self._is_cancelled = True
+
+    def _is_file_cancelled(self):
+        return self._is_cancelled
+
+    def _decode_file(self, file_index: int):
+        if self._is_cancelled:
+            self._fileDecoded.emit(file_index, None, None)
+            return
+
+        try:
+            image = read_image_tiles(
+                self._filepaths[file_index], self._is_file_cancelled
+            )
+        except:
+            self._fileDecoded.emit(file_index, None, traceback.format_exc())
+            return
+
+        self._fileDecoded.emit(file_index, image, None)
+
+    def _on_file_decoded(
+        self,
+        file_index: int,
+        image: Optional[TiledImage],
+        error_message: Optional[str],
+    ):
+        self._num_decoded_files += 1
+        self._images[file_index] = image
+        if error_message is not None:
+            self._error_messages.append(error_message)
+
+        self.progressChanged.emit(self._num_decoded_files, len(self._filepaths))
+        if self._num_decoded_files < len(self._filepaths):
+            return
+
+        if self._is_cancelled:
+            self.cancelled.emit()
+        else:
+            self.finished.emit(self._images, self._error_messages)
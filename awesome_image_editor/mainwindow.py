@@ -1,31 +1,79 @@
 import traceback
 from pathlib import Path
+from typing import TYPE_CHECKING, Callable, List, Optional, Sequence
 
-from PyQt6.QtCore import QStandardPaths, Qt
-from PyQt6.QtGui import QFont, QImage
+from PyQt6.QtCore import (
+    QPointF,
+    QRectF,
+    QStandardPaths,
+    Qt,
+    QTimer,
+    pyqtBoundSignal,
+    pyqtSignal,
+)
+from PyQt6.QtGui import (
+    QCloseEvent,
+    QFont,
+    QImage,
+    QKeySequence,
+    QPaintEvent,
+    QUndoGroup,
+)
 from PyQt6.QtWidgets import (
+    QDialog,
     QDockWidget,
-    QGraphicsBlurEffect,
+    QGraphicsItem,
     QMainWindow,
     QMenu,
     QMessageBox,
+    QProgressDialog,
     QToolBar,
 )
 
+from .dialogs.adjustments import (
+    BRIGHTNESS_CONTRAST_PARAMETERS,
+    CURVES_PARAMETERS,
+    HUE_SATURATION_PARAMETERS,
+    LEVELS_PARAMETERS,
+    AdjustmentDialog,
+    AdjustmentParameter,
+)
 from .dialogs.gaussian_blur import GaussianBlurDialog
-from .file_dialog import create_open_file_dialog, create_save_file_dialog
+from .file_dialog import (
+    create_open_directory_dialog,
+    create_open_file_dialog,
+    create_open_files_dialog,
+    create_save_file_dialog,
+)
 from .file_format import AIEProject
-from .psd_read import load_psd_as_project
+from .model_view.items.image import AIEImageItem
+from .model_view.undo import SetFiltersCommand, SetPixelsCommand
+
+# NOTE: PSD reading pulls in psd_tools (and PIL), exports and filters pull in numpy,
+# they are only imported once used (e.g. a PSD is opened) to keep startup fast
+if TYPE_CHECKING:
+    from .export import ExportPreset
+    from .filters.adjustments import Adjustment
+    from .filters.base import LayerFilterProtocol
+    from .image_read import ImageImportWorker
+    from .psd_read import PSDProjectBuilder
+    from .psd_read.cache import PSDProjectCache
+    from .psd_read.worker import PSDImportWorker
 
 __all__ = ("MainWindow",)
 
 
 class MainWindow(QMainWindow):
+    # Emitted once the window is painted for the first time, non-essential UI is built right after
+    firstFramePainted = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Awesome Image Editor")
+        # Undo stacks of opened projects, only the current project one is active
+        self._undo_group = QUndoGroup(self)
         self.setup_file_menu()
-        self.setup_filters_menu()
+        self.setup_edit_menu()
 
         self.layers_dock_widget = QDockWidget("Layers")
         self.addDockWidget(
@@ -34,9 +82,41 @@ class MainWindow(QMainWindow):
             Qt.Orientation.Vertical,
         )
 
+        self._psd_import_worker: Optional["PSDImportWorker"] = None
+        self._image_import_workers: List["ImageImportWorker"] = []
+        # Created on first PSD import
+        self._psd_project_cache: Optional["PSDProjectCache"] = None
+
         self._project = AIEProject()
+        self._project.get_graphics_view().imageFilesDropped.connect(self.import_images)
         self.setCentralWidget(self._project.get_graphics_view())
         self.layers_dock_widget.setWidget(self._project.get_layers_widget())
+        self.activate_project_undo_stack()
+
+        self._is_first_frame_painted = False
+        self.firstFramePainted.connect(self.setup_deferred_ui)
+
+        self.showMaximized()
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        super().paintEvent(event)
+
+        if not self._is_first_frame_painted:
+            self._is_first_frame_painted = True
+            # NOTE: queued, so that the first frame is flushed to the screen before building more UI
+            QTimer.singleShot(0, self.firstFramePainted.emit)
+
+    def setup_deferred_ui(self):
+        """UI that is not needed to show the first frame"""
+        from .filters import filter_stack_render_queue
+
+        # Filter stacks of painted layers are rendered in the background
+        filter_stack_render_queue.failed.connect(
+            lambda error_message: QMessageBox.critical(self, "Error", error_message)
+        )
+
+        self.setup_export_preset_menu()
+        self.setup_filters_menu()
 
         # TODO: add tools to toolbar
         toolbar = QToolBar()
@@ -47,16 +127,46 @@ class MainWindow(QMainWindow):
         toolbar.setFont(toolbar_font)
         self.addToolBar(Qt.ToolBarArea.LeftToolBarArea, toolbar)
 
-        self.showMaximized()
+    def closeEvent(self, event: QCloseEvent) -> None:
+        if self._psd_import_worker is not None:
+            self._psd_import_worker.requestInterruption()
+            self._psd_import_worker.wait()
+
+        for worker in self._image_import_workers:
+            worker.requestInterruption()
+            worker.wait()
+
+        super().closeEvent(event)
 
     def set_project(self, project: AIEProject):
+        # NOTE: take the current graphics view instead of letting QMainWindow delete it,
+        # so that the previous project stays usable (e.g. restored when PSD import is cancelled)
+        self.takeCentralWidget()
+        self._project.get_graphics_view().imageFilesDropped.disconnect(
+            self.import_images
+        )
         self._project = project
+        self._project.get_graphics_view().imageFilesDropped.connect(self.import_images)
         self.setCentralWidget(self._project.get_graphics_view())
         self.layers_dock_widget.setWidget(self._project.get_layers_widget())
+        self.activate_project_undo_stack()
 
     def get_project(self):
         return self._project
 
+    def get_psd_project_cache(self) -> "PSDProjectCache":
+        if self._psd_project_cache is None:
+            from .psd_read.cache import PSDProjectCache
+
+            self._psd_project_cache = PSDProjectCache.default()
+        return self._psd_project_cache
+
+    def activate_project_undo_stack(self):
+        undo_stack = self._project.get_graphics_scene().get_undo_stack()
+        # NOTE: stacks are removed from the group when their project is deleted
+        self._undo_group.addStack(undo_stack)
+        self._undo_group.setActiveStack(undo_stack)
+
     def open_project(self):
         default_dir = QStandardPaths.writableLocation(
             QStandardPaths.StandardLocation.PicturesLocation
@@ -90,60 +200,392 @@ class MainWindow(QMainWindow):
         default_dir = QStandardPaths.writableLocation(
             QStandardPaths.StandardLocation.PicturesLocation
         )
-        dlg = create_open_file_dialog(default_dir, "Image files (*.jpg *.png)")
+        dlg = create_open_files_dialog(default_dir, "Image files (*.jpg *.png)")
+
+        if dlg.exec():
+            filepaths = dlg.selectedFiles()
+            if len(filepaths) == 1:
+                self.import_image(filepaths[0])
+            else:
+                self.import_images(filepaths)
+
+    def import_image(self, filepath: str):
+        """
+        Decode an image in the background into a new layer of the current project,
+        a reduced size preview is shown in place of the layer pixels until they are decoded
+        """
+        from .image_read import ImageImportWorker
+        from .tiled_image import TiledImage
+
+        project = self._project
+        worker = ImageImportWorker(filepath)
+        self._image_import_workers.append(worker)
+        item: Optional[AIEImageItem] = None
+        error_messages = []
+
+        def add_item(width: int, height: int):
+            nonlocal item
+            item = project.add_image_layer(
+                TiledImage(width, height), Path(filepath).stem
+            )
+            # NOTE: not selectable until decoded, so that filters are not applied to missing pixels
+            item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable, False)
+
+        def on_preview_ready(preview: QImage):
+            assert item is not None
+            # NOTE: the placeholder has no pixels yet, so its bounds are empty, stretch the preview over its size
+            item.set_filter_preview(preview, QRectF(item.tiles.rect()))
+
+        def on_image_ready(tiled_image: TiledImage):
+            if item is None:
+                add_item(tiled_image.width(), tiled_image.height())
+            assert item is not None
+            item.set_image(tiled_image)
+            item.set_filter_preview(None)
+            item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable, True)
+
+        def on_finished():
+            self._image_import_workers.remove(worker)
+
+            is_import_complete = not (
+                worker.was_cancelled()
+                or worker.isInterruptionRequested()
+                or len(error_messages) > 0
+            )
+            if not is_import_complete and item is not None:
+                project.remove_layer(item)
+
+            if len(error_messages) > 0:
+                QMessageBox.critical(self, "Error", error_messages[0])
+
+        worker.opened.connect(add_item)
+        worker.previewReady.connect(on_preview_ready)
+        worker.imageReady.connect(on_image_ready)
+        worker.failed.connect(error_messages.append)
+        worker.finished.connect(on_finished)
+        worker.start()
+
+    def import_images(self, filepaths: List[str], position: QPointF = QPointF()):
+        """
+        Decode images in parallel in the background, then add them at once as new layers of the current project
+        at `position`, stacked in the order of `filepaths` (the last one on top)
+        """
+        from .image_read import ImageBatchImporter
+
+        project = self._project
+        importer = ImageBatchImporter(filepaths, parent=self)
+
+        progress_dialog = QProgressDialog(
+            "Importing images", "Cancel", 0, len(filepaths), self
+        )
+        progress_dialog.setWindowTitle("Open Images")
+        progress_dialog.setMinimumDuration(500)
+        progress_dialog.canceled.connect(importer.cancel)
+
+        def close_progress_dialog():
+            # NOTE: hide instead of close, closing a progress dialog emits canceled
+            progress_dialog.hide()
+            progress_dialog.deleteLater()
+            importer.deleteLater()
+
+        def on_finished(images: list, error_messages: list):
+            close_progress_dialog()
+
+            items = []
+            for filepath, image in zip(filepaths, images):
+                if image is None:
+                    continue
+                item = AIEImageItem(image, Path(filepath).stem)
+                item.setPos(position)
+                items.append(item)
+            project.get_graphics_scene().add_items(items)
+
+            if len(error_messages) > 0:
+                QMessageBox.critical(self, "Error", error_messages[0])
+
+        importer.progressChanged.connect(
+            lambda num_done, num_files: progress_dialog.setValue(num_done)
+        )
+        importer.finished.connect(on_finished)
+        importer.cancelled.connect(close_progress_dialog)
+        importer.start()
+
+    def save_image(self):
+        default_dir = QStandardPaths.writableLocation(
+            QStandardPaths.StandardLocation.PicturesLocation
+        )
+        dlg = create_save_file_dialog(default_dir, "Image files (*.jpg *.png)")
 
         try:
             if dlg.exec():
                 filepath = dlg.selectedFiles()[0]
-                image = QImage(filepath)
-                image_name = Path(filepath).stem
-                self._project.add_image_layer(image, image_name)
+                image = self._project.render()
+                image.save(filepath)
         except:
             QMessageBox.critical(self, "Error", traceback.format_exc())
 
-    def save_image(self):
+    def export_with_preset(self, preset: "ExportPreset"):
+        from .export import export_preset
+
         default_dir = QStandardPaths.writableLocation(
             QStandardPaths.StandardLocation.PicturesLocation
         )
-        dlg = create_save_file_dialog(default_dir, "Image files (*.jpg *.png)")
+        dlg = create_save_file_dialog(default_dir, "Base file name (*)")
+
+        try:
+            if dlg.exec():
+                # NOTE: outputs add their own suffix and extension to the chosen name
+                base_path = str(Path(dlg.selectedFiles()[0]).with_suffix(""))
+                export_preset(self._project, preset, base_path)
+        except:
+            QMessageBox.critical(self, "Error", traceback.format_exc())
+
+    def export_large_image(self):
+        """Render the project band by band straight into a file, for images too large to fit in memory at once"""
+        from .export import export_streaming
+
+        default_dir = QStandardPaths.writableLocation(
+            QStandardPaths.StandardLocation.PicturesLocation
+        )
+        dlg = create_save_file_dialog(
+            default_dir, "Large image files (*.png *.tif *.tiff *.ppm)"
+        )
 
         try:
             if dlg.exec():
                 filepath = dlg.selectedFiles()[0]
-                image = self._project.render()
-                image.save(filepath)
+                export_streaming(self._project, filepath)
         except:
             QMessageBox.critical(self, "Error", traceback.format_exc())
 
-    def add_gaussian_blur_to_selected_layer(self):
+    def export_layers(self):
+        """Write selected layers, or all layers if none is selected, to their own image files"""
+        from .export import export_layers, get_layers_to_export
+
+        default_dir = QStandardPaths.writableLocation(
+            QStandardPaths.StandardLocation.PicturesLocation
+        )
+        dlg = create_open_directory_dialog(default_dir)
+
+        try:
+            if dlg.exec():
+                directory = dlg.selectedFiles()[0]
+                export_layers(
+                    get_layers_to_export(self._project.get_graphics_scene()),
+                    directory,
+                )
+        except:
+            QMessageBox.critical(self, "Error", traceback.format_exc())
+
+    def get_selected_image_items(self) -> List[AIEImageItem]:
+        """Selected image layers, a warning is shown if there are none"""
         scene = self._project.get_graphics_scene()
-        if len(scene.selectedItems()) == 0:
+        selected_items = [
+            item for item in scene.selectedItems() if isinstance(item, AIEImageItem)
+        ]
+        if len(selected_items) == 0:
             QMessageBox.information(
                 self,
                 "Warning",
-                "No selected layers to apply effect, please select at least one layer",
+                "No selected image layers to apply effect, please select at least one image layer",
                 QMessageBox.StandardButton.Ok,
             )
+        return selected_items
+
+    def add_gaussian_blur_to_selected_layer(self):
+        from .filters import GaussianBlurFilter
+
+        selected_items = self.get_selected_image_items()
+        if len(selected_items) == 0:
             return
 
         dlg = GaussianBlurDialog()
+        self.run_filter_dialog(
+            dlg,
+            lambda: GaussianBlurFilter(dlg.get_blur_radius()),
+            dlg.blur_radius_changed,
+            dlg.blur_radius_committed,
+            selected_items,
+            "Gaussian Blur",
+        )
+
+    def add_adjustment_to_selected_layers(
+        self,
+        title: str,
+        parameters: Sequence[AdjustmentParameter],
+        create_adjustment: Callable[[List[float]], "Adjustment"],
+    ):
+        from .filters import AdjustmentsFilter
+
+        selected_items = self.get_selected_image_items()
+        if len(selected_items) == 0:
+            return
+
+        dlg = AdjustmentDialog(title, parameters)
+        self.run_filter_dialog(
+            dlg,
+            lambda: AdjustmentsFilter((create_adjustment(dlg.get_values()),)),
+            dlg.params_changed,
+            dlg.params_committed,
+            selected_items,
+            title,
+        )
+
+    def run_filter_dialog(
+        self,
+        dlg: QDialog,
+        get_filter: Callable[[], "LayerFilterProtocol"],
+        filter_changed: pyqtBoundSignal,
+        filter_committed: pyqtBoundSignal,
+        selected_items: List[AIEImageItem],
+        filter_name: str,
+    ):
+        """
+        Show a filter dialog, the filter given by dialog values is previewed live on the first selected layer,
+        and added to all selected layers once accepted
+        """
+        from .filters import FilterPreviewRenderer, filter_stage_cache
+
         dlg.setWindowModality(Qt.WindowModality.ApplicationModal)
 
-        effect = QGraphicsBlurEffect()
+        # NOTE: filter is previewed on the first selected layer only, on top of filters already applied to it
+        selected_item = selected_items[0]
+        source = selected_item.get_filtered_image_source()
+        source_rect = source.rect
+        renderer = FilterPreviewRenderer(
+            source.size,
+            source.load_image,
+            source.render_scaled,
+            lambda image, layer_filter, scale, is_cancelled: layer_filter.apply(
+                image, scale, is_cancelled
+            ),
+        )
+
+        def on_preview_ready(image: QImage, rect: QRectF):
+            if dlg.is_preview_enabled():
+                selected_item.set_filter_preview(
+                    image, rect.translated(source_rect.topLeft())
+                )
+
+        def on_failed(error_message: str):
+            selected_item.set_filter_preview(None)
+            QMessageBox.critical(self, "Error", error_message)
+
+        # NOTE: dialog widgets still emit signals while closing (e.g. spinbox editingFinished on focus loss),
+        # they are ignored as the renderer may already be shut down
+        def on_filter_changed():
+            if dlg.isVisible() and dlg.is_preview_enabled():
+                renderer.request_preview(get_filter())
+
+        def on_filter_committed():
+            if dlg.isVisible() and dlg.is_preview_enabled():
+                renderer.request_result(get_filter())
+
+        def on_preview_toggled(is_enabled: bool):
+            if is_enabled:
+                renderer.request_preview(get_filter())
+            else:
+                renderer.cancel()
+                selected_item.set_filter_preview(None)
+
+        def on_accepted():
+            layer_filter = get_filter()
 
-        dlg.preview_checkbox_toggled.connect(effect.setEnabled)
-        dlg.blur_radius_changed.connect(effect.setBlurRadius)
+            # Do not render the previewed layer again if its full resolution result is already available
+            result = renderer.get_result(layer_filter)
+            if result is not None:
+                image, rect = result
+                filter_stage_cache.put(
+                    filter_stage_cache.key(
+                        selected_item.get_pixels_key(),
+                        selected_item.get_filters() + (layer_filter,),
+                    ),
+                    (image, rect.translated(source_rect.topLeft())),
+                )
 
-        effect.setEnabled(dlg.is_preview_enabled())
-        effect.setBlurRadius(dlg.get_blur_radius())
+            renderer.shutdown()
+            self.add_filter_to_items(selected_items, layer_filter, filter_name)
 
-        selected_item = scene.selectedItems()[0]
-        selected_item.setGraphicsEffect(effect)
-        dlg.rejected.connect(lambda: selected_item.setGraphicsEffect(None))
-        dlg.accepted.connect(lambda: effect.setEnabled(True))
+        def on_rejected():
+            renderer.shutdown()
+            selected_item.set_filter_preview(None)
 
+        renderer.previewReady.connect(on_preview_ready)
+        renderer.resultReady.connect(on_preview_ready)
+        renderer.failed.connect(on_failed)
+        filter_changed.connect(lambda *args: on_filter_changed())
+        filter_committed.connect(on_filter_committed)
+        dlg.preview_checkbox_toggled.connect(on_preview_toggled)
+        dlg.accepted.connect(on_accepted)
+        dlg.rejected.connect(on_rejected)
+
+        on_preview_toggled(dlg.is_preview_enabled())
         dlg.show()
 
+    def add_filter_to_items(
+        self,
+        items: List[AIEImageItem],
+        layer_filter: "LayerFilterProtocol",
+        filter_name: str,
+    ):
+        """
+        Render a filter on top of filter stacks of given items in parallel, the filter is added to all items
+        once every one of them was rendered, or to none if cancelled or failed
+        """
+        from .filters import FilterStackBatchRenderer
+
+        batch_renderer = FilterStackBatchRenderer(
+            [
+                (
+                    item.get_pixels_key(),
+                    item.get_pixels_size(),
+                    item.get_image_loader(),
+                    item.get_filters() + (layer_filter,),
+                )
+                for item in items
+            ],
+            parent=self,
+        )
+
+        progress_dialog = QProgressDialog(
+            f"Applying {filter_name}", "Cancel", 0, len(items), self
+        )
+        progress_dialog.setWindowTitle(filter_name)
+        progress_dialog.setMinimumDuration(500)
+        progress_dialog.canceled.connect(batch_renderer.cancel)
+
+        def close_progress_dialog():
+            # NOTE: hide instead of close, closing a progress dialog emits canceled
+            progress_dialog.hide()
+            progress_dialog.deleteLater()
+            batch_renderer.deleteLater()
+            for item in items:
+                item.set_filter_preview(None)
+
+        def on_finished(outputs: list):
+            close_progress_dialog()
+            undo_stack = self._project.get_graphics_scene().get_undo_stack()
+            undo_stack.beginMacro(f"Add {filter_name}")
+            for item, output in zip(items, outputs):
+                old_filters = item.get_filters()
+                item.add_filter(layer_filter, output)
+                undo_stack.push(
+                    SetFiltersCommand(item, old_filters, item.get_filters())
+                )
+            undo_stack.endMacro()
+
+        def on_failed(error_message: str):
+            close_progress_dialog()
+            QMessageBox.critical(self, "Error", error_message)
+
+        batch_renderer.progressChanged.connect(
+            lambda num_done, num_jobs: progress_dialog.setValue(num_done)
+        )
+        batch_renderer.finished.connect(on_finished)
+        batch_renderer.failed.connect(on_failed)
+        batch_renderer.cancelled.connect(close_progress_dialog)
+        batch_renderer.start()
+
     def read_psd_as_project(self):
         default_dir = QStandardPaths.writableLocation(
             QStandardPaths.StandardLocation.PicturesLocation
@@ -151,7 +593,133 @@ class MainWindow(QMainWindow):
         dlg = create_open_file_dialog(default_dir, "Photoshop Files (*.psd)")
         if dlg.exec():
             filepath = dlg.selectedFiles()[0]
-            self.set_project(load_psd_as_project(filepath))
+            self.import_psd_as_project(filepath)
+
+    def import_psd_as_project(self, filepath: str):
+        """
+        Import a PSD in the background, the embedded composite image is shown while layers are streamed into
+        a new project, the previous project is restored if import is cancelled or fails.
+        PSDs that were already imported are loaded from cache.
+        """
+        if self._psd_import_worker is not None:
+            QMessageBox.information(
+                self,
+                "Warning",
+                "Another PSD is being imported, please wait for it to finish or cancel it",
+                QMessageBox.StandardButton.Ok,
+            )
+            return
+
+        from .psd_read import PSDProjectBuilder
+        from .psd_read.worker import PSDImportWorker
+
+        psd_project_cache = self.get_psd_project_cache()
+
+        # NOTE: key is computed before import, so that a PSD modified during import is not cached
+        cache_key = psd_project_cache.key(filepath)
+        cached_project = psd_project_cache.load(cache_key)
+        if cached_project is not None:
+            self.set_project(cached_project)
+            return
+
+        previous_project = self._project
+        project = AIEProject()
+        scene = project.get_graphics_scene()
+        self.set_project(project)
+
+        worker = PSDImportWorker(filepath)
+        self._psd_import_worker = worker
+        builder: Optional["PSDProjectBuilder"] = None
+        error_messages = []
+
+        progress_dialog = QProgressDialog(
+            f"Importing {Path(filepath).name}", "Cancel", 0, 0, self
+        )
+        progress_dialog.setWindowTitle("Open PSD")
+        progress_dialog.setMinimumDuration(0)
+        progress_dialog.canceled.connect(worker.requestInterruption)
+
+        def on_opened(psd_width: int, psd_height: int):
+            nonlocal builder
+            builder = PSDProjectBuilder(project, psd_width, psd_height)
+
+        def on_layers_ready(records: list):
+            # Discard batches that were already queued when import got cancelled
+            if worker.isInterruptionRequested():
+                return
+
+            assert builder is not None
+            builder.add_records(records)
+
+        def on_progress_changed(num_read_layers: int, num_layers: int):
+            progress_dialog.setMaximum(num_layers)
+            progress_dialog.setValue(num_read_layers)
+
+        def on_finished():
+            self._psd_import_worker = None
+            # NOTE: hide instead of close, closing a progress dialog emits canceled
+            progress_dialog.hide()
+            progress_dialog.deleteLater()
+            scene.set_preview_image(None)
+
+            is_import_complete = not (
+                worker.was_cancelled()
+                or worker.isInterruptionRequested()
+                or len(error_messages) > 0
+            )
+
+            if is_import_complete:
+                assert builder is not None
+                # NOTE: layers may already have been edited during import, cache them as converted
+                psd_project_cache.store_async(
+                    cache_key, builder.snapshot_layers(), filepath
+                )
+            else:
+                self.set_project(previous_project)
+
+            if len(error_messages) > 0:
+                QMessageBox.critical(self, "Error", error_messages[0])
+
+        worker.opened.connect(on_opened)
+        worker.previewReady.connect(scene.set_preview_image)
+        worker.layersReady.connect(on_layers_ready)
+        worker.progressChanged.connect(on_progress_changed)
+        worker.failed.connect(error_messages.append)
+        worker.finished.connect(on_finished)
+        worker.start()
+
+    def apply_filters_to_selected_layers(self):
+        """Replace pixels of selected layers by their filtered pixels and clear their filter stacks"""
+        from .tiled_image import TiledImage
+
+        selected_items = [
+            item
+            for item in self.get_selected_image_items()
+            if len(item.get_filters()) > 0
+        ]
+        if len(selected_items) == 0:
+            return
+
+        try:
+            filtered_outputs = [item.get_filtered_image() for item in selected_items]
+        except:
+            QMessageBox.critical(self, "Error", traceback.format_exc())
+            return
+
+        undo_stack = self._project.get_graphics_scene().get_undo_stack()
+        undo_stack.beginMacro("Apply Filters")
+        for item, (image, rect) in zip(selected_items, filtered_outputs):
+            # NOTE: filters may grow the image (e.g. blur), move the item so that pixels stay in place
+            undo_stack.push(
+                SetPixelsCommand(
+                    item,
+                    TiledImage.from_qimage(image),
+                    item.pos() + rect.topLeft(),
+                    (),
+                    "Apply Filters",
+                )
+            )
+        undo_stack.endMacro()
 
     def setup_file_menu(self):
         menu = QMenu("File", self)
@@ -162,9 +730,81 @@ class MainWindow(QMainWindow):
         menu.addAction("Save as", self.save_as_project)
         menu.addSeparator()
         menu.addAction("Save Image", self.save_image)
+
+        menu.addAction("Export Large Image", self.export_large_image)
+        menu.addAction("Export Layers", self.export_layers)
+        # Filled in with deferred UI
+        self._export_preset_menu = menu.addMenu("Export Preset")
+        self.menuBar().addMenu(menu)
+
+    def setup_export_preset_menu(self):
+        from .export import DEFAULT_EXPORT_PRESETS
+
+        for preset in DEFAULT_EXPORT_PRESETS:
+            self._export_preset_menu.addAction(
+                preset.name,
+                lambda preset=preset: self.export_with_preset(preset),
+            )
+
+    def setup_edit_menu(self):
+        menu = QMenu("Edit", self)
+        undo_action = self._undo_group.createUndoAction(self)
+        undo_action.setShortcut(QKeySequence.StandardKey.Undo)
+        menu.addAction(undo_action)
+        redo_action = self._undo_group.createRedoAction(self)
+        redo_action.setShortcut(QKeySequence.StandardKey.Redo)
+        menu.addAction(redo_action)
         self.menuBar().addMenu(menu)
 
     def setup_filters_menu(self):
+        from .filters import (
+            BrightnessContrastAdjustment,
+            CurvesAdjustment,
+            HueSaturationAdjustment,
+            LevelsAdjustment,
+        )
+
         menu = QMenu("Filters", self)
         menu.addAction("Gaussian Blur", self.add_gaussian_blur_to_selected_layer)
+        menu.addSeparator()
+        menu.addAction(
+            "Levels",
+            lambda: self.add_adjustment_to_selected_layers(
+                "Levels", LEVELS_PARAMETERS, lambda values: LevelsAdjustment(*values)
+            ),
+        )
+        menu.addAction(
+            "Curves",
+            lambda: self.add_adjustment_to_selected_layers(
+                "Curves",
+                CURVES_PARAMETERS,
+                lambda values: CurvesAdjustment(
+                    (
+                        (0, 0),
+                        (64, values[0]),
+                        (128, values[1]),
+                        (192, values[2]),
+                        (255, 255),
+                    )
+                ),
+            ),
+        )
+        menu.addAction(
+            "Brightness/Contrast",
+            lambda: self.add_adjustment_to_selected_layers(
+                "Brightness/Contrast",
+                BRIGHTNESS_CONTRAST_PARAMETERS,
+                lambda values: BrightnessContrastAdjustment(*values),
+            ),
+        )
+        menu.addAction(
+            "Hue/Saturation",
+            lambda: self.add_adjustment_to_selected_layers(
+                "Hue/Saturation",
+                HUE_SATURATION_PARAMETERS,
+                lambda values: HueSaturationAdjustment(*values),
+            ),
+        )
+        menu.addSeparator()
+        menu.addAction("Apply Filters", self.apply_filters_to_selected_layers)
         self.menuBar().addMenu(menu)
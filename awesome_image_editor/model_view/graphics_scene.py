@@ -1,23 +1,93 @@
-from PyQt6.QtCore import QRectF, pyqtSignal
-from PyQt6.QtGui import QColor, QPainter
+from typing import Iterator, Optional, Sequence, Tuple
+
+from PyQt6.QtCore import QPointF, QRectF, Qt, pyqtSignal
+from PyQt6.QtGui import QColor, QImage, QPainter, QRegion
 from PyQt6.QtWidgets import QGraphicsItem, QGraphicsScene
 
+from ..occlusion import occlusion_culler
+from ..pixels_memory import pixels_memory_budget
+from .items.image import AIEImageItem
+from .undo import AIEUndoStack
+
 
 class AIEGraphicsScene(QGraphicsScene):
-    itemAboutToBeAppended = pyqtSignal(int)
-    itemAppended = pyqtSignal()
+    # First and last rows of top level items about to be appended in the tree model
+    itemsAboutToBeAppended = pyqtSignal(int, int)
+    itemsAppended = pyqtSignal()
 
     def __init__(self):
         super().__init__()
         self.changed.connect(self._invalidate_foreground)
+        self._preview_image: Optional[QImage] = None
+        self._undo_stack = AIEUndoStack(parent=self)
+
+    def get_undo_stack(self) -> AIEUndoStack:
+        return self._undo_stack
 
     def _invalidate_foreground(self):
         self.invalidate(self.sceneRect(), QGraphicsScene.SceneLayer.ForegroundLayer)
 
     def addItem(self, item: QGraphicsItem) -> None:
-        self.itemAboutToBeAppended.emit(len(self.items()))
+        # NOTE: a new top level item is stacked on top of existing ones,
+        # so it becomes the first row of the tree model (which lists top level items in descending order)
+        self.itemsAboutToBeAppended.emit(0, 0)
         super().addItem(item)
-        self.itemAppended.emit()
+        self.itemsAppended.emit()
+
+    def add_items(self, items: Sequence[QGraphicsItem]):
+        """Add top level items at once, stacked in order (the last one on top), with a single tree model update"""
+        if len(items) == 0:
+            return
+
+        self.itemsAboutToBeAppended.emit(0, len(items) - 1)
+        for item in items:
+            super().addItem(item)
+        self.itemsAppended.emit()
+
+    def restore_item(self, item: QGraphicsItem):
+        """Add back a removed top level item, without notifying the tree model (which is expected to be reset)"""
+        super().addItem(item)
+
+    def set_preview_image(self, image: Optional[QImage]):
+        """Set an image drawn behind all items (e.g. while a document is still being loaded), None to remove it"""
+        self._preview_image = image
+
+        if image is None:
+            # Revert to a scene rect that grows with items
+            self.setSceneRect(QRectF())
+        else:
+            self.setSceneRect(self.itemsBoundingRect().united(QRectF(image.rect())))
+
+        self.invalidate(self.sceneRect(), QGraphicsScene.SceneLayer.BackgroundLayer)
+
+    def drawBackground(self, painter: QPainter, rect: QRectF) -> None:
+        super().drawBackground(painter, rect)
+
+        if self._preview_image is not None:
+            painter.drawImage(QPointF(0, 0), self._preview_image)
+
+        # NOTE: the background is painted first in every paint pass (of views or `render`), before items
+        occlusion_culler.begin_pass(
+            painter.worldTransform(), self._iter_painted_items(rect)
+        )
+        pixels_memory_budget.begin_pass()
+
+    def _iter_painted_items(
+        self, rect: QRectF
+    ) -> Iterator[Tuple[QGraphicsItem, QRegion]]:
+        """Visible items in `rect` from top to bottom, with their opaque region"""
+        for item in self.items(
+            rect,
+            Qt.ItemSelectionMode.IntersectsItemBoundingRect,
+            Qt.SortOrder.DescendingOrder,
+        ):
+            if not item.isVisible():
+                continue
+
+            if isinstance(item, AIEImageItem) and item.effectiveOpacity() == 1.0:
+                yield item, item.get_opaque_region()
+            else:
+                yield item, QRegion()
 
     def _calc_selected_items_bounding_box(self):
         rect = QRectF()
@@ -26,6 +96,10 @@ class AIEGraphicsScene(QGraphicsScene):
         return rect
 
     def drawForeground(self, painter: QPainter, rect: QRectF) -> None:
+        # Items are painted by now
+        occlusion_culler.end_pass()
+        pixels_memory_budget.end_pass()
+
         # Draw selection bounding box
         painter.save()
         painter.setRenderHint(QPainter.RenderHint.Antialiasing, False)
@@ -1,10 +1,39 @@
-from typing import Optional
-from PyQt6.QtWidgets import QGraphicsView, QGraphicsScene, QRubberBand
-from PyQt6.QtGui import QPainter, QMouseEvent
-from PyQt6.QtCore import QRectF, QPoint, QRect, QSize, Qt
+from typing import Dict, List, Optional
+from PyQt6.QtWidgets import QGraphicsItem, QGraphicsView, QGraphicsScene, QRubberBand
+from PyQt6.QtGui import (
+    QDragEnterEvent,
+    QDragMoveEvent,
+    QDropEvent,
+    QPainter,
+    QMouseEvent,
+)
+from PyQt6.QtCore import (
+    QMimeData,
+    QPointF,
+    QRectF,
+    QPoint,
+    QRect,
+    QSize,
+    Qt,
+    pyqtSignal,
+)
+
+from ..image_read import is_image_file
+from .undo import MoveItemsCommand
+
+
+def _get_dropped_image_files(mime_data: QMimeData) -> List[str]:
+    return [
+        url.toLocalFile()
+        for url in mime_data.urls()
+        if url.isLocalFile() and is_image_file(url.toLocalFile())
+    ]
 
 
 class AIEGraphicsView(QGraphicsView):
+    # Paths of image files dropped on the view in drop order, drop position in scene coordinates
+    imageFilesDropped = pyqtSignal(list, QPointF)
+
     def __init__(self, scene: QGraphicsScene):
         super().__init__(scene)
         self.setRenderHint(QPainter.RenderHint.Antialiasing, True)
@@ -12,10 +41,41 @@ class AIEGraphicsView(QGraphicsView):
 
         self._rubberband_selection_origin: Optional[QPoint] = None
         self._rubberband: Optional[QRubberBand] = None
+        # Positions of selected items when the mouse was pressed, to record moves in the undo stack
+        self._move_origins: Dict[QGraphicsItem, QPointF] = {}
+
+    def dragEnterEvent(self, event: QDragEnterEvent) -> None:
+        if len(_get_dropped_image_files(event.mimeData())) > 0:
+            event.acceptProposedAction()
+        else:
+            super().dragEnterEvent(event)
+
+    def dragMoveEvent(self, event: QDragMoveEvent) -> None:
+        # NOTE: not forwarded to the scene, which would refuse the drop as no item accepts drops
+        if len(_get_dropped_image_files(event.mimeData())) > 0:
+            event.acceptProposedAction()
+        else:
+            super().dragMoveEvent(event)
+
+    def dropEvent(self, event: QDropEvent) -> None:
+        filepaths = _get_dropped_image_files(event.mimeData())
+        if len(filepaths) == 0:
+            super().dropEvent(event)
+            return
+
+        event.acceptProposedAction()
+        self.imageFilesDropped.emit(
+            filepaths, self.mapToScene(event.position().toPoint())
+        )
 
     def mousePressEvent(self, event: QMouseEvent) -> None:
         super().mousePressEvent(event)
 
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._move_origins = {
+                item: item.pos() for item in self.scene().selectedItems()
+            }
+
         if event.button() == Qt.MouseButton.LeftButton and (
             self.itemAt(event.pos()) is None
         ):
@@ -57,6 +117,22 @@ class AIEGraphicsView(QGraphicsView):
     def mouseReleaseEvent(self, event: QMouseEvent) -> None:
         super().mouseReleaseEvent(event)
 
+        if event.button() == Qt.MouseButton.LeftButton:
+            moved_items = [
+                item
+                for item, position in self._move_origins.items()
+                if item.pos() != position
+            ]
+            if len(moved_items) > 0:
+                self.scene().get_undo_stack().push(
+                    MoveItemsCommand(
+                        moved_items,
+                        [self._move_origins[item] for item in moved_items],
+                        [item.pos() for item in moved_items],
+                    )
+                )
+            self._move_origins = {}
+
         if self._rubberband is not None:
             self._rubberband.hide()
             self._rubberband = None
@@ -0,0 +1,45 @@
+from PyQt6.QtGui import QColor, QPainterPath
+from PyQt6.QtWidgets import QGraphicsItem
+
+from .group import AIEGroupItem
+from .image import AIEImageItem
+from .shape import AIEShapeItem
+from .text import AIETextItem
+
+__all__ = ("duplicate_item",)
+
+
+def duplicate_item(item: QGraphicsItem) -> QGraphicsItem:
+    """
+    Copy a layer item (and its children), the copy is not added to any scene.
+    Pixels of image layers are shared with the copy and only copied when either one is edited.
+    """
+    if isinstance(item, AIEImageItem):
+        # NOTE: tiles are implicitly shared QImages, the copy also keeps the pixels key,
+        # so that cached filter stages are shared as well
+        copy = AIEImageItem(item.tiles.copy(), item.name)
+        copy.set_filters(item.get_filters())
+
+    elif isinstance(item, AIEShapeItem):
+        copy = AIEShapeItem(QPainterPath(item.path), item.name)
+        copy.stroke_color = QColor(item.stroke_color)
+
+    elif isinstance(item, AIETextItem):
+        copy = AIETextItem("", item.name)
+        copy.document().setUseDesignMetrics(item.document().useDesignMetrics())
+        with copy.deferred_layout():
+            copy.document().setHtml(item.document().toHtml())
+
+    elif isinstance(item, AIEGroupItem):
+        copy = AIEGroupItem(item.name)
+        # NOTE: child items are sorted by stacking order, back-to-front
+        for child_item in item.childItems():
+            duplicate_item(child_item).setParentItem(copy)
+
+    else:
+        assert False, f"Cannot duplicate item of type {type(item).__name__}"
+
+    copy.setPos(item.pos())
+    # NOTE: visibility of the item itself, children of a hidden group are not visible either
+    copy.setVisible(item.isVisibleTo(item.parentItem()))
+    return copy
@@ -7,6 +7,8 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import QRectF
 
+from .image import THUMBNAIL_SIZE
+
 
 class AIEGroupItem(QGraphicsItem):
     # NOTE: We do not use a QGraphicsItemGroup because it forces children to have the same selection state as group
@@ -27,7 +29,8 @@ class AIEGroupItem(QGraphicsItem):
         )
 
     def get_size_hint(self):
-        ...
+        # Same size hint as other layers, so that the tree view can assume uniform row heights
+        return THUMBNAIL_SIZE
 
     def paint(
         self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: QWidget
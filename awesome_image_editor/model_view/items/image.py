@@ -1,32 +1,238 @@
-from typing import Optional
+import weakref
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Hashable,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
-from PyQt6.QtCore import QRectF, QSize, Qt
-from PyQt6.QtGui import QImage, QPainter
+from PyQt6.QtCore import QRect, QRectF, QSize, Qt
+from PyQt6.QtGui import QImage, QPainter, QRegion
 from PyQt6.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem, QWidget
 
+from ...occlusion import (
+    get_device_rect,
+    is_axis_aligned,
+    is_device_rect_hidden,
+    occlusion_culler,
+)
+from ...pixels_memory import pixels_memory_budget
+from ...tiled_image import TiledImage, new_pixels_key
+
+# NOTE: filters pull in numpy, they are only imported once a layer has filters to keep startup fast
+if TYPE_CHECKING:
+    from ...filters.base import LayerFilterProtocol
+
 THUMBNAIL_SIZE = QSize(32, 32)
 
 
+class FilteredImageSource(NamedTuple):
+    """
+    Item pixels with all filters applied, given by callables which can be called off the GUI thread,
+    so that the full resolution image is only assembled when needed (e.g. not for a downscaled preview)
+    """
+
+    # Image rect in item coordinates
+    rect: QRectF
+    size: QSize
+    load_image: Callable[[], QImage]
+    # Renders the image scaled to fit in a size keeping aspect ratio
+    render_scaled: Callable[[QSize], QImage]
+
+
 class AIEImageItem(QGraphicsItem):
-    def __init__(self, image: QImage, name: str):
+    """An image layer, pixels are stored as tiles so that memory scales with contents rather than bounds"""
+
+    def __init__(self, image: Union[QImage, TiledImage], name: str):
         super().__init__()
         self.name = name
-        self.image = image
+        self.tiles = (
+            image if isinstance(image, TiledImage) else TiledImage.from_qimage(image)
+        )
+        pixels_memory_budget.use(self.tiles)
+        # Non-destructive filters applied to the image, in order
+        self._filters: Tuple["LayerFilterProtocol", ...] = ()
+        # Filter result shown instead of the image while a filter dialog is open, with its rect in item coordinates
+        self._filter_preview: Optional[Tuple[QImage, QRectF]] = None
+        # Stage cache key and output of the filter stack last painted, kept by the item so that painting visible items
+        # does not evict each other's outputs from the stage cache, and painted while a newer output is rendered
+        self._painted_filter_output: Optional[
+            Tuple[Hashable, Tuple[QImage, QRectF]]
+        ] = None
+        # Stage cache key of the filter stack last requested from the render queue
+        self._requested_filter_key: Optional[Hashable] = None
         self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable, True)
         self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable, True)
+        # Paint only tiles in the exposed rect
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption, True)
+
+    @property
+    def image(self) -> QImage:
+        """Item pixels as a single image, NOTE: assembled from tiles at full size, prefer using tiles"""
+        return self.tiles.to_qimage()
 
     def get_thumbnail(self):
-        return self.image.scaled(
-            THUMBNAIL_SIZE,
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation,
-        )
+        return self.tiles.render_scaled(THUMBNAIL_SIZE)
 
     def get_size_hint(self):
         return THUMBNAIL_SIZE
 
+    def get_pixels_key(self) -> Hashable:
+        """Identifies item pixels, changes whenever they are replaced"""
+        return self.tiles.pixels_key
+
+    def get_pixels_size(self) -> QSize:
+        return self.tiles.size()
+
+    def get_image_loader(self) -> Callable[[], QImage]:
+        """Returns a callable giving the item pixels as a single image, which can be called off the GUI thread"""
+        tiles = self.tiles.copy()
+        return tiles.to_qimage
+
+    def get_tiles_loader(self) -> Callable[[], TiledImage]:
+        """Returns a callable giving the item pixels as tiles, which can be called off the GUI thread"""
+        tiles = self.tiles.copy()
+        return lambda: tiles
+
+    def set_image(self, image: Union[QImage, TiledImage]):
+        """Replace item pixels (e.g. by a filter result), the item is resized to the new image"""
+        self.prepareGeometryChange()
+        self.tiles = (
+            image if isinstance(image, TiledImage) else TiledImage.from_qimage(image)
+        )
+        pixels_memory_budget.use(self.tiles)
+        self.update()
+
+    def get_filters(self) -> Tuple["LayerFilterProtocol", ...]:
+        return self._filters
+
+    def set_filters(self, filters: Sequence["LayerFilterProtocol"]):
+        self.prepareGeometryChange()
+        self._filters = tuple(filters)
+        if len(self._filters) == 0:
+            self._painted_filter_output = None
+        self.update()
+
+    def add_filter(
+        self,
+        layer_filter: "LayerFilterProtocol",
+        output: Optional[Tuple[QImage, QRectF]] = None,
+    ):
+        """
+        Append a filter to the filter stack, `output` is the result of the whole stack with this filter
+        and its rect in item coordinates when already rendered (e.g. by a filter dialog), so that it is not rendered again
+        """
+        filters = self._filters + (layer_filter,)
+        if output is not None:
+            from ...filters.stack import filter_stage_cache
+
+            filter_stage_cache.put(
+                filter_stage_cache.key(self.get_pixels_key(), filters), output
+            )
+        self.set_filters(filters)
+
+    def get_filtered_image(self) -> Tuple[QImage, QRectF]:
+        """
+        Image with all filters applied and its rect in item coordinates, filter stages are cached.
+        Without filters, the image is cropped to the bounds of pixels that are not fully transparent.
+        """
+        if len(self._filters) == 0:
+            content_rect = self._get_source_crop_rect()
+            return self.tiles.to_qimage(content_rect), QRectF(content_rect)
+
+        from ...filters.stack import render_filter_stack
+
+        return render_filter_stack(
+            self.get_pixels_key(), lambda: self.image, self._filters
+        )
+
+    def get_filtered_image_source(self) -> FilteredImageSource:
+        """Same as get_filtered_image, without assembling unfiltered pixels at full size until they are loaded"""
+        if len(self._filters) > 0:
+            image, rect = self.get_filtered_image()
+            return FilteredImageSource(
+                rect,
+                image.size(),
+                lambda: image,
+                lambda size: image.scaled(
+                    size,
+                    Qt.AspectRatioMode.KeepAspectRatio,
+                    Qt.TransformationMode.SmoothTransformation,
+                ),
+            )
+
+        tiles = self.tiles.copy()
+        content_rect = self._get_source_crop_rect()
+        return FilteredImageSource(
+            QRectF(content_rect),
+            content_rect.size(),
+            lambda: tiles.to_qimage(content_rect),
+            lambda size: tiles.render_scaled(size, content_rect),
+        )
+
+    def _get_source_crop_rect(self) -> QRect:
+        content_rect = self.tiles.get_alpha_bounds()
+        # NOTE: filters are not applied to empty images, a fully transparent image is kept whole
+        return self.tiles.rect() if content_rect.isEmpty() else content_rect
+
+    def set_filter_preview(
+        self, image: Optional[QImage], rect: Optional[QRectF] = None
+    ):
+        """
+        Show an image in place of item pixels, stretched over `rect` (the image rect by default) in item coordinates,
+        None to show item pixels again
+        """
+        self.prepareGeometryChange()
+        if image is None:
+            self._filter_preview = None
+        else:
+            self._filter_preview = (
+                image,
+                QRectF(image.rect()) if rect is None else rect,
+            )
+        self.update()
+
+    def _image_rect(self) -> QRectF:
+        size = self.get_pixels_size()
+        return QRectF(0, 0, size.width(), size.height())
+
+    def _use_pixels(self):
+        pixels_memory_budget.use(self.tiles)
+
+    def get_content_rect(self) -> QRectF:
+        """Tight bounds of pixels that are not fully transparent in item coordinates, before filters"""
+        return QRectF(self.tiles.get_alpha_bounds())
+
+    def is_opaque(self) -> bool:
+        """Whether every pixel of the image is fully opaque, before filters"""
+        return self.tiles.is_opaque()
+
+    def get_opaque_region(self) -> QRegion:
+        """Region of fully opaque pixels in item coordinates, as painted (e.g. empty while a filter preview is shown)"""
+        # NOTE: filters may make pixels transparent (e.g. blurring edges), filtered items are not treated as opaque
+        if self._filter_preview is not None or len(self._filters) > 0:
+            return QRegion()
+        return self.tiles.get_opaque_region()
+
     def boundingRect(self) -> QRectF:
-        return QRectF(self.image.rect())
+        if self._filter_preview is not None:
+            return self._filter_preview[1]
+
+        # NOTE: transparent padding is left out, so that it is neither painted nor rendered,
+        # filters keep fully transparent pixels transparent, so filter output is bounded by the mapped content rect
+        content_rect = self.get_content_rect()
+        if content_rect.isEmpty():
+            return QRectF()
+        if len(self._filters) == 0:
+            return content_rect
+
+        from ...filters.stack import map_filter_stack_rect
+
+        return map_filter_stack_rect(content_rect, self._filters)
 
     def paint(
         self,
@@ -34,4 +240,213 @@ class AIEImageItem(QGraphicsItem):
         option: QStyleOptionGraphicsItem,
         widget: Optional[QWidget] = ...,
     ) -> None:
-        painter.drawImage(self.boundingRect(), self.image)
+        # Skip the item if opaque items above it cover its exposed part
+        hidden_region = occlusion_culler.get_hidden_region(self)
+        transform = painter.worldTransform()
+        if not hidden_region.isEmpty() and is_axis_aligned(transform):
+            device_rect = get_device_rect(
+                transform, option.exposedRect.intersected(self.boundingRect())
+            )
+            if is_device_rect_hidden(hidden_region, device_rect, transform):
+                occlusion_culler.add_skipped(
+                    1, device_rect.width() * device_rect.height()
+                )
+                return
+
+        if self._filter_preview is not None:
+            preview_image, preview_rect = self._filter_preview
+            painter.drawImage(preview_rect, preview_image)
+            return
+
+        # Painted pixels are the last to be spilled out of memory, filtered or not,
+        # as filter stages are rendered again from them once evicted from the cache
+        self._use_pixels()
+
+        # NOTE: views paint items for a widget, renders (e.g. exports) do not and must wait for filter outputs
+        filter_output = (
+            None
+            if len(self._filters) == 0
+            else self._get_filter_output_to_paint(wait=not isinstance(widget, QWidget))
+        )
+        if filter_output is None:
+            # Pixels are shown unfiltered until their first filter output is rendered
+            num_skipped_pixels = self.tiles.paint(
+                painter, option.exposedRect, hidden_region
+            )
+            occlusion_culler.add_skipped(0, num_skipped_pixels)
+            return
+
+        image, rect = filter_output
+        painter.drawImage(rect, image)
+
+    def _get_filter_output_to_paint(
+        self, wait: bool
+    ) -> Optional[Tuple[QImage, QRectF]]:
+        """
+        Output of the filter stack, rendered right away if `wait`, otherwise requested from the render queue
+        if not cached, and the last painted output is returned instead (None if there is none)
+        """
+        from ...filters.stack import filter_stage_cache
+
+        key = filter_stage_cache.key(self.get_pixels_key(), self._filters)
+        if self._painted_filter_output is not None:
+            painted_key, painted_output = self._painted_filter_output
+            if painted_key == key:
+                return painted_output
+
+        output = filter_stage_cache.get(key)
+        if output is None and wait:
+            output = self.get_filtered_image()
+        if output is not None:
+            self._painted_filter_output = (key, output)
+            return output
+
+        # NOTE: a stack that failed to render is not requested again until it changes
+        if self._requested_filter_key != key:
+            # NOTE: imported on the GUI thread only, where the render queue lives
+            from ...filters.render_queue import filter_stack_render_queue
+
+            self._requested_filter_key = key
+            filter_stack_render_queue.request(
+                self.get_pixels_key(),
+                self.get_image_loader(),
+                self._filters,
+                self._get_filter_output_receiver(key),
+            )
+
+        if self._painted_filter_output is None:
+            return None
+        return self._painted_filter_output[1]
+
+    def _get_filter_output_receiver(
+        self, key: Hashable
+    ) -> Callable[[Tuple[QImage, QRectF]], None]:
+        # NOTE: the render queue must not keep the item alive
+        item_ref = weakref.ref(self)
+
+        def on_rendered(output: Tuple[QImage, QRectF]):
+            item = item_ref()
+            if item is None:
+                return
+
+            from ...filters.stack import filter_stage_cache
+
+            # Outputs of stacks that changed since still beat unfiltered pixels
+            if item._painted_filter_output is None or key == filter_stage_cache.key(
+                item.get_pixels_key(), item._filters
+            ):
+                item._painted_filter_output = (key, output)
+                item.update()
+
+        return on_rendered
+
+
+class AIELazyImageItem(AIEImageItem):
+    """
+    An image item that knows its size up-front but only decodes its pixels when they are first needed
+    (e.g. when painted, exported or filtered), decoded pixels can be evicted again as long as they were not replaced
+    """
+
+    def __init__(self, size: QSize, decoder: Callable[[], QImage], name: str):
+        super().__init__(TiledImage(0, 0), name)
+        self._size = size
+        self._decoder: Optional[Callable[[], QImage]] = decoder
+        self._decoded_tiles: Optional[TiledImage] = None
+        # NOTE: pixels decoded again are the same, so they keep the same key (and cached filter stages)
+        self._pixels_key = new_pixels_key()
+
+    @property
+    def tiles(self) -> TiledImage:
+        if self._decoded_tiles is None:
+            assert self._decoder is not None
+            self._decoded_tiles = TiledImage.from_qimage(self._decoder())
+            self._decoded_tiles.pixels_key = self._pixels_key
+            # Past the memory budget, decoded pixels are released to be decoded again rather than spilled
+            pixels_memory_budget.use(self._decoded_tiles, evict=self._get_evictor())
+        return self._decoded_tiles
+
+    @tiles.setter
+    def tiles(self, tiles: TiledImage):
+        # Pixels no longer match the source, so they cannot be re-decoded anymore
+        self._decoder = None
+        self._decoded_tiles = tiles
+        self._size = tiles.size()
+        self._pixels_key = tiles.pixels_key
+
+    def is_decoded(self):
+        return self._decoded_tiles is not None
+
+    def get_pixels_key(self) -> Hashable:
+        return self._pixels_key
+
+    def get_pixels_size(self) -> QSize:
+        return self._size
+
+    def _use_pixels(self):
+        # Do not decode pixels just to mark them as used (e.g. when their filtered output is cached)
+        if self.is_decoded():
+            super()._use_pixels()
+
+    def get_opaque_region(self) -> QRegion:
+        if not self.is_decoded():
+            # Do not decode pixels just to know whether they hide other items
+            return QRegion()
+
+        return super().get_opaque_region()
+
+    def get_content_rect(self) -> QRectF:
+        if self._decoder is not None:
+            # NOTE: bounds must not change when pixels are decoded (e.g. while painting),
+            # and pixels are not decoded just to compute them
+            return self._image_rect()
+
+        return super().get_content_rect()
+
+    def is_opaque(self) -> bool:
+        if self._decoder is not None and self._decoded_tiles is None:
+            return False
+
+        return super().is_opaque()
+
+    def get_image_loader(self) -> Callable[[], QImage]:
+        if self._decoder is not None and self._decoded_tiles is None:
+            # Let the caller decode pixels instead of decoding them here
+            return self._decoder
+
+        return super().get_image_loader()
+
+    def get_tiles_loader(self) -> Callable[[], TiledImage]:
+        if self._decoder is not None and self._decoded_tiles is None:
+            decoder = self._decoder
+            return lambda: TiledImage.from_qimage(decoder())
+
+        return super().get_tiles_loader()
+
+    def _get_evictor(self) -> Callable[[], bool]:
+        # NOTE: the memory budget must not keep the item alive
+        item_ref = weakref.ref(self)
+
+        def evict():
+            item = item_ref()
+            return item is not None and item.evict()
+
+        return evict
+
+    def evict(self):
+        """Release decoded pixels if they can be decoded again later, returns True if pixels were released"""
+        if self._decoder is None or self._decoded_tiles is None:
+            return False
+
+        self._decoded_tiles = None
+        return True
+
+    def get_thumbnail(self):
+        if not self.is_decoded():
+            # Do not decode pixels just for the layers panel, show an empty thumbnail instead
+            thumbnail = QImage(
+                THUMBNAIL_SIZE, QImage.Format.Format_ARGB32_Premultiplied
+            )
+            thumbnail.fill(Qt.GlobalColor.transparent)
+            return thumbnail
+
+        return super().get_thumbnail()
@@ -1,3 +1,5 @@
+from contextlib import contextmanager
+
 from PyQt6.QtCore import QEvent, Qt
 from PyQt6.QtGui import QFocusEvent, QPainter
 from PyQt6.QtWidgets import (
@@ -17,15 +19,34 @@ class AIETextItem(QGraphicsTextItem):
         self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable, True)
         self.setTextInteractionFlags(Qt.TextInteractionFlag.NoTextInteraction)
         self.document().setLayoutEnabled(True)
+        self._is_layout_deferred = False
+
+        self.document().contentsChanged.connect(self._update_width_with_layout)
+
+    def _update_width_with_layout(self):
+        if self._is_layout_deferred:
+            return
 
-        def update_width_with_layout():
-            # TODO: match text alignment with expected result from a PSD
-            # might require a custom text layout: https://doc.qt.io/qt-6/qabstracttextdocumentlayout.html
-            # Allow text to expand before setting width to ideal width
-            self.document().setTextWidth(-1)
-            self.document().setTextWidth(self.document().idealWidth())
+        # TODO: match text alignment with expected result from a PSD
+        # might require a custom text layout: https://doc.qt.io/qt-6/qabstracttextdocumentlayout.html
+        # Allow text to expand before setting width to ideal width
+        self.document().setTextWidth(-1)
+        self.document().setTextWidth(self.document().idealWidth())
 
-        self.document().contentsChanged.connect(update_width_with_layout)
+    @contextmanager
+    def deferred_layout(self):
+        """
+        Suspend document layout while building text content (e.g. many cursor.insertText calls),
+        the document is laid out once when leaving the context instead of after every change
+        """
+        self._is_layout_deferred = True
+        self.document().setLayoutEnabled(False)
+        try:
+            yield
+        finally:
+            self._is_layout_deferred = False
+            self.document().setLayoutEnabled(True)
+            self._update_width_with_layout()
 
     def paint(
         self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: QWidget
@@ -1,8 +1,15 @@
+from typing import Dict, Sequence
+
 from PyQt6.QtCore import QAbstractItemModel, QModelIndex, Qt
 
 from .graphics_scene import AIEGraphicsScene
 from .roles import ItemSelectionRole
 from .tree_item import TreeItemProtocol
+from .undo import SetItemsVisibleCommand
+
+
+# Number of child rows materialized per fetchMore call for group items
+FETCH_BATCH_SIZE = 64
 
 
 class RootItemParent:
@@ -53,10 +60,15 @@ class TreeModel(QAbstractItemModel):
         self._scene = scene
         self._root_item = RootItem(scene)
 
-        scene.itemAboutToBeAppended.connect(
-            lambda i: self.beginInsertRows(QModelIndex(), i, i)
+        # Number of rows exposed so far for each group item, children are fetched lazily on expansion,
+        # so that collapsed groups do not cost anything to the view
+        self._fetched_row_counts: Dict[TreeItemProtocol, int] = {}
+        self.modelAboutToBeReset.connect(self._fetched_row_counts.clear)
+
+        scene.itemsAboutToBeAppended.connect(
+            lambda first, last: self.beginInsertRows(QModelIndex(), first, last)
         )
-        scene.itemAppended.connect(lambda: self.endInsertRows())
+        scene.itemsAppended.connect(lambda: self.endInsertRows())
 
     def scene(self):
         return self._scene
@@ -100,7 +112,11 @@ class TreeModel(QAbstractItemModel):
             return True
 
         elif role == Qt.ItemDataRole.CheckStateRole:
-            item.setVisible(Qt.CheckState(value) == Qt.CheckState.Checked)
+            self._scene.get_undo_stack().push(
+                SetItemsVisibleCommand(
+                    self, [item], Qt.CheckState(value) == Qt.CheckState.Checked
+                )
+            )
             return True
 
         return False
@@ -111,6 +127,12 @@ class TreeModel(QAbstractItemModel):
             self.dataChanged.emit(index, index)
         return is_data_changed
 
+    def notify_items_changed(self, items: Sequence[TreeItemProtocol]):
+        """Notify views that data of given items changed (e.g. visibility changed by undo)"""
+        for item in items:
+            index = self.createIndex(self.row(item), 0, item)
+            self.dataChanged.emit(index, index)
+
     def flags(self, index):
         if not index.isValid():
             return Qt.ItemFlag.NoItemFlags
@@ -171,4 +193,42 @@ class TreeModel(QAbstractItemModel):
             # root, return number of scene top level items
             return len(self._root_item.childItems())
         else:
-            return len(parentItem.childItems())
+            return self._fetched_row_counts.get(parentItem, 0)
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        parentItem = self.getItem(parent)
+
+        if parentItem is None:
+            return len(self._root_item.childItems()) > 0
+        else:
+            # Report children without materializing their rows, so the expand indicator is shown for collapsed groups
+            return len(parentItem.childItems()) > 0
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        parentItem = self.getItem(parent)
+
+        if parentItem is None:
+            return False
+
+        return self._fetched_row_counts.get(parentItem, 0) < len(
+            parentItem.childItems()
+        )
+
+    def fetchMore(self, parent: QModelIndex) -> None:
+        parentItem = self.getItem(parent)
+
+        if parentItem is None:
+            return
+
+        num_fetched_rows = self._fetched_row_counts.get(parentItem, 0)
+        num_rows_to_fetch = min(
+            len(parentItem.childItems()) - num_fetched_rows, FETCH_BATCH_SIZE
+        )
+        if num_rows_to_fetch <= 0:
+            return
+
+        self.beginInsertRows(
+            parent, num_fetched_rows, num_fetched_rows + num_rows_to_fetch - 1
+        )
+        self._fetched_row_counts[parentItem] = num_fetched_rows + num_rows_to_fetch
+        self.endInsertRows()
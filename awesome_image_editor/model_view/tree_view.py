@@ -10,6 +10,10 @@ class TreeView(QTreeView):
         super().__init__()
         self.setHeaderHidden(True)
 
+        # All rows share the same thumbnail size hint, let the view compute row geometry from the first row only
+        # instead of querying every row, this keeps first paint cheap for large layer trees
+        self.setUniformRowHeights(True)
+
         # self.setDragDropMode(QListView.DragDropMode.InternalMove)
         self.setSelectionMode(QTreeView.SelectionMode.ExtendedSelection)
         self.setModel(model)
@@ -0,0 +1,479 @@
+import weakref
+import zlib
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from PyQt6.QtCore import QAbstractItemModel, QObject, QPointF, Qt
+from PyQt6.QtGui import QColor, QImage, QUndoCommand, QUndoStack
+from PyQt6.QtWidgets import QGraphicsItem, QGraphicsScene
+
+from ..pixels_memory import TileScratchFile
+from ..tiled_image import SpilledTile, Tile, TiledImage
+from .items.duplicate import duplicate_item
+from .items.image import AIEImageItem
+
+if TYPE_CHECKING:
+    from ..filters.base import LayerFilterProtocol
+
+__all__ = (
+    "AIEUndoCommand",
+    "AIEUndoStack",
+    "CompressedTile",
+    "DeleteItemsCommand",
+    "DuplicateItemsCommand",
+    "MoveItemsCommand",
+    "SetFiltersCommand",
+    "SetItemsVisibleCommand",
+    "SetPixelsCommand",
+)
+
+DEFAULT_MAX_HISTORY_SIZE = 256 * 1024**2
+
+# zlib compression level of tile deltas, favors speed as deltas are compressed on the GUI thread
+_COMPRESSION_LEVEL = 1
+
+
+class CompressedTile:
+    """Tile pixels compressed with zlib, which can be moved out of memory into a scratch file"""
+
+    def __init__(self, image: QImage):
+        self._width = image.width()
+        self._height = image.height()
+        self._bytes_per_line = image.bytesPerLine()
+        self._image_format = image.format()
+        self._data: Optional[bytes] = zlib.compress(
+            image.constBits().asstring(image.sizeInBytes()), _COMPRESSION_LEVEL
+        )
+        self._data_size = len(self._data)
+        self._scratch_file: Optional[TileScratchFile] = None
+        self._offset = 0
+
+    def get_size(self) -> int:
+        """Memory used by compressed pixels, 0 once spilled"""
+        return 0 if self._data is None else self._data_size
+
+    def spill(self, scratch_file: TileScratchFile):
+        if self._data is None:
+            return
+
+        self._offset = scratch_file.write_data(self._data)
+        self._scratch_file = scratch_file
+        weakref.finalize(self, scratch_file.free, self._offset, self._data_size)
+        self._data = None
+
+    def load(self) -> QImage:
+        if self._data is None:
+            assert self._scratch_file is not None
+            data = self._scratch_file.read(self._offset, self._data_size)
+        else:
+            data = self._data
+
+        # NOTE: copy, so that the image does not refer to the Python bytes object
+        return QImage(
+            zlib.decompress(data),
+            self._width,
+            self._height,
+            self._bytes_per_line,
+            self._image_format,
+        ).copy()
+
+
+# A tile recorded in history: None for fully transparent tiles, a color for uniform tiles
+HistoryTile = Union[None, QColor, CompressedTile]
+
+
+def _compress_tile(tile: Optional[Tile]) -> HistoryTile:
+    if isinstance(tile, SpilledTile):
+        tile = tile.load()
+    if isinstance(tile, QImage):
+        return CompressedTile(tile)
+    return tile
+
+
+def _decompress_tile(tile: HistoryTile) -> Optional[Tile]:
+    if isinstance(tile, CompressedTile):
+        return tile.load()
+    return tile
+
+
+def _is_same_tile(tile: Optional[Tile], other_tile: Optional[Tile]):
+    if tile is other_tile:
+        return True
+    if isinstance(tile, SpilledTile) or isinstance(other_tile, SpilledTile):
+        return False
+    # NOTE: QImage and QColor compare by value, different types are never equal
+    return type(tile) is type(other_tile) and tile == other_tile
+
+
+class AIEUndoCommand(QUndoCommand):
+    def get_size(self) -> int:
+        """Memory used by history data of this command, in bytes"""
+        return 0
+
+    def spill(self, scratch_file: TileScratchFile):
+        """Move history data of this command out of memory"""
+        pass
+
+
+class AIEUndoStack(QUndoStack):
+    """
+    An undo stack bounded by the memory used by history data (e.g. pixel deltas),
+    data of the oldest commands is spilled to a scratch file past `max_history_size` bytes.
+    """
+
+    def __init__(
+        self,
+        max_history_size: int = DEFAULT_MAX_HISTORY_SIZE,
+        parent: Optional[QObject] = None,
+    ):
+        super().__init__(parent)
+        self._max_history_size = max_history_size
+        self._scratch_file: Optional[TileScratchFile] = None
+
+    def get_max_history_size(self) -> int:
+        return self._max_history_size
+
+    def set_max_history_size(self, max_history_size: int):
+        self._max_history_size = max_history_size
+        self._enforce_max_history_size()
+
+    def push(self, command: QUndoCommand):
+        super().push(command)
+        self._enforce_max_history_size()
+
+    def endMacro(self):
+        super().endMacro()
+        self._enforce_max_history_size()
+
+    def _iter_commands(self) -> Iterator[AIEUndoCommand]:
+        """Commands with history data, oldest first, including commands of macros"""
+        commands_to_visit: List[QUndoCommand] = [
+            self.command(i) for i in range(self.count())
+        ]
+        while len(commands_to_visit) > 0:
+            command = commands_to_visit.pop(0)
+            if isinstance(command, AIEUndoCommand):
+                yield command
+            commands_to_visit[:0] = [
+                command.child(i) for i in range(command.childCount())
+            ]
+
+    def get_history_size(self) -> int:
+        """Memory used by history data of all commands, in bytes"""
+        return sum(command.get_size() for command in self._iter_commands())
+
+    def _enforce_max_history_size(self):
+        history_size = self.get_history_size()
+        for command in self._iter_commands():
+            if history_size <= self._max_history_size:
+                break
+
+            command_size = command.get_size()
+            if command_size == 0:
+                continue
+
+            if self._scratch_file is None:
+                self._scratch_file = TileScratchFile()
+            command.spill(self._scratch_file)
+            history_size -= command_size
+
+
+class MoveItemsCommand(AIEUndoCommand):
+    def __init__(
+        self,
+        items: Sequence[QGraphicsItem],
+        old_positions: Sequence[QPointF],
+        new_positions: Sequence[QPointF],
+    ):
+        super().__init__("Move")
+        self._items = list(items)
+        self._old_positions = [QPointF(position) for position in old_positions]
+        self._new_positions = [QPointF(position) for position in new_positions]
+
+    def redo(self):
+        for item, position in zip(self._items, self._new_positions):
+            item.setPos(position)
+
+    def undo(self):
+        for item, position in zip(self._items, self._old_positions):
+            item.setPos(position)
+
+
+class SetItemsVisibleCommand(AIEUndoCommand):
+    def __init__(
+        self,
+        model: QAbstractItemModel,
+        items: Sequence[QGraphicsItem],
+        is_visible: bool,
+    ):
+        super().__init__("Show Layers" if is_visible else "Hide Layers")
+        self._model = model
+        self._items = list(items)
+        self._were_visible = [item.isVisible() for item in self._items]
+        self._is_visible = is_visible
+
+    def redo(self):
+        for item in self._items:
+            item.setVisible(self._is_visible)
+        self._model.notify_items_changed(self._items)
+
+    def undo(self):
+        for item, was_visible in zip(self._items, self._were_visible):
+            item.setVisible(was_visible)
+        self._model.notify_items_changed(self._items)
+
+
+def _without_descendants(items: Sequence[QGraphicsItem]) -> List[QGraphicsItem]:
+    """Items that are not descendants of other given items, which are handled with their ancestors"""
+    item_set = set(items)
+
+    def has_ancestor_in_items(item: QGraphicsItem):
+        parent_item = item.parentItem()
+        while parent_item is not None:
+            if parent_item in item_set:
+                return True
+            parent_item = parent_item.parentItem()
+        return False
+
+    return [item for item in items if not has_ancestor_in_items(item)]
+
+
+def _deselect_recursive(items: Sequence[QGraphicsItem]):
+    items_to_deselect = list(items)
+    while len(items_to_deselect) > 0:
+        item = items_to_deselect.pop()
+        item.setSelected(False)
+        items_to_deselect.extend(item.childItems())
+
+
+def _get_top_level_items(scene: QGraphicsScene) -> List[QGraphicsItem]:
+    """Top level items sorted by stacking order, back-to-front"""
+    return [
+        item
+        for item in scene.items(order=Qt.SortOrder.AscendingOrder)
+        if item.parentItem() is None
+    ]
+
+
+def _get_next_sibling(
+    item: QGraphicsItem, top_level_items: List[QGraphicsItem]
+) -> Optional[QGraphicsItem]:
+    """Sibling stacked right above the item, None if the item is on top"""
+    parent_item = item.parentItem()
+    # NOTE: siblings are sorted by stacking order, back-to-front
+    siblings = top_level_items if parent_item is None else parent_item.childItems()
+    sibling_index = siblings.index(item)
+    return siblings[sibling_index + 1] if sibling_index + 1 < len(siblings) else None
+
+
+class DeleteItemsCommand(AIEUndoCommand):
+    """Removes items from the scene, items are kept alive by the command so that they can be put back in place"""
+
+    def __init__(self, model: QAbstractItemModel, items: Sequence[QGraphicsItem]):
+        super().__init__("Delete Layers")
+        self._model = model
+        self._scene: QGraphicsScene = model.scene()
+        # Children of deleted items are deleted with them
+        self._items = _without_descendants(items)
+        # (parent item, sibling stacked right above the item) of each deleted item, in deletion order
+        self._placements: List[
+            Tuple[Optional[QGraphicsItem], Optional[QGraphicsItem]]
+        ] = []
+
+    def redo(self):
+        # NOTE: deselect before resetting the model, removing selected items syncs selection to views,
+        # which must not happen while the model is being reset
+        _deselect_recursive(self._items)
+
+        self._model.beginResetModel()
+
+        top_level_items = _get_top_level_items(self._scene)
+        self._placements.clear()
+        for item in self._items:
+            parent_item = item.parentItem()
+            self._placements.append(
+                (parent_item, _get_next_sibling(item, top_level_items))
+            )
+
+            self._scene.removeItem(item)
+            if parent_item is None:
+                top_level_items.remove(item)
+
+        self._model.endResetModel()
+
+    def undo(self):
+        self._model.beginResetModel()
+
+        # Put items back in reverse deletion order, so that siblings they were stacked below are already back
+        for item, (parent_item, next_sibling) in reversed(
+            list(zip(self._items, self._placements))
+        ):
+            if parent_item is None:
+                self._scene.restore_item(item)
+            else:
+                item.setParentItem(parent_item)
+
+            if next_sibling is not None:
+                item.stackBefore(next_sibling)
+
+        self._model.endResetModel()
+
+
+class DuplicateItemsCommand(AIEUndoCommand):
+    """
+    Adds copies of items, each stacked right above its original, copies become the selection.
+    Pixels are shared between copies and originals, so that duplicating costs almost no memory.
+    """
+
+    def __init__(self, model: QAbstractItemModel, items: Sequence[QGraphicsItem]):
+        super().__init__("Duplicate Layers")
+        self._model = model
+        self._scene: QGraphicsScene = model.scene()
+        # Children of duplicated items are duplicated with them
+        self._items = _without_descendants(items)
+        self._copies: List[QGraphicsItem] = []
+        for item in self._items:
+            copy = duplicate_item(item)
+            copy.name = f"{item.name} copy"
+            self._copies.append(copy)
+
+    def redo(self):
+        self._model.beginResetModel()
+
+        top_level_items = _get_top_level_items(self._scene)
+        for item, copy in zip(self._items, self._copies):
+            parent_item = item.parentItem()
+            next_sibling = _get_next_sibling(item, top_level_items)
+
+            if parent_item is None:
+                self._scene.restore_item(copy)
+                top_level_items.insert(top_level_items.index(item) + 1, copy)
+            else:
+                copy.setParentItem(parent_item)
+
+            if next_sibling is not None:
+                copy.stackBefore(next_sibling)
+
+        self._model.endResetModel()
+
+        for item, copy in zip(self._items, self._copies):
+            item.setSelected(False)
+            copy.setSelected(True)
+
+    def undo(self):
+        # NOTE: deselect before resetting the model, see DeleteItemsCommand
+        _deselect_recursive(self._copies)
+
+        self._model.beginResetModel()
+        for copy in self._copies:
+            self._scene.removeItem(copy)
+        self._model.endResetModel()
+
+        for item in self._items:
+            item.setSelected(True)
+
+
+class SetFiltersCommand(AIEUndoCommand):
+    def __init__(
+        self,
+        item: AIEImageItem,
+        old_filters: Sequence["LayerFilterProtocol"],
+        new_filters: Sequence["LayerFilterProtocol"],
+        text: str = "Change Filters",
+    ):
+        super().__init__(text)
+        self._item = item
+        self._old_filters = tuple(old_filters)
+        self._new_filters = tuple(new_filters)
+
+    def redo(self):
+        self._item.set_filters(self._new_filters)
+
+    def undo(self):
+        self._item.set_filters(self._old_filters)
+
+
+class _PixelsState:
+    """Item state restored by a pixels command, except tiles that are recorded as deltas"""
+
+    def __init__(self, item: AIEImageItem, tiles: TiledImage):
+        self.width = tiles.width()
+        self.height = tiles.height()
+        self.pixels_key = tiles.pixels_key
+        self.position = QPointF(item.pos())
+        self.filters = item.get_filters()
+
+
+class SetPixelsCommand(AIEUndoCommand):
+    """
+    Replaces pixels of an image item, only tiles that differ are recorded (compressed), in both directions,
+    so that history memory scales with the size of the edit rather than the size of the layer
+    """
+
+    def __init__(
+        self,
+        item: AIEImageItem,
+        tiles: TiledImage,
+        position: Optional[QPointF] = None,
+        filters: Optional[Sequence["LayerFilterProtocol"]] = None,
+        text: str = "Edit Pixels",
+    ):
+        super().__init__(text)
+        self._item = item
+        old_tiles = item.tiles
+        assert old_tiles.tile_size == tiles.tile_size
+
+        self._old_state = _PixelsState(item, old_tiles)
+        self._new_state = _PixelsState(item, tiles)
+        if position is not None:
+            self._new_state.position = QPointF(position)
+        if filters is not None:
+            self._new_state.filters = tuple(filters)
+        # Set as is when the command is pushed, instead of being rebuilt from deltas
+        self._pushed_tiles: Optional[TiledImage] = tiles
+
+        # (old tile, new tile) by position, of tiles that differ
+        self._tile_deltas: Dict[Tuple[int, int], Tuple[HistoryTile, HistoryTile]] = {}
+        for column, row in old_tiles.get_tile_positions() | tiles.get_tile_positions():
+            old_tile = old_tiles.get_tile(column, row)
+            new_tile = tiles.get_tile(column, row)
+            if not _is_same_tile(old_tile, new_tile):
+                self._tile_deltas[column, row] = (
+                    _compress_tile(old_tile),
+                    _compress_tile(new_tile),
+                )
+
+    def _apply(self, state: _PixelsState, delta_index: int):
+        if self._pushed_tiles is not None:
+            tiles = self._pushed_tiles
+            self._pushed_tiles = None
+        else:
+            tiles = self._item.tiles.copy()
+            for (column, row), delta in self._tile_deltas.items():
+                tiles.set_tile(column, row, _decompress_tile(delta[delta_index]))
+            tiles.resize(state.width, state.height)
+            # Same pixels as when the state was recorded, so that cached filter stages are used again
+            tiles.pixels_key = state.pixels_key
+
+        self._item.set_image(tiles)
+        self._item.set_filters(state.filters)
+        self._item.setPos(state.position)
+
+    def redo(self):
+        self._apply(self._new_state, 1)
+
+    def undo(self):
+        self._apply(self._old_state, 0)
+
+    def get_size(self) -> int:
+        return sum(
+            tile.get_size()
+            for delta in self._tile_deltas.values()
+            for tile in delta
+            if isinstance(tile, CompressedTile)
+        )
+
+    def spill(self, scratch_file: TileScratchFile):
+        for delta in self._tile_deltas.values():
+            for tile in delta:
+                if isinstance(tile, CompressedTile):
+                    tile.spill(scratch_file)
@@ -0,0 +1,136 @@
+from typing import Dict, Iterable, NamedTuple, Tuple
+
+from PyQt6.QtCore import QRect, QRectF
+from PyQt6.QtGui import QRegion, QTransform
+from PyQt6.QtWidgets import QGraphicsItem
+
+__all__ = (
+    "OcclusionCuller",
+    "OcclusionStats",
+    "get_device_rect",
+    "is_axis_aligned",
+    "is_device_rect_hidden",
+    "occlusion_culler",
+)
+
+
+class OcclusionStats(NamedTuple):
+    # Items that were not painted at all because opaque items above them cover them
+    num_skipped_items: int
+    # Area in device pixels of item parts (whole items or tiles) that were not painted
+    num_skipped_pixels: int
+
+
+def _erode(region: QRegion) -> QRegion:
+    """Remove a 1 pixel border from a region"""
+    region = region.intersected(region.translated(1, 0)).intersected(
+        region.translated(-1, 0)
+    )
+    return region.intersected(region.translated(0, 1)).intersected(
+        region.translated(0, -1)
+    )
+
+
+def is_axis_aligned(transform: QTransform) -> bool:
+    """Whether a transform only scales and translates, so that rects are mapped to rects"""
+    return transform.isAffine() and not transform.isRotating()
+
+
+def _is_pixel_aligned(transform: QTransform) -> bool:
+    """Whether a transform maps pixels to device pixels one to one (it only translates by whole pixels)"""
+    return (
+        is_axis_aligned(transform)
+        and not transform.isScaling()
+        and transform.dx().is_integer()
+        and transform.dy().is_integer()
+    )
+
+
+def get_device_rect(transform: QTransform, rect: QRectF) -> QRect:
+    """Device pixels touched when painting `rect` (in painter coordinates) with a painter of given transform"""
+    return transform.mapRect(rect).toAlignedRect()
+
+
+def is_device_rect_hidden(
+    hidden_region: QRegion, device_rect: QRect, transform: QTransform
+) -> bool:
+    """Whether device pixels of a rect painted with a painter of given transform are inside a hidden region"""
+    if not _is_pixel_aligned(transform):
+        # Pixels next to the rect are required too, as smooth scaling and antialiasing can bleed into them
+        device_rect = device_rect.adjusted(-1, -1, 1, 1)
+
+    # NOTE: QRegion.contains(QRect) tells whether the rect overlaps the region, not whether it is inside of it
+    return QRegion(device_rect).subtracted(hidden_region).isEmpty()
+
+
+class OcclusionCuller:
+    """
+    Tells which parts of items are hidden behind opaque items above them during a paint pass of a scene
+    (e.g. when a view is painted or a project is rendered), so that they are not painted.
+
+    Opaque regions of items are accumulated top-down once at the start of each pass, items then look up
+    the region hidden above them when painted and skip whole items or tiles inside of it.
+    """
+
+    def __init__(self):
+        # Device region covered by opaque items above each item, for items of the current paint pass
+        self._hidden_regions: Dict[QGraphicsItem, QRegion] = {}
+        self._num_skipped_items = 0
+        self._num_skipped_pixels = 0
+
+    def begin_pass(
+        self,
+        device_transform: QTransform,
+        items: Iterable[Tuple[QGraphicsItem, QRegion]],
+    ):
+        """
+        Start a paint pass with a painter of given transform (from scene to device coordinates),
+        `items` are visible items painted in the pass, top to bottom, with their opaque region in item coordinates
+        """
+        self._hidden_regions.clear()
+
+        covered_region = QRegion()
+        for item, opaque_region in items:
+            if not covered_region.isEmpty():
+                self._hidden_regions[item] = covered_region
+
+            if opaque_region.isEmpty():
+                continue
+
+            # NOTE: rotated or sheared items are not occluders, as regions are made of axis-aligned rects
+            item_transform = item.sceneTransform() * device_transform
+            if not is_axis_aligned(item_transform):
+                continue
+
+            if _is_pixel_aligned(item_transform):
+                device_region = item_transform.map(opaque_region)
+            else:
+                # Pixels next to a non-opaque pixel are blended with it when smoothly scaled,
+                # and device pixels partially covered by the item are rounded up when mapping the region
+                device_region = _erode(item_transform.map(_erode(opaque_region)))
+            covered_region = covered_region.united(device_region)
+
+    def end_pass(self):
+        self._hidden_regions.clear()
+
+    def get_hidden_region(self, item: QGraphicsItem) -> QRegion:
+        """Device region covered by opaque items above an item in the current paint pass, empty outside of a pass"""
+        return self._hidden_regions.get(item, QRegion())
+
+    def add_skipped(self, num_items: int, num_pixels: int):
+        self._num_skipped_items += num_items
+        self._num_skipped_pixels += num_pixels
+
+    def get_stats(self) -> OcclusionStats:
+        return OcclusionStats(
+            num_skipped_items=self._num_skipped_items,
+            num_skipped_pixels=self._num_skipped_pixels,
+        )
+
+    def reset_stats(self):
+        self._num_skipped_items = 0
+        self._num_skipped_pixels = 0
+
+
+# Shared by all scenes, as only one of them is painted at a time (on the GUI thread)
+occlusion_culler = OcclusionCuller()
@@ -0,0 +1,297 @@
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Set
+
+from PyQt6.QtGui import QImage
+
+from .tiled_image import SpilledTile, TiledImage
+
+__all__ = (
+    "EvictCallback",
+    "PixelsMemoryBudget",
+    "PixelsMemoryStats",
+    "TileScratchFile",
+    "pixels_memory_budget",
+)
+
+DEFAULT_MAX_RESIDENT_SIZE = 2 * 1024**3
+
+
+class TileScratchFile:
+    """
+    A temporary file holding data moved out of memory (e.g. pixels of spilled tiles), deleted when closed.
+    Space of data that is freed is reused by data of the same size.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self._file = tempfile.TemporaryFile(dir=directory)
+        self._end = 0
+        self._used_size = 0
+        # Offsets of free extents by their size
+        self._free_extents: Dict[int, List[int]] = {}
+        # Spilled tiles by QImage.cacheKey, so that tiles shared by several images are written once
+        self._spilled_tiles: "weakref.WeakValueDictionary[int, SpilledTile]" = (
+            weakref.WeakValueDictionary()
+        )
+        # NOTE: data is read off the GUI thread (e.g. when saving), reads and writes seek the shared file
+        self._lock = threading.Lock()
+
+    def write_data(self, data: bytes) -> int:
+        """Write data to a free extent, returns its offset"""
+        with self._lock:
+            free_offsets = self._free_extents.get(len(data))
+            if free_offsets:
+                offset = free_offsets.pop()
+            else:
+                offset = self._end
+                self._end += len(data)
+
+            self._file.seek(offset)
+            self._file.write(data)
+            self._used_size += len(data)
+
+        return offset
+
+    def read(self, offset: int, size: int) -> bytes:
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(size)
+
+    def free(self, offset: int, size: int):
+        with self._lock:
+            self._free_extents.setdefault(size, []).append(offset)
+            self._used_size -= size
+
+    def write(self, image: QImage) -> SpilledTile:
+        spilled_tile = self._spilled_tiles.get(image.cacheKey())
+        if spilled_tile is not None:
+            return spilled_tile
+
+        data = image.constBits().asstring(image.sizeInBytes())
+        offset = self.write_data(data)
+        spilled_tile = SpilledTile(
+            self,
+            offset,
+            image.width(),
+            image.height(),
+            image.bytesPerLine(),
+            image.format(),
+        )
+        # Free the extent once no tiled image (or copy of one) references the tile anymore
+        weakref.finalize(spilled_tile, self.free, offset, len(data))
+        self._spilled_tiles[image.cacheKey()] = spilled_tile
+        return spilled_tile
+
+    def get_used_size(self) -> int:
+        """Size in bytes of data currently in the file"""
+        return self._used_size
+
+    def close(self):
+        self._file.close()
+
+
+# Releases pixels of a tracked image that can be decoded again, returns False if they cannot
+EvictCallback = Callable[[], bool]
+
+
+class PixelsMemoryStats(NamedTuple):
+    # Size in bytes of tile pixels in memory, pixels shared by several images (e.g. duplicated layers) are counted once
+    resident_size: int
+    # Size in bytes of tile pixels spilled to the scratch file
+    spilled_size: int
+    max_resident_size: int
+    num_images: int
+    num_spilled_images: int
+
+
+class _TrackedImage(NamedTuple):
+    image_ref: weakref.ref
+    # TiledImage.pixels_key at last use, so that unchanged images are not scanned again
+    pixels_key: int
+    # Sizes of resident tiles by QImage.cacheKey at last use, empty once spilled
+    tile_sizes: Dict[int, int]
+    evict: Optional[EvictCallback]
+    is_spilled: bool
+
+
+class PixelsMemoryBudget:
+    """
+    Bounds the memory used by pixels of tiled images (e.g. image layers),
+    least recently used images are spilled to a scratch file past `max_resident_size` bytes
+    and read back when they are used again.
+
+    Tiles shared by several images (e.g. duplicated layers) are counted once, their memory is only released
+    once every image sharing them is spilled.
+
+    Images that can be decoded again from their source (e.g. lazily decoded PSD layers) are evicted instead of spilled.
+
+    Images used during a paint pass (see begin_pass) are not spilled until the end of the next pass,
+    so that painting visible images over budget does not spill and restore them back and forth.
+    """
+
+    def __init__(
+        self,
+        max_resident_size: int = DEFAULT_MAX_RESIDENT_SIZE,
+        scratch_file_factory: Callable[[], TileScratchFile] = TileScratchFile,
+    ):
+        self._max_resident_size = max_resident_size
+        self._scratch_file_factory = scratch_file_factory
+        self._scratch_file: Optional[TileScratchFile] = None
+        # Tracked images by their id, least recently used first
+        self._images: "OrderedDict[int, _TrackedImage]" = OrderedDict()
+        # Number of tracked images referencing each resident tile and its size, by QImage.cacheKey
+        self._tile_refs: Dict[int, List[int]] = {}
+        self._resident_size = 0
+        # Ids of images used in the current paint pass and in the previous one, which are not spilled
+        self._is_painting = False
+        self._painted_image_ids: Set[int] = set()
+        self._previously_painted_image_ids: Set[int] = set()
+        # NOTE: weak reference callbacks run wherever the last reference is dropped
+        self._lock = threading.RLock()
+
+    def get_max_resident_size(self) -> int:
+        return self._max_resident_size
+
+    def set_max_resident_size(self, max_resident_size: int):
+        with self._lock:
+            self._max_resident_size = max_resident_size
+            self._enforce()
+
+    def begin_pass(self):
+        """Start a paint pass (e.g. when a view is painted), images used until end_pass are kept in memory"""
+        with self._lock:
+            self._is_painting = True
+            self._painted_image_ids = set()
+
+    def end_pass(self):
+        with self._lock:
+            self._is_painting = False
+            self._previously_painted_image_ids = self._painted_image_ids
+            self._painted_image_ids = set()
+
+    def use(self, tiled_image: TiledImage, evict: Optional[EvictCallback] = None):
+        """
+        Mark an image as most recently used (e.g. when painted), reading its pixels back if they were spilled,
+        then spill least recently used images to stay within budget. Starts tracking untracked images.
+
+        `evict` releases the image instead of spilling it when its pixels can be decoded again,
+        it returns False if they no longer can. It must not keep the image owner alive.
+        Once given, it is kept when the image is used again.
+        """
+        with self._lock:
+            image_id = id(tiled_image)
+            if self._is_painting:
+                self._painted_image_ids.add(image_id)
+
+            entry = self._images.get(image_id)
+            if (
+                entry is not None
+                and not entry.is_spilled
+                and entry.pixels_key == tiled_image.pixels_key
+            ):
+                # Resident and unchanged, tiles are already accounted for
+                self._images.move_to_end(image_id)
+                if evict is not None:
+                    self._images[image_id] = entry._replace(evict=evict)
+                return
+
+            tiled_image.restore()
+
+            if entry is None:
+                image_ref = weakref.ref(
+                    tiled_image, lambda ref: self._forget(image_id, ref)
+                )
+            else:
+                del self._images[image_id]
+                image_ref = entry.image_ref
+                self._release_tiles(entry.tile_sizes)
+                if evict is None:
+                    evict = entry.evict
+
+            tile_sizes = tiled_image.get_resident_tile_sizes()
+            self._images[image_id] = _TrackedImage(
+                image_ref, tiled_image.pixels_key, tile_sizes, evict, False
+            )
+            self._acquire_tiles(tile_sizes)
+
+            # NOTE: the image in use is never spilled, even if it alone is over budget
+            self._enforce(keep_image_id=image_id)
+
+    def _acquire_tiles(self, tile_sizes: Dict[int, int]):
+        for tile_key, tile_size in tile_sizes.items():
+            tile_ref = self._tile_refs.get(tile_key)
+            if tile_ref is None:
+                self._tile_refs[tile_key] = [1, tile_size]
+                self._resident_size += tile_size
+            else:
+                tile_ref[0] += 1
+
+    def _release_tiles(self, tile_sizes: Dict[int, int]):
+        for tile_key in tile_sizes:
+            tile_ref = self._tile_refs[tile_key]
+            tile_ref[0] -= 1
+            if tile_ref[0] == 0:
+                del self._tile_refs[tile_key]
+                self._resident_size -= tile_ref[1]
+
+    def _forget(self, image_id: int, image_ref: weakref.ref):
+        with self._lock:
+            entry = self._images.get(image_id)
+            # NOTE: the id may have been reused by a newer image in the meantime
+            if entry is not None and entry.image_ref is image_ref:
+                del self._images[image_id]
+                self._release_tiles(entry.tile_sizes)
+
+    def _enforce(self, keep_image_id: Optional[int] = None):
+        for image_id in list(self._images):
+            if self._resident_size <= self._max_resident_size:
+                break
+            if (
+                image_id == keep_image_id
+                or image_id in self._painted_image_ids
+                or image_id in self._previously_painted_image_ids
+            ):
+                continue
+
+            entry = self._images[image_id]
+            tiled_image = entry.image_ref()
+            if tiled_image is None or len(entry.tile_sizes) == 0:
+                continue
+
+            # Pixels that can be decoded again are dropped rather than written to the scratch file
+            if entry.evict is not None and entry.evict():
+                del self._images[image_id]
+                self._release_tiles(entry.tile_sizes)
+                continue
+
+            if self._scratch_file is None:
+                self._scratch_file = self._scratch_file_factory()
+            tiled_image.spill(self._scratch_file)
+            self._images[image_id] = entry._replace(tile_sizes={}, is_spilled=True)
+            self._release_tiles(entry.tile_sizes)
+
+    def get_stats(self) -> PixelsMemoryStats:
+        with self._lock:
+            num_spilled_images = 0
+            for entry in self._images.values():
+                tiled_image = entry.image_ref()
+                if tiled_image is not None and tiled_image.is_spilled():
+                    num_spilled_images += 1
+
+            return PixelsMemoryStats(
+                resident_size=self._resident_size,
+                spilled_size=(
+                    0
+                    if self._scratch_file is None
+                    else self._scratch_file.get_used_size()
+                ),
+                max_resident_size=self._max_resident_size,
+                num_images=len(self._images),
+                num_spilled_images=num_spilled_images,
+            )
+
+
+# Shared by all layers, so that the budget applies to the whole application
+pixels_memory_budget = PixelsMemoryBudget()
@@ -1,46 +1,205 @@
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
 from psd_tools import PSDImage
+from psd_tools.api.layers import Layer
+from PyQt6.QtGui import QImage
+from PyQt6.QtWidgets import QGraphicsItem
 
-from ..file_format import AIEProject
+from ..file_format import AIEProject, LayerSnapshot, snapshot_item
 from ..model_view.items.group import AIEGroupItem
-from .pixel import psd_pixel_layer_to_image_item
+from .parallel import iter_decoded_psd_pixel_layers
+from .pixel import (
+    DecodedPixels,
+    PSDLazyLayerSource,
+    decoded_pixels_to_qimage,
+    is_empty_psd_pixel_layer,
+    pil_image_to_decoded_pixels,
+    psd_pixel_layer_to_image_item,
+    psd_pixel_layer_to_lazy_image_item,
+)
 from .shape import psd_shape_layer_to_shape_item
 from .text import psd_type_layer_to_text_item
 
-__all__ = ["load_psd_as_project"]
+__all__ = [
+    "load_psd_as_project",
+    "read_psd_composite_preview",
+    "iter_psd_layer_records",
+    "iter_psd_layer_record_batches",
+    "PSDLayerRecord",
+    "PSDProjectBuilder",
+]
+
+
+class PSDLayerRecord(NamedTuple):
+    """A PSD layer ready to be converted into a scene item"""
+
+    layer: Layer
+    # None for top level layers
+    parent_layer: Optional[Layer]
+    # Index of the layer in `PSDImage.descendants()` order
+    layer_index: int
+    # Pixel layers are either decoded up-front (pixels are None for empty layers)
+    # or decoded lazily by their item from a source shared by all lazily decoded layers of the PSD
+    pixels: Optional[DecodedPixels]
+    lazy_source: Optional[PSDLazyLayerSource]
+
+    @property
+    def is_decoded_lazily(self):
+        return self.lazy_source is not None
+
+
+def is_psd_layer_on_canvas(layer, psd_width: int, psd_height: int):
+    left, top, right, bottom = layer.bbox
+    return left < psd_width and top < psd_height and right > 0 and bottom > 0
+
+
+def iter_psd_layer_records(filepath: str, psd: PSDImage) -> Iterator[PSDLayerRecord]:
+    """
+    Yields records of all PSD layers in `PSDImage.descendants()` order, so parents always come before their children.
+
+    Visible on-canvas pixel layers are decoded up-front (in parallel), other pixel layers (hidden or off-canvas)
+    are only decoded when first needed.
+    """
+    pixel_layers = [
+        layer
+        for layer in psd.descendants()
+        if layer.kind == "pixel"
+        and layer.is_visible()
+        and is_psd_layer_on_canvas(layer, psd.width, psd.height)
+    ]
+    eagerly_decoded_layer_ids = {id(layer) for layer in pixel_layers}
+    lazy_source = PSDLazyLayerSource(
+        filepath,
+        (
+            i
+            for i, layer in enumerate(psd.descendants())
+            if layer.kind == "pixel"
+            and id(layer) not in eagerly_decoded_layer_ids
+            and not is_empty_psd_pixel_layer(layer)
+        ),
+    )
+    decoded_pixels = iter_decoded_psd_pixel_layers(filepath, psd, pixel_layers)
+
+    try:
+        for i, layer in enumerate(psd.descendants()):
+            parent_layer = None if layer.parent is psd else layer.parent
+
+            if layer.kind != "pixel":
+                yield PSDLayerRecord(layer, parent_layer, i, None, None)
+            elif id(layer) in eagerly_decoded_layer_ids:
+                yield PSDLayerRecord(layer, parent_layer, i, next(decoded_pixels), None)
+            else:
+                yield PSDLayerRecord(layer, parent_layer, i, None, lazy_source)
+    finally:
+        decoded_pixels.close()
+
+
+def iter_psd_layer_record_batches(
+    records: Iterable[PSDLayerRecord], interval: float
+) -> Iterator[List[PSDLayerRecord]]:
+    """Group records into batches, a batch is yielded once `interval` seconds passed since the previous one"""
+    batch = []
+    batch_start_time = time.perf_counter()
 
+    for record in records:
+        batch.append(record)
 
-def read_psd_layer(scene, layer, psd_width: int, psd_height: int):
-    item = None
+        if time.perf_counter() - batch_start_time >= interval:
+            yield batch
+            batch = []
+            batch_start_time = time.perf_counter()
 
-    if layer.kind == "pixel":
-        item = psd_pixel_layer_to_image_item(layer)
+    if len(batch) > 0:
+        yield batch
 
-    elif layer.kind == "shape":
-        item = psd_shape_layer_to_shape_item(layer, psd_width, psd_height)
 
-    elif layer.kind == "type":
-        item = psd_type_layer_to_text_item(layer)
+def read_psd_composite_preview(psd: PSDImage) -> Optional[QImage]:
+    """Read the composite image embedded in the PSD, which is much faster than compositing its layers"""
+    if not psd.has_preview():
+        return None
 
-    elif layer.kind == "group":
-        item = AIEGroupItem(layer.name)
+    pil_image = psd.topil()
+    if pil_image is None:
+        return None
 
-        for child_layer in layer:
-            child_item = read_psd_layer(scene, child_layer, psd_width, psd_height)
-            if child_item:
-                child_item.setParentItem(item)
+    return decoded_pixels_to_qimage(pil_image_to_decoded_pixels(pil_image))
 
-    if item is not None:
-        scene.addItem(item)
-        return item
+
+class PSDProjectBuilder:
+    """Convert PSD layer records into project scene items, records are expected in `iter_psd_layer_records` order"""
+
+    def __init__(self, project: AIEProject, psd_width: int, psd_height: int):
+        self._scene = project.get_graphics_scene()
+        self._psd_width = psd_width
+        self._psd_height = psd_height
+        self._group_items: Dict[int, AIEGroupItem] = {}
+        # Snapshots of top level items as converted, back-to-front, and of groups by PSD layer id
+        self._snapshots: List[LayerSnapshot] = []
+        self._group_snapshots: Dict[int, LayerSnapshot] = {}
+
+    def _create_item(self, record: PSDLayerRecord) -> Optional[QGraphicsItem]:
+        layer = record.layer
+
+        if layer.kind == "pixel":
+            if record.is_decoded_lazily:
+                return psd_pixel_layer_to_lazy_image_item(
+                    layer, record.lazy_source, record.layer_index
+                )
+            elif record.pixels is not None:
+                return psd_pixel_layer_to_image_item(layer, record.pixels)
+
+        elif layer.kind == "shape":
+            return psd_shape_layer_to_shape_item(
+                layer, self._psd_width, self._psd_height
+            )
+
+        elif layer.kind == "type":
+            return psd_type_layer_to_text_item(layer)
+
+        elif layer.kind == "group":
+            item = AIEGroupItem(layer.name)
+            self._group_items[id(layer)] = item
+            return item
+
+        return None
+
+    def add_record(self, record: PSDLayerRecord):
+        item = self._create_item(record)
+        if item is None:
+            return
+
+        # NOTE: taken before the item is in the scene, so that it does not include later user edits
+        snapshot = snapshot_item(item)
+        if isinstance(item, AIEGroupItem):
+            self._group_snapshots[id(record.layer)] = snapshot
+
+        if record.parent_layer is None:
+            self._scene.addItem(item)
+            self._snapshots.append(snapshot)
+        else:
+            # NOTE: parent group item is already in scene, so the item is added to the scene along with it
+            item.setParentItem(self._group_items[id(record.parent_layer)])
+            # Children are stacked on top of their siblings, as they are in group snapshots
+            self._group_snapshots[id(record.parent_layer)].children.append(snapshot)
+
+    def add_records(self, records: Iterable[PSDLayerRecord]):
+        for record in records:
+            self.add_record(record)
+
+    def snapshot_layers(self) -> List[LayerSnapshot]:
+        """
+        Snapshots of top level layers (and their children) as converted from the PSD, without edits made since
+        (e.g. while the PSD is still being imported), see AIEProject.snapshot_layers
+        """
+        return self._snapshots
 
 
 def load_psd_as_project(filepath):
     psd = PSDImage.open(filepath)
 
     project = AIEProject()
-    scene = project.get_graphics_scene()
-
-    for layer in psd:
-        read_psd_layer(scene, layer, psd.width, psd.height)
+    builder = PSDProjectBuilder(project, psd.width, psd.height)
+    builder.add_records(iter_psd_layer_records(filepath, psd))
 
     return project
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from PyQt6.QtCore import QStandardPaths
+
+from ..file_format import (
+    LAYER_TREE_FORMAT_VERSION,
+    AIEProject,
+    LayerSnapshot,
+    write_layer_snapshots,
+)
+
+__all__ = ("PSDProjectCache",)
+
+# Bump when PSD conversion changes, so that projects converted by older code are not served anymore
+PSD_CONVERSION_VERSION = 1
+
+DEFAULT_MAX_CACHE_SIZE = 4 * 1024**3
+
+# Size of file content samples (at start and end of file) included in cache keys
+_CONTENT_SAMPLE_SIZE = 64 * 1024
+
+_CACHE_ENTRY_SUFFIX = ".aie"
+
+
+class PSDProjectCache:
+    """
+    On-disk cache of PSD files converted into projects, stored as .aie files.
+
+    Entries are keyed by PSD path, size, modification time and samples of its content, so a changed PSD
+    gets a new key and is never served stale, least recently used entries are evicted past `max_size` bytes.
+    """
+
+    def __init__(self, directory: Path, max_size: int = DEFAULT_MAX_CACHE_SIZE):
+        self._directory = directory
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        # Entries are written off the GUI thread, one at a time
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    @staticmethod
+    def default():
+        cache_location = QStandardPaths.writableLocation(
+            QStandardPaths.StandardLocation.CacheLocation
+        )
+        return PSDProjectCache(Path(cache_location) / "psd_projects")
+
+    def key(self, filepath: str) -> str:
+        stat = os.stat(filepath)
+        hasher = hashlib.sha256()
+        hasher.update(f"{PSD_CONVERSION_VERSION}:{LAYER_TREE_FORMAT_VERSION}".encode())
+        hasher.update(os.path.realpath(filepath).encode())
+        hasher.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+
+        # Guard against changes that preserve both size and modification time
+        with open(filepath, "rb") as file:
+            hasher.update(file.read(_CONTENT_SAMPLE_SIZE))
+            if stat.st_size > _CONTENT_SAMPLE_SIZE:
+                file.seek(
+                    max(stat.st_size - _CONTENT_SAMPLE_SIZE, _CONTENT_SAMPLE_SIZE)
+                )
+                hasher.update(file.read(_CONTENT_SAMPLE_SIZE))
+
+        return hasher.hexdigest()
+
+    def _entry_path(self, key: str):
+        return self._directory / (key + _CACHE_ENTRY_SUFFIX)
+
+    def load(self, key: str) -> Optional[AIEProject]:
+        """Returns the cached project of a PSD file given its key, or None if it is not cached"""
+        entry_path = self._entry_path(key)
+
+        with self._lock:
+            try:
+                with open(entry_path, "rb") as file:
+                    project = AIEProject.deserialize(file)
+            except FileNotFoundError:
+                return None
+            except Exception:
+                # Corrupt or unsupported entry, drop it
+                entry_path.unlink(missing_ok=True)
+                return None
+
+            # Mark as recently used
+            os.utime(entry_path)
+
+        return project
+
+    def store_async(
+        self, key: str, snapshots: List[LayerSnapshot], filepath: str
+    ) -> Future:
+        """
+        Write project snapshots as the cache entry of a PSD file in the background,
+        `key` is the PSD key computed before it was converted, nothing is stored if the PSD changed since
+        """
+        return self._executor.submit(self._store, key, snapshots, filepath)
+
+    def _store(self, key: str, snapshots: List[LayerSnapshot], filepath: str):
+        entry_path = self._entry_path(key)
+        temp_path = entry_path.with_suffix(f".{threading.get_ident()}.tmp")
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+        try:
+            with open(temp_path, "wb") as file:
+                write_layer_snapshots(snapshots, file)
+
+            if self.key(filepath) != key:
+                # PSD changed while being converted or written, the entry would be stale
+                return
+
+            with self._lock:
+                os.replace(temp_path, entry_path)
+                self._evict()
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+    def _evict(self):
+        entries = []
+        for entry_path in self._directory.glob("*" + _CACHE_ENTRY_SUFFIX):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+        total_size = sum(size for _, size, _ in entries)
+
+        # Least recently used first
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self._max_size:
+                break
+
+            entry_path.unlink(missing_ok=True)
+            total_size -= size
@@ -0,0 +1,66 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Sequence
+
+from psd_tools import PSDImage
+from psd_tools.api.layers import PixelLayer
+
+from .pixel import DecodedPixels, decode_psd_pixel_layer
+
+__all__ = ("iter_decoded_psd_pixel_layers",)
+
+# Below this number of pixel layers, starting worker processes (each re-parsing the PSD) costs more than it saves
+MIN_LAYERS_FOR_PARALLEL_DECODING = 8
+
+# Layers of the PSD opened by the current worker process, in `PSDImage.descendants` order
+_worker_layers: List = []
+
+
+def _init_worker(filepath: str):
+    global _worker_layers
+    _worker_layers = list(PSDImage.open(filepath).descendants())
+
+
+def _decode_layer_at(layer_index: int):
+    return decode_psd_pixel_layer(_worker_layers[layer_index])
+
+
+def iter_decoded_psd_pixel_layers(
+    filepath: str,
+    psd: PSDImage,
+    pixel_layers: Sequence[PixelLayer],
+    max_workers: Optional[int] = None,
+) -> Iterator[Optional[DecodedPixels]]:
+    """
+    Decode given pixel layers of a PSD, yields decoded pixels (or None for empty layers)
+    in the same order as `pixel_layers`, as soon as each layer and the ones before it are decoded.
+
+    Layer channels decoding is CPU-bound, so it is done on a process pool when there are enough layers,
+    each worker opens the PSD file on its own and only raw pixel buffers are sent back.
+    Closing the iterator early cancels pending decoding.
+    """
+    # Workers identify layers by their index in `descendants()` order, as layer objects are not shared
+    descendant_indices = {id(layer): i for i, layer in enumerate(psd.descendants())}
+    layer_indices = [descendant_indices[id(layer)] for layer in pixel_layers]
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if max_workers <= 1 or len(layer_indices) < MIN_LAYERS_FOR_PARALLEL_DECODING:
+        for layer in pixel_layers:
+            yield decode_psd_pixel_layer(layer)
+        return
+
+    # NOTE: use "spawn" start method, forking a process that already runs Qt threads is not safe
+    executor = ProcessPoolExecutor(
+        max_workers=min(max_workers, len(layer_indices)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(filepath,),
+    )
+    try:
+        yield from executor.map(_decode_layer_at, layer_indices)
+    finally:
+        # Do not block on layers still being decoded when the iterator is closed early (e.g. import cancelled)
+        executor.shutdown(wait=False, cancel_futures=True)
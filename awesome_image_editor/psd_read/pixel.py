@@ -1,16 +1,76 @@
-from psd_tools.api.layers import PixelLayer
+import os
+import sys
+import threading
+from typing import Iterable, List, NamedTuple, Optional, Tuple, Union
 
-from ..model_view.items.image import AIEImageItem
+import numpy as np
+from PIL import Image
+from psd_tools import PSDImage
+from psd_tools.api.layers import Layer, PixelLayer
+from PyQt6.QtCore import QSize, Qt
+from PyQt6.QtGui import QImage
 
+from ..image_buffer import (
+    qimage_from_argb32_premultiplied,
+    rgba_to_argb32_premultiplied,
+)
+from ..model_view.items.image import AIEImageItem, AIELazyImageItem
 
-def psd_pixel_layer_to_image_item(layer: PixelLayer):
+
+class DecodedPixels(NamedTuple):
+    """
+    Pixels of a PSD layer in the memory layout of QImage.Format_ARGB32_Premultiplied,
+    plain data so that it can be sent back from decoding worker processes
+    """
+
+    width: int
+    height: int
+    argb32_premultiplied: Union[bytes, np.ndarray]
+
+
+def pil_image_to_decoded_pixels(pil_image: Image.Image):
+    if pil_image.mode != "RGBA":
+        pil_image = pil_image.convert("RGBA")
+
+    # Premultiply and swizzle channels while exporting pixels out of PIL, in a single vectorized pass,
+    # so the result can back a QImage as is, without further conversions when importing or painting
+    if sys.byteorder == "little":
+        # PIL "BGRa" raw mode is premultiplied BGRA, which is the little-endian layout of ARGB32_Premultiplied
+        pixels = pil_image.tobytes("raw", "BGRa")
+    else:
+        pixels = rgba_to_argb32_premultiplied(np.asarray(pil_image))
+
+    return DecodedPixels(pil_image.width, pil_image.height, pixels)
+
+
+def decode_psd_pixel_layer(layer: PixelLayer) -> Optional[DecodedPixels]:
     assert layer.kind == "pixel"
 
     pil_image = layer.topil()
     if pil_image is None:
+        return None
+
+    return pil_image_to_decoded_pixels(pil_image)
+
+
+def decoded_pixels_to_qimage(pixels: DecodedPixels):
+    return qimage_from_argb32_premultiplied(
+        pixels.argb32_premultiplied, pixels.width, pixels.height
+    )
+
+
+def psd_pixel_layer_to_image_item(
+    layer: PixelLayer, pixels: Optional[DecodedPixels] = None
+):
+    assert layer.kind == "pixel"
+
+    if pixels is None:
+        pixels = decode_psd_pixel_layer(layer)
+
+    if pixels is None:
         return
 
-    image = pil_image.toqimage()
+    image = decoded_pixels_to_qimage(pixels)
     left, top = layer.offset
     image_name = layer.name
     item = AIEImageItem(image, image_name)
@@ -18,3 +78,82 @@ def psd_pixel_layer_to_image_item(layer: PixelLayer):
     item.setVisible(layer.visible)
 
     return item
+
+
+def is_empty_psd_pixel_layer(layer: PixelLayer):
+    # Matches empty layers skipped by psd_pixel_layer_to_image_item
+    return layer.width == 0 or layer.height == 0
+
+
+def _get_file_signature(filepath: str) -> Tuple[int, int]:
+    stat = os.stat(filepath)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class PSDLazyLayerSource:
+    """
+    Decodes pixel layers of a PSD file when they are first needed (by lazy image items), from any thread.
+
+    NOTE: psd_tools objects are not thread safe, so the PSD parsed by the import is not used,
+    the file is parsed again by the first decoded layer and decoding is serialized.
+    The parsed PSD is released once every layer was decoded, and parsed again if a layer is decoded again
+    (e.g. after its pixels were evicted), as long as the file did not change.
+    """
+
+    def __init__(self, filepath: str, layer_indices: Iterable[int]):
+        self._filepath = filepath
+        self._file_signature = _get_file_signature(filepath)
+        # Layers by their index in `PSDImage.descendants` order, while some are not decoded yet
+        self._layers: Optional[List[Layer]] = None
+        self._undecoded_layer_indices = set(layer_indices)
+        self._lock = threading.Lock()
+
+    def decode(self, layer_index: int) -> Optional[DecodedPixels]:
+        with self._lock:
+            if self._layers is None:
+                if _get_file_signature(self._filepath) != self._file_signature:
+                    raise IOError(
+                        f"PSD file {self._filepath} changed since it was opened, "
+                        "its layers cannot be decoded anymore"
+                    )
+                self._layers = list(PSDImage.open(self._filepath).descendants())
+
+            pixels = decode_psd_pixel_layer(self._layers[layer_index])
+
+            self._undecoded_layer_indices.discard(layer_index)
+            if len(self._undecoded_layer_indices) == 0:
+                self._layers = None
+
+            return pixels
+
+
+def psd_pixel_layer_to_lazy_image_item(
+    layer: PixelLayer, source: PSDLazyLayerSource, layer_index: int
+):
+    """
+    Create an image item for a pixel layer without decoding it, pixels are decoded by `source` when first needed,
+    `layer_index` is the index of the layer in `PSDImage.descendants` order
+    """
+    assert layer.kind == "pixel"
+
+    if is_empty_psd_pixel_layer(layer):
+        return
+
+    size = QSize(layer.width, layer.height)
+
+    # NOTE: the decoder must not reference the layer, which keeps the whole parsed PSD alive
+    def decode():
+        pixels = source.decode(layer_index)
+        if pixels is None:
+            image = QImage(size, QImage.Format.Format_ARGB32_Premultiplied)
+            image.fill(Qt.GlobalColor.transparent)
+            return image
+
+        return decoded_pixels_to_qimage(pixels)
+
+    left, top = layer.offset
+    item = AIELazyImageItem(size, decode, layer.name)
+    item.setPos(left, top)
+    item.setVisible(layer.visible)
+
+    return item
@@ -1,38 +1,100 @@
+from itertools import chain
+from typing import List
+
+import numpy as np
 from psd_tools.api.layers import ShapeLayer
 from psd_tools.api.shape import Subpath
-from psd_tools.psd.vector import Knot
+from PyQt6.QtCore import QByteArray, QDataStream, Qt
 from PyQt6.QtGui import QPainterPath
 
 from ..model_view.items.shape import AIEShapeItem
 
-
-def _connect_knots_cubic(
-    qpath: QPainterPath, k1: Knot, k2: Knot, psd_width: int, psd_height: int
-):
-    start_y, start_x = k1.anchor
-    start_x *= psd_width
-    start_y *= psd_height
-
-    end_y, end_x = k2.anchor
-    end_x *= psd_width
-    end_y *= psd_height
-
-    control_point_1_y, control_point_1_x = k1.leaving
-    control_point_1_x *= psd_width
-    control_point_1_y *= psd_height
-
-    control_point_2_y, control_point_2_x = k2.preceding
-    control_point_2_x *= psd_width
-    control_point_2_y *= psd_height
-
-    qpath.cubicTo(
-        control_point_1_x,
-        control_point_1_y,
-        control_point_2_x,
-        control_point_2_y,
-        end_x,
-        end_y,
+# Layout of a QPainterPath element when (de)serialized with QDataStream (big-endian, double precision floats)
+_QPATH_ELEMENT_DTYPE = np.dtype([("type", ">i4"), ("x", ">f8"), ("y", ">f8")])
+
+
+def _gather_knot_points(subpaths: List[Subpath], psd_width: int, psd_height: int):
+    """
+    Returns knots of all subpaths as a single array with shape (num_knots, 3, 2),
+    holding (preceding control point, anchor, leaving control point) of each knot in (x, y) pixel coordinates
+    """
+    num_knots = sum(len(subpath) for subpath in subpaths)
+    # PSD knots points are (y, x) pairs normalized by document size, gather them all to scale them at once
+    coordinates = np.fromiter(
+        chain.from_iterable(
+            knot.preceding + knot.anchor + knot.leaving
+            for subpath in subpaths
+            for knot in subpath
+        ),
+        dtype=np.float64,
+        count=num_knots * 6,
+    )
+    return coordinates.reshape(num_knots, 3, 2)[..., ::-1] * (psd_width, psd_height)
+
+
+def _build_cubic_qpath(points: np.ndarray, subpaths: List[Subpath]):
+    """
+    Build a path of cubic bezier segments connecting consecutive knots of each subpath,
+    closed subpaths have an extra segment connecting their last knot back to their first one.
+
+    Path elements are computed all at once then loaded into a QPainterPath in a single pass,
+    instead of calling QPainterPath.cubicTo for each segment.
+    """
+    num_subpaths = len(subpaths)
+    knot_counts = np.array([len(subpath) for subpath in subpaths])
+    is_closed = np.array([subpath.is_closed() for subpath in subpaths])
+    first_knot_indices = np.cumsum(knot_counts) - knot_counts
+
+    segment_counts = np.where(is_closed, knot_counts, knot_counts - 1)
+    first_segment_indices = np.cumsum(segment_counts) - segment_counts
+    num_segments = int(segment_counts.sum())
+
+    # Index of the subpath, start knot and end knot of each segment
+    segment_subpaths = np.repeat(np.arange(num_subpaths), segment_counts)
+    segment_start_knots = (
+        np.arange(num_segments)
+        - first_segment_indices[segment_subpaths]
+        + first_knot_indices[segment_subpaths]
+    )
+    segment_end_knots = segment_start_knots + 1
+    closing_segments = (first_segment_indices + segment_counts - 1)[
+        is_closed & (segment_counts > 0)
+    ]
+    segment_end_knots[closing_segments] = first_knot_indices[
+        segment_subpaths[closing_segments]
+    ]
+
+    # Each subpath is a move-to element followed by 3 elements per segment:
+    # curve-to (first control point) then 2 curve-to-data elements (second control point and end point)
+    move_to_indices = np.arange(num_subpaths) + 3 * first_segment_indices
+    curve_to_indices = 3 * np.arange(num_segments) + 1 + segment_subpaths
+    num_elements = num_subpaths + 3 * num_segments
+
+    # Rows of (num_knots * 3, 2) points table holding coordinates of each element, gathered all at once
+    point_rows = np.empty(num_elements, dtype=np.intp)
+    point_rows[move_to_indices] = 3 * first_knot_indices + 1
+    segment_element_indices = curve_to_indices[:, np.newaxis] + np.arange(3)
+    point_rows[segment_element_indices] = np.stack(
+        (3 * segment_start_knots + 2, 3 * segment_end_knots, 3 * segment_end_knots + 1),
+        axis=1,
     )
+    xy = points.reshape(-1, 2)[point_rows]
+
+    elements = np.empty(num_elements, dtype=_QPATH_ELEMENT_DTYPE)
+    elements["type"] = QPainterPath.ElementType.CurveToDataElement.value
+    elements["type"][move_to_indices] = QPainterPath.ElementType.MoveToElement.value
+    elements["type"][curve_to_indices] = QPainterPath.ElementType.CurveToElement.value
+    elements["x"] = xy[:, 0]
+    elements["y"] = xy[:, 1]
+
+    header = np.array([len(elements)], dtype=">i4")
+    # Index of the last subpath start element, and fill rule (default fill rule of QPainterPath)
+    footer = np.array([move_to_indices[-1], Qt.FillRule.OddEvenFill.value], dtype=">i4")
+    data = QByteArray(header.tobytes() + elements.tobytes() + footer.tobytes())
+
+    qpath = QPainterPath()
+    QDataStream(data) >> qpath
+    return qpath
 
 
 def psd_shape_layer_to_shape_item(layer: ShapeLayer, psd_width: int, psd_height: int):
@@ -44,32 +106,20 @@ def psd_shape_layer_to_shape_item(layer: ShapeLayer, psd_width: int, psd_height:
     if layer.vector_mask is None:
         return
 
-    left, top = layer.offset
-    layer_name = layer.name
-
-    main_qpath = QPainterPath()
-    item = AIEShapeItem(main_qpath, layer_name)
-    item.setVisible(layer.visible)
-
-    subpath: Subpath
-    for subpath in layer.vector_mask.paths:
-        num_knots = len(subpath)
-        if num_knots == 0:
-            continue
-
+    # Skip subpaths without any segment (e.g. a single knot open path), they would be empty paths
+    subpaths = [
+        subpath
+        for subpath in layer.vector_mask.paths
+        if len(subpath) > 1 or (len(subpath) == 1 and subpath.is_closed())
+    ]
+
+    if len(subpaths) > 0:
+        points = _gather_knot_points(subpaths, psd_width, psd_height)
+        qpath = _build_cubic_qpath(points, subpaths)
+    else:
         qpath = QPainterPath()
-        qpath.moveTo(
-            subpath[0].anchor[1] * psd_width, subpath[0].anchor[0] * psd_height
-        )
 
-        for i in range(num_knots - 1):
-            current_knot = subpath[i]
-            next_knot = subpath[i + 1]
-            _connect_knots_cubic(qpath, current_knot, next_knot, psd_width, psd_height)
-
-        if subpath.is_closed():
-            _connect_knots_cubic(qpath, subpath[-1], subpath[0], psd_width, psd_height)
-
-        main_qpath.addPath(qpath)
+    item = AIEShapeItem(qpath, layer.name)
+    item.setVisible(layer.visible)
 
     return item
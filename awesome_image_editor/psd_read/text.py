@@ -1,6 +1,16 @@
+from functools import lru_cache
+from typing import Tuple
+
 from psd_tools.api.layers import TypeLayer
 from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QColor, QFont, QTextBlockFormat, QTextCharFormat, QTextCursor
+from PyQt6.QtGui import (
+    QColor,
+    QFont,
+    QTextBlockFormat,
+    QTextCharFormat,
+    QTextCursor,
+    QTextDocument,
+)
 
 from ..model_view.items.text import AIETextItem
 
@@ -13,6 +23,26 @@ PSD_PARAGRAPH_JUSTIFICATION_QT_ALIGNMENT_MAP = {
 }
 
 
+# Text layers of a PSD usually share a few styles, resolved fonts and char formats are cached across layers
+@lru_cache(maxsize=256)
+def _get_font(font_family: str, font_size: int):
+    qfont = QFont()
+    qfont.setPixelSize(font_size)
+    qfont.setFamily(font_family)
+    return qfont
+
+
+@lru_cache(maxsize=1024)
+def _get_char_format(
+    font_family: str, font_size: int, color_rgba: Tuple[int, int, int, int]
+):
+    # NOTE: cached formats are shared, cursor.insertText copies the format so it is never modified
+    char_format = QTextCharFormat()
+    char_format.setFont(_get_font(font_family, font_size))
+    char_format.setForeground(QColor(*color_rgba))
+    return char_format
+
+
 def psd_type_layer_to_text_item(layer: TypeLayer):
     item = AIETextItem("", layer.name)
     item.setPos(layer.offset[0], layer.offset[1])
@@ -20,6 +50,14 @@ def psd_type_layer_to_text_item(layer: TypeLayer):
 
     document = item.document()
     document.setUseDesignMetrics(True)
+
+    with item.deferred_layout():
+        _fill_text_document(layer, document)
+
+    return item
+
+
+def _fill_text_document(layer: TypeLayer, document: QTextDocument):
     cursor = QTextCursor(document)
 
     text = layer.engine_dict["Editor"]["Text"].value
@@ -46,14 +84,10 @@ def psd_type_layer_to_text_item(layer: TypeLayer):
         font_family = str(font["Name"])
         font_size = stylesheet["FontSize"]
 
-        qfont = QFont()
         assert int(font_size) == font_size
-        qfont.setPixelSize(int(font_size))
-        qfont.setFamily(font_family)
-
-        char_format = QTextCharFormat()
-        char_format.setFont(qfont)
-        char_format.setForeground(QColor(*fill_color_rgba_uchar))
+        char_format = _get_char_format(
+            font_family, int(font_size), fill_color_rgba_uchar
+        )
 
         cursor.insertText(substring, char_format)
 
@@ -74,5 +108,3 @@ def psd_type_layer_to_text_item(layer: TypeLayer):
         cursor.setBlockFormat(block_format)
 
         cursor.movePosition(QTextCursor.MoveOperation.NextBlock)
-
-    return item
@@ -0,0 +1,81 @@
+import traceback
+
+from psd_tools import PSDImage
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from . import (
+    iter_psd_layer_record_batches,
+    iter_psd_layer_records,
+    read_psd_composite_preview,
+)
+
+__all__ = ("PSDImportWorker",)
+
+# Minimum time between two batches of layers sent to the GUI thread, in seconds
+LAYER_BATCH_INTERVAL = 0.1
+
+
+class PSDImportWorker(QThread):
+    """
+    Read a PSD file off the GUI thread, layer records are streamed in batches to be converted into scene items
+    by a PSDProjectBuilder in the GUI thread (scene items must be created in the GUI thread).
+
+    Cancel with `requestInterruption()`, `was_cancelled()` tells whether import ended early.
+    """
+
+    # PSD width and height, emitted once the file is parsed
+    opened = pyqtSignal(int, int)
+    # Composite image (QImage) embedded in the PSD, emitted before any layer
+    # NOTE: emitted as a Python object, a QImage argument would be received as a shallow copy
+    # that does not keep alive the pixel buffer the image was created over
+    previewReady = pyqtSignal(object)
+    # List of PSDLayerRecord
+    layersReady = pyqtSignal(list)
+    # Number of layers read so far, total number of layers
+    progressChanged = pyqtSignal(int, int)
+    # Formatted traceback
+    failed = pyqtSignal(str)
+
+    def __init__(self, filepath: str):
+        super().__init__()
+        self._filepath = filepath
+        self._was_cancelled = False
+
+    def was_cancelled(self):
+        return self._was_cancelled
+
+    def run(self) -> None:
+        try:
+            self._import()
+        except Exception:
+            self.failed.emit(traceback.format_exc())
+
+    def _import(self):
+        psd = PSDImage.open(self._filepath)
+        self.opened.emit(psd.width, psd.height)
+
+        if self.isInterruptionRequested():
+            self._was_cancelled = True
+            return
+
+        preview = read_psd_composite_preview(psd)
+        if preview is not None:
+            self.previewReady.emit(preview)
+
+        num_layers = sum(1 for _ in psd.descendants())
+        num_read_layers = 0
+        self.progressChanged.emit(num_read_layers, num_layers)
+
+        records = iter_psd_layer_records(self._filepath, psd)
+        try:
+            for batch in iter_psd_layer_record_batches(records, LAYER_BATCH_INTERVAL):
+                if self.isInterruptionRequested():
+                    self._was_cancelled = True
+                    return
+
+                self.layersReady.emit(batch)
+                num_read_layers += len(batch)
+                self.progressChanged.emit(num_read_layers, num_layers)
+        finally:
+            # Cancels pending layer decoding if import stopped early
+            records.close()
@@ -0,0 +1,494 @@
+import itertools
+import weakref
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+from PyQt6.QtCore import QRect, QRectF, QSize, Qt
+from PyQt6.QtGui import QColor, QImage, QPainter, QRegion
+
+from .occlusion import get_device_rect, is_axis_aligned, is_device_rect_hidden
+
+__all__ = (
+    "TILE_SIZE",
+    "SpilledTile",
+    "Tile",
+    "TileCoverage",
+    "TiledImage",
+    "new_pixels_key",
+)
+
+TILE_SIZE = 256
+
+
+class SpilledTile:
+    """Pixels of a tile moved out of memory into a scratch file (see pixels_memory.TileScratchFile)"""
+
+    def __init__(
+        self,
+        scratch_file,
+        offset: int,
+        width: int,
+        height: int,
+        bytes_per_line: int,
+        image_format: QImage.Format,
+    ):
+        self._scratch_file = scratch_file
+        self._offset = offset
+        self._width = width
+        self._height = height
+        self._bytes_per_line = bytes_per_line
+        self._image_format = image_format
+        # Last loaded pixels, so that images sharing this tile share loaded pixels too
+        self._loaded_image_ref: Optional[weakref.ref] = None
+
+    def load(self) -> QImage:
+        if self._loaded_image_ref is not None:
+            image = self._loaded_image_ref()
+            if image is not None:
+                return image
+
+        data = self._scratch_file.read(
+            self._offset, self._bytes_per_line * self._height
+        )
+        # NOTE: copy, so that the image does not refer to the Python bytes object
+        image = QImage(
+            data, self._width, self._height, self._bytes_per_line, self._image_format
+        ).copy()
+        self._loaded_image_ref = weakref.ref(image)
+        return image
+
+
+# Pixels of a tile, or a single color for tiles where all pixels are the same (fully transparent tiles are not stored)
+Tile = Union[QImage, QColor, SpilledTile]
+
+
+class TileCoverage(NamedTuple):
+    """Pixels of a tile that are not fully transparent"""
+
+    # Tight bounds of pixels that are not fully transparent, in image coordinates
+    bounds: QRect
+    # Whether every pixel of the tile rect is fully opaque
+    is_opaque: bool
+
+
+def _compute_tile_coverage(
+    tile_rect: QRect, tile: Union[QImage, QColor]
+) -> Optional[TileCoverage]:
+    if isinstance(tile, QColor):
+        return TileCoverage(QRect(tile_rect), tile.alpha() == 255)
+
+    # NOTE: numpy is only imported once pixels are read, to keep startup fast
+    import numpy as np
+
+    from .image_buffer import argb32_premultiplied_view
+
+    if tile.format() != QImage.Format.Format_ARGB32_Premultiplied:
+        tile = tile.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+
+    # NOTE: tiles are not cropped when an image shrinks, only their part in the tile rect is painted
+    pixels = argb32_premultiplied_view(tile).view(np.uint32)[
+        : tile_rect.height(), : tile_rect.width(), 0
+    ]
+    # NOTE: premultiplied pixels are 0 exactly when fully transparent
+    is_visible = pixels != 0
+    rows = np.flatnonzero(is_visible.any(axis=1))
+    if len(rows) == 0:
+        return None
+    columns = np.flatnonzero(is_visible.any(axis=0))
+
+    bounds = QRect(
+        tile_rect.x() + int(columns[0]),
+        tile_rect.y() + int(rows[0]),
+        int(columns[-1] - columns[0]) + 1,
+        int(rows[-1] - rows[0]) + 1,
+    )
+    # Alpha is the most significant byte of 32-bit pixels, the tile may be smaller than its rect
+    is_opaque = bounds == tile_rect and bool((pixels >= 0xFF000000).all())
+    return TileCoverage(bounds, is_opaque)
+
+
+# Unique keys identifying pixels contents, e.g. to cache results computed from them
+_pixels_keys = itertools.count()
+
+
+def new_pixels_key() -> int:
+    return next(_pixels_keys)
+
+
+class TiledImage:
+    """
+    An image stored as fixed-size tiles, fully transparent tiles are not stored and uniform tiles are stored as a color,
+    so that memory scales with image contents rather than image bounds.
+
+    Tile images are implicitly shared, so that copying a tiled image is cheap.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        tiles: Optional[Dict[Tuple[int, int], Tile]] = None,
+        tile_size: int = TILE_SIZE,
+    ):
+        self._width = width
+        self._height = height
+        self.tile_size = tile_size
+        # Tiles by (column, row)
+        self._tiles: Dict[Tuple[int, int], Tile] = {} if tiles is None else tiles
+        # Changes whenever pixels change
+        self.pixels_key = new_pixels_key()
+        # Coverage of tiles already scanned, by (column, row)
+        self._tile_coverages: Dict[Tuple[int, int], Optional[TileCoverage]] = {}
+        # (pixels key, alpha bounds, is opaque) of the last coverage computed for the whole image
+        self._coverage: Optional[Tuple[int, QRect, bool]] = None
+        # (pixels key, region covered by fully opaque tiles) last computed
+        self._opaque_region: Optional[Tuple[int, QRegion]] = None
+
+    @staticmethod
+    def from_qimage(image: QImage, tile_size: int = TILE_SIZE) -> "TiledImage":
+        if image.format() != QImage.Format.Format_ARGB32_Premultiplied:
+            image = image.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+
+        tiled_image = TiledImage(image.width(), image.height(), tile_size=tile_size)
+        if image.isNull():
+            return tiled_image
+
+        import numpy as np
+
+        from .image_buffer import argb32_premultiplied_view
+
+        # One 32-bit value per pixel, so that tiles can be compared against a single pixel
+        pixels = argb32_premultiplied_view(image).view(np.uint32)[..., 0]
+
+        for row, y in enumerate(range(0, image.height(), tile_size)):
+            for column, x in enumerate(range(0, image.width(), tile_size)):
+                tile_pixels = pixels[y : y + tile_size, x : x + tile_size]
+                first_pixel = tile_pixels[0, 0]
+                if not (tile_pixels == first_pixel).all():
+                    # NOTE: copy, so that the tile does not keep the whole image alive
+                    tiled_image._tiles[column, row] = image.copy(
+                        QRect(x, y, tile_pixels.shape[1], tile_pixels.shape[0])
+                    )
+                elif first_pixel != 0:
+                    tiled_image._tiles[column, row] = image.pixelColor(x, y)
+
+        return tiled_image
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def size(self):
+        return QSize(self._width, self._height)
+
+    def rect(self):
+        return QRect(0, 0, self._width, self._height)
+
+    def copy(self) -> "TiledImage":
+        """Copy sharing tile pixels (which are copied on write by Qt)"""
+        tiled_image = TiledImage(
+            self._width, self._height, dict(self._tiles), self.tile_size
+        )
+        tiled_image.pixels_key = self.pixels_key
+        tiled_image._tile_coverages = dict(self._tile_coverages)
+        tiled_image._coverage = self._coverage
+        tiled_image._opaque_region = self._opaque_region
+        return tiled_image
+
+    def tile_rect(self, column: int, row: int) -> QRect:
+        x = column * self.tile_size
+        y = row * self.tile_size
+        return QRect(
+            x,
+            y,
+            min(self.tile_size, self._width - x),
+            min(self.tile_size, self._height - y),
+        )
+
+    def get_tile(self, column: int, row: int) -> Optional[Tile]:
+        """Tile at given position, None if it is fully transparent"""
+        return self._tiles.get((column, row))
+
+    def get_tile_positions(self) -> Set[Tuple[int, int]]:
+        """(column, row) of stored (not fully transparent) tiles"""
+        return set(self._tiles)
+
+    def set_tile(self, column: int, row: int, tile: Optional[Tile]):
+        """Replace the tile at given position, None makes it fully transparent"""
+        if tile is None:
+            self._tiles.pop((column, row), None)
+        else:
+            self._tiles[column, row] = tile
+        self._tile_coverages.pop((column, row), None)
+        self.pixels_key = new_pixels_key()
+
+    def resize(self, width: int, height: int):
+        """Change image bounds, tiles out of the new bounds are dropped"""
+        self._width = width
+        self._height = height
+        num_columns = -(-width // self.tile_size)
+        num_rows = -(-height // self.tile_size)
+        for column, row in list(self._tiles):
+            if column >= num_columns or row >= num_rows:
+                del self._tiles[column, row]
+        # Rects of edge tiles change too
+        self._tile_coverages.clear()
+        self.pixels_key = new_pixels_key()
+
+    def iter_tiles(
+        self, rect: Optional[QRectF] = None
+    ) -> Iterator[Tuple[QRect, Union[QImage, QColor]]]:
+        """
+        Stored (not fully transparent) tiles with their rect, only those intersecting `rect` if given,
+        spilled tiles are read back but stay spilled
+        """
+        for tile_rect, tile in self._iter_stored_tiles(rect):
+            if isinstance(tile, SpilledTile):
+                tile = tile.load()
+            yield tile_rect, tile
+
+    def _iter_stored_tiles(
+        self, rect: Optional[QRectF]
+    ) -> Iterator[Tuple[QRect, Tile]]:
+        if rect is None:
+            for (column, row), tile in self._tiles.items():
+                yield self.tile_rect(column, row), tile
+            return
+
+        rect = rect.intersected(QRectF(self.rect()))
+        if rect.isEmpty():
+            return
+
+        first_column = int(rect.left()) // self.tile_size
+        last_column = int(rect.right()) // self.tile_size
+        first_row = int(rect.top()) // self.tile_size
+        last_row = int(rect.bottom()) // self.tile_size
+
+        # Look up only tiles in the rect, or iterate over stored tiles if there are fewer of them
+        num_tiles_in_rect = (last_column - first_column + 1) * (
+            last_row - first_row + 1
+        )
+        if num_tiles_in_rect <= len(self._tiles):
+            for row in range(first_row, last_row + 1):
+                for column in range(first_column, last_column + 1):
+                    tile = self._tiles.get((column, row))
+                    if tile is not None:
+                        yield self.tile_rect(column, row), tile
+        else:
+            for (column, row), tile in self._tiles.items():
+                if (
+                    first_column <= column <= last_column
+                    and first_row <= row <= last_row
+                ):
+                    yield self.tile_rect(column, row), tile
+
+    def get_tile_coverage(self, column: int, row: int) -> Optional[TileCoverage]:
+        """
+        Bounds of pixels that are not fully transparent in a tile and whether it is fully opaque,
+        None if the tile is fully transparent. Tiles are scanned once, until they are replaced.
+        """
+        tile = self._tiles.get((column, row))
+        if tile is None:
+            return None
+
+        position = (column, row)
+        if position not in self._tile_coverages:
+            if isinstance(tile, SpilledTile):
+                tile = tile.load()
+            self._tile_coverages[position] = _compute_tile_coverage(
+                self.tile_rect(column, row), tile
+            )
+        return self._tile_coverages[position]
+
+    def _get_coverage(self) -> Tuple[QRect, bool]:
+        if self._coverage is None or self._coverage[0] != self.pixels_key:
+            alpha_bounds = QRect()
+            num_opaque_tiles = 0
+            for column, row in self._tiles:
+                coverage = self.get_tile_coverage(column, row)
+                if coverage is not None:
+                    alpha_bounds = alpha_bounds.united(coverage.bounds)
+                    num_opaque_tiles += coverage.is_opaque
+
+            num_tiles = -(-self._width // self.tile_size) * -(
+                -self._height // self.tile_size
+            )
+            is_opaque = num_tiles > 0 and num_opaque_tiles == num_tiles
+            self._coverage = (self.pixels_key, alpha_bounds, is_opaque)
+
+        return self._coverage[1], self._coverage[2]
+
+    def get_alpha_bounds(self) -> QRect:
+        """Tight bounds of pixels that are not fully transparent, an empty rect if the image is fully transparent"""
+        return self._get_coverage()[0]
+
+    def is_opaque(self) -> bool:
+        """Whether every pixel of the image is fully opaque"""
+        return self._get_coverage()[1]
+
+    def get_opaque_region(self) -> QRegion:
+        """
+        Region covered by fully opaque tiles.
+        NOTE: opaque pixels of tiles that are not fully opaque are left out, so that tiles are scanned only once.
+        """
+        if self._opaque_region is None or self._opaque_region[0] != self.pixels_key:
+            opaque_columns_by_row: Dict[int, List[int]] = {}
+            for column, row in self._tiles:
+                coverage = self.get_tile_coverage(column, row)
+                if coverage is not None and coverage.is_opaque:
+                    opaque_columns_by_row.setdefault(row, []).append(column)
+
+            # Merge runs of adjacent tiles, so that the region is made of few rects
+            region = QRegion()
+            for row, columns in opaque_columns_by_row.items():
+                columns.sort()
+                first_column = columns[0]
+                for column, next_column in zip(columns, columns[1:] + [None]):
+                    if next_column != column + 1:
+                        region = region.united(
+                            QRegion(
+                                self.tile_rect(first_column, row).united(
+                                    self.tile_rect(column, row)
+                                )
+                            )
+                        )
+                        first_column = next_column
+
+            self._opaque_region = (self.pixels_key, region)
+
+        return self._opaque_region[1]
+
+    def get_num_tiles(self):
+        return len(self._tiles)
+
+    def size_in_bytes(self):
+        """Memory used by tile pixels, spilled tiles excluded"""
+        return sum(
+            tile.sizeInBytes()
+            for tile in self._tiles.values()
+            if isinstance(tile, QImage)
+        )
+
+    def get_resident_tile_sizes(self) -> Dict[int, int]:
+        """Sizes of tile pixels in memory by QImage.cacheKey, which is the same for tiles shared with copies"""
+        return {
+            tile.cacheKey(): tile.sizeInBytes()
+            for tile in self._tiles.values()
+            if isinstance(tile, QImage)
+        }
+
+    def is_spilled(self):
+        return any(isinstance(tile, SpilledTile) for tile in self._tiles.values())
+
+    def spill(self, scratch_file):
+        """Move tile pixels out of memory into a scratch file (see pixels_memory.TileScratchFile)"""
+        for position, tile in self._tiles.items():
+            if isinstance(tile, QImage):
+                self._tiles[position] = scratch_file.write(tile)
+
+    def restore(self):
+        """Read spilled tile pixels back into memory"""
+        for position, tile in self._tiles.items():
+            if isinstance(tile, SpilledTile):
+                self._tiles[position] = tile.load()
+
+    def paint(
+        self,
+        painter: QPainter,
+        exposed_rect: Optional[QRectF] = None,
+        hidden_region: Optional[QRegion] = None,
+    ) -> int:
+        """
+        Paint tiles at (0, 0), only those intersecting `exposed_rect` if given.
+        Only the bounds of pixels that are not fully transparent are painted, so that transparent padding is not blended.
+
+        Tiles inside `hidden_region` (in device coordinates, see occlusion.OcclusionCuller) are not painted
+        (nor read back if spilled), returns their area in device pixels.
+        """
+        exposed_pixels = None if exposed_rect is None else exposed_rect.toAlignedRect()
+        transform = painter.worldTransform()
+        if hidden_region is not None and (
+            hidden_region.isEmpty() or not is_axis_aligned(transform)
+        ):
+            hidden_region = None
+
+        num_skipped_pixels = 0
+        for tile_rect, tile in self._iter_stored_tiles(exposed_rect):
+            if isinstance(tile, QColor):
+                bounds = tile_rect
+            else:
+                coverage = self.get_tile_coverage(
+                    tile_rect.x() // self.tile_size, tile_rect.y() // self.tile_size
+                )
+                if coverage is None:
+                    continue
+                if exposed_pixels is not None and not coverage.bounds.intersects(
+                    exposed_pixels
+                ):
+                    continue
+                bounds = coverage.bounds
+
+            if hidden_region is not None:
+                device_rect = get_device_rect(transform, QRectF(bounds))
+                if is_device_rect_hidden(hidden_region, device_rect, transform):
+                    num_skipped_pixels += device_rect.width() * device_rect.height()
+                    continue
+
+            if isinstance(tile, QColor):
+                painter.fillRect(tile_rect, tile)
+                continue
+
+            if isinstance(tile, SpilledTile):
+                tile = tile.load()
+            painter.drawImage(
+                bounds.topLeft(), tile, bounds.translated(-tile_rect.topLeft())
+            )
+
+        return num_skipped_pixels
+
+    def to_qimage(self, rect: Optional[QRect] = None) -> QImage:
+        """
+        Assemble tiles into a single image, only the part of the image in `rect` if given (e.g. its alpha bounds),
+        NOTE: allocates memory for the whole image bounds (or rect)
+        """
+        rect = self.rect() if rect is None else rect.intersected(self.rect())
+        image = QImage(rect.size(), QImage.Format.Format_ARGB32_Premultiplied)
+        if image.isNull():
+            return image
+        # Tiles cover every pixel of opaque images
+        if not self.is_opaque():
+            image.fill(Qt.GlobalColor.transparent)
+
+        painter = QPainter(image)
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+        painter.translate(-rect.x(), -rect.y())
+        self.paint(painter, QRectF(rect))
+        painter.end()
+        return image
+
+    def render_scaled(self, size: QSize, rect: Optional[QRect] = None) -> QImage:
+        """
+        Render the image (or only its part in `rect`) scaled to fit in `size` keeping aspect ratio,
+        without assembling it at full size
+        """
+        rect = self.rect() if rect is None else rect.intersected(self.rect())
+        scaled_size = rect.size().scaled(size, Qt.AspectRatioMode.KeepAspectRatio)
+        image = QImage(scaled_size, QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(Qt.GlobalColor.transparent)
+        if image.isNull() or rect.isEmpty():
+            return image
+
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, True)
+        painter.scale(
+            scaled_size.width() / rect.width(), scaled_size.height() / rect.height()
+        )
+        painter.translate(-rect.x(), -rect.y())
+        for tile_rect, tile in self.iter_tiles(QRectF(rect)):
+            if isinstance(tile, QImage):
+                painter.drawImage(QRectF(tile_rect), tile)
+            else:
+                painter.fillRect(QRectF(tile_rect), tile)
+        painter.end()
+        return image
@@ -6,6 +6,7 @@ from PyQt6.QtWidgets import QToolBar, QVBoxLayout, QWidget
 
 from ..model_view.tree_model import TreeModel
 from ..model_view.tree_view import TreeView
+from ..model_view.undo import DeleteItemsCommand, DuplicateItemsCommand
 
 
 class LayersWidget(QWidget):
@@ -27,11 +28,30 @@ class LayersWidget(QWidget):
             ).as_posix()
         )
         self.toolbar.addAction(icon, "Delete", self.delete_selected_items)
+
+        icon = QIcon(
+            (
+                PurePath(__file__).parent.parent
+                / "icons"
+                / "layers"
+                / "duplicate_layer_btn.svg"
+            ).as_posix()
+        )
+        self.toolbar.addAction(icon, "Duplicate", self.duplicate_selected_items)
         self.setLayout(layout)
 
     def delete_selected_items(self):
-        self._model.beginResetModel()
         scene = self._model.scene()
-        for item in scene.selectedItems():
-            scene.removeItem(item)
-        self._model.endResetModel()
+        selected_items = scene.selectedItems()
+        if len(selected_items) == 0:
+            return
+
+        scene.get_undo_stack().push(DeleteItemsCommand(self._model, selected_items))
+
+    def duplicate_selected_items(self):
+        scene = self._model.scene()
+        selected_items = scene.selectedItems()
+        if len(selected_items) == 0:
+            return
+
+        scene.get_undo_stack().push(DuplicateItemsCommand(self._model, selected_items))
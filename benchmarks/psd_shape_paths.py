@@ -0,0 +1,151 @@
+"""
+Benchmark conversion of dense PSD vector paths (e.g. maps, logos) into a QPainterPath.
+
+Run from the root of the repository:
+`python -m benchmarks.psd_shape_paths`
+"""
+import math
+import random
+import time
+from types import SimpleNamespace
+
+from psd_tools.psd.vector import ClosedPath, Knot, OpenPath
+from PyQt6.QtGui import QPainterPath
+
+from awesome_image_editor.psd_read.shape import psd_shape_layer_to_shape_item
+
+PSD_WIDTH = 4096
+PSD_HEIGHT = 4096
+NUM_SUBPATHS = 200
+NUM_KNOTS_PER_SUBPATH = 250
+NUM_REPEATS = 5
+
+
+def create_dense_shape_layer():
+    """A fake shape layer, with the attributes used by psd_shape_layer_to_shape_item"""
+    rng = random.Random(0)
+    paths = []
+
+    for i in range(NUM_SUBPATHS):
+        center_y, center_x = rng.random(), rng.random()
+        radius = rng.uniform(0.01, 0.1)
+        knots = []
+
+        for k in range(NUM_KNOTS_PER_SUBPATH):
+            angle = 2 * math.pi * k / NUM_KNOTS_PER_SUBPATH
+            anchor = (
+                center_y + radius * math.sin(angle),
+                center_x + radius * math.cos(angle),
+            )
+            tangent = (0.01 * math.cos(angle), -0.01 * math.sin(angle))
+            knots.append(
+                Knot(
+                    preceding=(anchor[0] - tangent[0], anchor[1] - tangent[1]),
+                    anchor=anchor,
+                    leaving=(anchor[0] + tangent[0], anchor[1] + tangent[1]),
+                )
+            )
+
+        path_type = ClosedPath if i % 2 == 0 else OpenPath
+        paths.append(path_type(items=knots))
+
+    return SimpleNamespace(
+        name="Dense shape",
+        visible=True,
+        offset=(0, 0),
+        vector_mask=SimpleNamespace(paths=paths),
+    )
+
+
+def _reference_connect_knots_cubic(
+    qpath: QPainterPath, k1: Knot, k2: Knot, psd_width: int, psd_height: int
+):
+    start_y, start_x = k1.anchor
+    start_x *= psd_width
+    start_y *= psd_height
+
+    end_y, end_x = k2.anchor
+    end_x *= psd_width
+    end_y *= psd_height
+
+    control_point_1_y, control_point_1_x = k1.leaving
+    control_point_1_x *= psd_width
+    control_point_1_y *= psd_height
+
+    control_point_2_y, control_point_2_x = k2.preceding
+    control_point_2_x *= psd_width
+    control_point_2_y *= psd_height
+
+    qpath.cubicTo(
+        control_point_1_x,
+        control_point_1_y,
+        control_point_2_x,
+        control_point_2_y,
+        end_x,
+        end_y,
+    )
+
+
+def reference_shape_layer_to_qpath(layer, psd_width: int, psd_height: int):
+    """Scalar per-knot conversion with a path per subpath, as previously done in psd_shape_layer_to_shape_item"""
+    main_qpath = QPainterPath()
+
+    for subpath in layer.vector_mask.paths:
+        num_knots = len(subpath)
+        if num_knots == 0:
+            continue
+
+        qpath = QPainterPath()
+        qpath.moveTo(
+            subpath[0].anchor[1] * psd_width, subpath[0].anchor[0] * psd_height
+        )
+
+        for i in range(num_knots - 1):
+            _reference_connect_knots_cubic(
+                qpath, subpath[i], subpath[i + 1], psd_width, psd_height
+            )
+
+        if subpath.is_closed():
+            _reference_connect_knots_cubic(
+                qpath, subpath[-1], subpath[0], psd_width, psd_height
+            )
+
+        main_qpath.addPath(qpath)
+
+    return main_qpath
+
+
+def best_time(function):
+    times = []
+    for _ in range(NUM_REPEATS):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    layer = create_dense_shape_layer()
+    num_knots = NUM_SUBPATHS * NUM_KNOTS_PER_SUBPATH
+
+    reference_time, reference_path = best_time(
+        lambda: reference_shape_layer_to_qpath(layer, PSD_WIDTH, PSD_HEIGHT)
+    )
+    current_time, item = best_time(
+        lambda: psd_shape_layer_to_shape_item(layer, PSD_WIDTH, PSD_HEIGHT)
+    )
+
+    assert item.path.elementCount() == reference_path.elementCount()
+    for i in range(reference_path.elementCount()):
+        expected, actual = reference_path.elementAt(i), item.path.elementAt(i)
+        assert expected.type == actual.type
+        assert math.isclose(expected.x, actual.x) and math.isclose(expected.y, actual.y)
+
+    print(f"{num_knots} knots in {NUM_SUBPATHS} subpaths")
+    print(f"reference (scalar):  {reference_time * 1000:8.2f} ms")
+    print(f"current (vectorized): {current_time * 1000:8.2f} ms")
+    print(f"speedup: {reference_time / current_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
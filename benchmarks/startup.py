@@ -0,0 +1,130 @@
+"""
+Benchmark application startup: import time of the main window module and time until the first frame is painted,
+fails (exit code 1) if startup is over budget or if optional heavy modules were imported at startup.
+
+Run from the root of the repository:
+`python -m benchmarks.startup`
+"""
+import os
+import re
+import subprocess
+import sys
+
+# Budgets in seconds, generous enough to absorb noise on a loaded machine
+IMPORT_TIME_BUDGET = 0.35
+FIRST_PAINT_TIME_BUDGET = 1.0
+NUM_REPEATS = 5
+
+# Modules that must only be imported once their feature is used (e.g. opening a PSD)
+DEFERRED_MODULES = (
+    "numpy",
+    "psd_tools",
+    "PIL",
+    "awesome_image_editor.export",
+    "awesome_image_editor.filters",
+    "awesome_image_editor.psd_read",
+)
+
+# Run in a fresh interpreter each time, so that nothing is already imported
+FIRST_PAINT_SCRIPT = """
+import sys
+import time
+
+start = time.perf_counter()
+
+from PyQt6.QtCore import QTimer
+
+from awesome_image_editor.app import Application
+from awesome_image_editor.mainwindow import MainWindow
+
+app = Application(sys.argv)
+main_window = MainWindow()
+
+
+def on_first_frame_painted():
+    print(time.perf_counter() - start)
+    print(",".join(sys.modules))
+    app.quit()
+
+
+# NOTE: measured before the deferred UI is built, it is connected first and imports features (e.g. filters)
+main_window.firstFramePainted.disconnect(main_window.setup_deferred_ui)
+main_window.firstFramePainted.connect(on_first_frame_painted)
+# Do not hang if the window is never painted
+QTimer.singleShot(30_000, lambda: app.exit(1))
+sys.exit(app.exec())
+"""
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s*(\d+) \|\s*(\d+) \|\s*(\S+)")
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    return subprocess.run(
+        [sys.executable, *args], env=env, capture_output=True, text=True, check=True
+    )
+
+
+def measure_import_time():
+    """Cumulative import time of the main window module and the slowest modules it imports, in seconds"""
+    result = run_python(
+        "-X", "importtime", "-c", "import awesome_image_editor.mainwindow"
+    )
+
+    total_time = 0.0
+    module_times = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match is None:
+            continue
+        cumulative_time = int(match.group(2)) / 1e6
+        module_name = match.group(3)
+        module_times.append((cumulative_time, module_name))
+        if module_name == "awesome_image_editor.mainwindow":
+            total_time = cumulative_time
+
+    module_times.sort(reverse=True)
+    return total_time, module_times[:10]
+
+
+def measure_first_paint_time():
+    """Time from interpreter start of imports to first painted frame in seconds, and modules imported by then"""
+    result = run_python("-c", FIRST_PAINT_SCRIPT)
+    lines = result.stdout.splitlines()
+    return float(lines[0]), lines[1].split(",")
+
+
+def main():
+    import_time, slowest_imports = min(
+        (measure_import_time() for _ in range(NUM_REPEATS)), key=lambda r: r[0]
+    )
+    first_paint_time, imported_modules = min(
+        (measure_first_paint_time() for _ in range(NUM_REPEATS)), key=lambda r: r[0]
+    )
+
+    print("slowest imports (cumulative):")
+    for cumulative_time, module_name in slowest_imports:
+        print(f"  {cumulative_time * 1000:8.2f} ms  {module_name}")
+    print(
+        f"import time:      {import_time * 1000:8.2f} ms (budget {IMPORT_TIME_BUDGET * 1000:.0f} ms)"
+    )
+    print(
+        f"first paint time: {first_paint_time * 1000:8.2f} ms (budget {FIRST_PAINT_TIME_BUDGET * 1000:.0f} ms)"
+    )
+
+    errors = []
+    if import_time > IMPORT_TIME_BUDGET:
+        errors.append("import time over budget")
+    if first_paint_time > FIRST_PAINT_TIME_BUDGET:
+        errors.append("first paint time over budget")
+    for module_name in DEFERRED_MODULES:
+        if module_name in imported_modules:
+            errors.append(f"{module_name} imported at startup")
+
+    for error in errors:
+        print(f"FAILED: {error}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
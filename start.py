@@ -1,3 +1,5 @@
 from awesome_image_editor import __main__
 
-__main__.main()
+# NOTE: guarded, as PSD decoding worker processes ("spawn" start method) import the main script again
+if __name__ == "__main__":
+    __main__.main()
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# NOTE: set before Qt is imported, so that tests run without a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication
+
+
+@pytest.fixture(scope="session", autouse=True)
+def app():
+    """Projects create widgets (views, layers panel), which need an application"""
+    application = QApplication.instance() or QApplication(sys.argv)
+    yield application
@@ -0,0 +1,90 @@
+from PyQt6.QtCore import QSize
+from PyQt6.QtGui import QColor, QImage
+
+from awesome_image_editor.export import presets
+from awesome_image_editor.export.presets import (
+    ExportOutput,
+    get_export_output_size,
+    iter_downscale_cascade,
+)
+
+
+def make_checkerboard(width: int, height: int) -> QImage:
+    """Alternating black and white pixels, which average to mid gray"""
+    image = QImage(width, height, QImage.Format.Format_ARGB32_Premultiplied)
+    for y in range(height):
+        for x in range(width):
+            image.setPixelColor(
+                x, y, QColor(255, 255, 255) if (x + y) % 2 else QColor(0, 0, 0)
+            )
+    return image
+
+
+def test_cascade_yields_each_size_once_largest_first():
+    image = make_checkerboard(64, 32)
+    sizes = [QSize(8, 4), QSize(32, 16), QSize(20, 10), QSize(32, 16)]
+
+    outputs = list(iter_downscale_cascade(image, sizes))
+
+    assert [size for size, _ in outputs] == [QSize(32, 16), QSize(20, 10), QSize(8, 4)]
+    for size, output_image in outputs:
+        assert output_image.size() == size
+
+
+def test_cascade_shares_halved_levels(monkeypatch):
+    halved_sizes = []
+    halve = presets._halve
+
+    def recording_halve(image: QImage) -> QImage:
+        halved_sizes.append(image.size())
+        return halve(image)
+
+    monkeypatch.setattr(presets, "_halve", recording_halve)
+    image = QImage(1000, 500, QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(QColor(255, 0, 0))
+
+    list(
+        iter_downscale_cascade(
+            image, [QSize(250, 125), QSize(100, 50), QSize(500, 250)]
+        )
+    )
+
+    assert halved_sizes == [QSize(1000, 500), QSize(500, 250), QSize(250, 125)]
+
+
+def test_cascade_averages_pixels_when_shrinking_a_lot():
+    image = make_checkerboard(64, 64)
+
+    [(_, output_image)] = iter_downscale_cascade(image, [QSize(8, 8)])
+
+    for y in range(8):
+        for x in range(8):
+            assert abs(output_image.pixelColor(x, y).red() - 128) <= 8
+
+
+def test_cascade_scales_up_sizes_larger_than_image():
+    image = make_checkerboard(16, 16)
+
+    outputs = list(iter_downscale_cascade(image, [QSize(32, 32), QSize(16, 16)]))
+
+    assert [output_image.size() for _, output_image in outputs] == [
+        QSize(32, 32),
+        QSize(16, 16),
+    ]
+    # Same size as the image, not scaled
+    assert outputs[1][1] == image
+
+
+def test_output_size_fits_max_size_without_upscaling():
+    thumbnail = ExportOutput("_thumbnail", "png", max_size=QSize(256, 256))
+
+    assert get_export_output_size(thumbnail, QSize(1000, 500)) == QSize(256, 128)
+    assert get_export_output_size(thumbnail, QSize(100, 50)) == QSize(100, 50)
+
+
+def test_output_size_scales_document_size():
+    output = ExportOutput("@2x", "png", scale=2.0)
+    tiny_output = ExportOutput("_tiny", "png", scale=0.001)
+
+    assert get_export_output_size(output, QSize(101, 51)) == QSize(202, 102)
+    assert get_export_output_size(tiny_output, QSize(100, 50)) == QSize(1, 1)
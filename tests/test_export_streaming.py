@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from PIL import Image
+from PyQt6.QtCore import QPointF
+from PyQt6.QtGui import QColor, QImage, QLinearGradient, QPainter
+
+from awesome_image_editor.export.streaming import export_streaming
+from awesome_image_editor.file_format import AIEProject
+
+
+def make_image(width: int, height: int, hue: int, alpha: int) -> QImage:
+    image = QImage(width, height, QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(QColor(0, 0, 0, 0))
+    gradient = QLinearGradient(QPointF(0, 0), QPointF(width, height))
+    gradient.setColorAt(0, QColor.fromHsv(hue, 255, 255, alpha))
+    gradient.setColorAt(1, QColor.fromHsv((hue + 180) % 360, 255, 128, alpha // 2))
+    painter = QPainter(image)
+    # Leave a transparent border, so that fully transparent pixels are exported too
+    painter.fillRect(image.rect().adjusted(4, 4, -4, -4), gradient)
+    painter.end()
+    return image
+
+
+@pytest.fixture
+def project():
+    project = AIEProject()
+    project.add_image_layer(make_image(150, 70, 0, 255), "back")
+    front_item = project.add_image_layer(make_image(60, 90, 200, 160), "front")
+    front_item.setPos(110, 30)
+    return project
+
+
+def to_rgba_array(image: QImage) -> np.ndarray:
+    image = image.convertToFormat(QImage.Format.Format_RGBA8888)
+    rows = np.frombuffer(image.constBits().asstring(image.sizeInBytes()), np.uint8)
+    return rows.reshape(image.height(), image.bytesPerLine())[
+        :, : image.width() * 4
+    ].reshape(image.height(), image.width(), 4)
+
+
+def assert_same_pixels(exported: np.ndarray, expected: np.ndarray):
+    assert exported.shape == expected.shape
+    assert np.array_equal(exported[..., 3], expected[..., 3])
+    # Colors are unpremultiplied by the writers, rounding may differ by one
+    is_visible = expected[..., 3] > 0
+    difference = np.abs(exported.astype(np.int16) - expected.astype(np.int16))
+    assert difference[is_visible].max() <= 1
+
+
+@pytest.mark.parametrize("extension", ["png", "tif"])
+def test_streamed_export_matches_render(project, tmp_path, extension):
+    expected = to_rgba_array(project.render())
+    filepath = tmp_path / f"out.{extension}"
+
+    # Small bands, so that the image is made of several of them, the last one shorter
+    export_streaming(project, str(filepath), band_height=16, max_workers=2)
+
+    with Image.open(filepath) as image:
+        assert image.mode == "RGBA"
+        exported = np.asarray(image)
+    assert_same_pixels(exported, expected)
+
+
+def test_streamed_png_export_is_read_by_qt(project, tmp_path):
+    expected = to_rgba_array(project.render())
+    filepath = tmp_path / "out.png"
+
+    export_streaming(project, str(filepath), band_height=16, max_workers=2)
+
+    image = QImage(str(filepath))
+    assert not image.isNull()
+    assert_same_pixels(to_rgba_array(image), expected)
+
+
+def test_scaled_streamed_export_matches_scaled_render_size(project, tmp_path):
+    expected_image = project.render(0.5)
+    filepath = tmp_path / "out.png"
+
+    export_streaming(project, str(filepath), scale=0.5, band_height=16)
+
+    with Image.open(filepath) as image:
+        assert image.size == (expected_image.width(), expected_image.height())
@@ -0,0 +1,135 @@
+from io import BytesIO
+
+from PyQt6.QtCore import QPointF, Qt
+from PyQt6.QtGui import QColor, QImage, QLinearGradient, QPainter
+
+from awesome_image_editor.binary_io.read import read_pascal_string, read_uint32_le
+from awesome_image_editor.file_format import (
+    LAYER_TREE_CHUNK_TYPE,
+    LAYER_TREE_FORMAT_VERSION,
+    MAGIC_BYTES,
+    AIEProject,
+)
+from awesome_image_editor.filters.adjustments import (
+    AdjustmentsFilter,
+    CurvesAdjustment,
+    LevelsAdjustment,
+)
+from awesome_image_editor.filters.gaussian_blur import GaussianBlurFilter
+from awesome_image_editor.model_view.items.group import AIEGroupItem
+from awesome_image_editor.model_view.items.image import AIEImageItem
+from awesome_image_editor.pixels_memory import TileScratchFile
+from awesome_image_editor.tiled_image import TILE_SIZE, TiledImage
+
+FILTERS = (
+    GaussianBlurFilter(4.0),
+    AdjustmentsFilter(
+        (
+            LevelsAdjustment(10.0, 240.0, 1.5, 0.0, 255.0),
+            CurvesAdjustment(((0, 0), (128, 140.0), (255, 255))),
+        )
+    ),
+)
+
+
+def make_tiled_image() -> TiledImage:
+    """Image with a gradient tile, uniform tiles and fully transparent tiles"""
+    image = QImage(
+        3 * TILE_SIZE, 2 * TILE_SIZE, QImage.Format.Format_ARGB32_Premultiplied
+    )
+    image.fill(Qt.GlobalColor.transparent)
+    gradient = QLinearGradient(QPointF(0, 0), QPointF(TILE_SIZE, TILE_SIZE))
+    gradient.setColorAt(0, QColor(255, 0, 0))
+    gradient.setColorAt(1, QColor(0, 0, 255, 128))
+    painter = QPainter(image)
+    painter.fillRect(0, 0, TILE_SIZE, TILE_SIZE, gradient)
+    painter.fillRect(TILE_SIZE, 0, 2 * TILE_SIZE, TILE_SIZE, QColor(0, 255, 0, 200))
+    painter.end()
+    return TiledImage.from_qimage(image)
+
+
+def save_and_load(project: AIEProject) -> AIEProject:
+    file = BytesIO()
+    project.serialize(file)
+    file.seek(0)
+    return AIEProject.deserialize(file)
+
+
+def get_layers(project: AIEProject) -> list:
+    scene = project.get_graphics_scene()
+    return [
+        item
+        for item in scene.items(Qt.SortOrder.AscendingOrder)
+        if item.parentItem() is None
+    ]
+
+
+def test_project_is_saved_as_layer_tree_version_3():
+    file = BytesIO()
+    AIEProject().serialize(file)
+    file.seek(0)
+
+    assert file.read(len(MAGIC_BYTES)) == MAGIC_BYTES
+    assert read_pascal_string(file) == LAYER_TREE_CHUNK_TYPE
+    assert read_uint32_le(file) == LAYER_TREE_FORMAT_VERSION == 3
+
+
+def test_image_layer_round_trip():
+    project = AIEProject()
+    tiled_image = make_tiled_image()
+    item = project.add_image_layer(tiled_image, "layer")
+    item.setPos(12.5, -7)
+    item.setVisible(False)
+    item.set_filters(FILTERS)
+
+    [loaded_item] = get_layers(save_and_load(project))
+
+    assert isinstance(loaded_item, AIEImageItem)
+    assert loaded_item.name == "layer"
+    assert loaded_item.pos() == QPointF(12.5, -7)
+    assert not loaded_item.isVisible()
+    assert loaded_item.get_filters() == FILTERS
+    assert loaded_item.tiles.tile_size == TILE_SIZE
+    assert loaded_item.tiles.size() == tiled_image.size()
+    # Fully transparent tiles are not stored
+    assert loaded_item.tiles.get_tile_positions() == {(0, 0), (1, 0), (2, 0)}
+    assert loaded_item.tiles.to_qimage() == tiled_image.to_qimage()
+
+
+def test_group_round_trip_keeps_children_order():
+    project = AIEProject()
+    group_item = AIEGroupItem("group")
+    group_item.setPos(5, 5)
+    for i in range(3):
+        child_item = AIEImageItem(make_tiled_image(), f"child {i}")
+        child_item.setPos(i, 0)
+        child_item.set_filters(FILTERS[: i % 2])
+        child_item.setParentItem(group_item)
+    project.get_graphics_scene().addItem(group_item)
+
+    [loaded_group_item] = get_layers(save_and_load(project))
+
+    assert isinstance(loaded_group_item, AIEGroupItem)
+    assert loaded_group_item.pos() == QPointF(5, 5)
+    loaded_children = loaded_group_item.childItems()
+    assert [item.name for item in loaded_children] == ["child 0", "child 1", "child 2"]
+    assert [item.pos() for item in loaded_children] == [
+        QPointF(0, 0),
+        QPointF(1, 0),
+        QPointF(2, 0),
+    ]
+    assert [item.get_filters() for item in loaded_children] == [(), FILTERS[:1], ()]
+
+
+def test_spilled_pixels_are_saved(tmp_path):
+    project = AIEProject()
+    tiled_image = make_tiled_image()
+    expected_image = tiled_image.to_qimage()
+    project.add_image_layer(tiled_image, "layer")
+    scratch_file = TileScratchFile(str(tmp_path))
+    tiled_image.spill(scratch_file)
+    assert tiled_image.is_spilled()
+
+    [loaded_item] = get_layers(save_and_load(project))
+
+    assert loaded_item.tiles.to_qimage() == expected_image
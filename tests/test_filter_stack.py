@@ -0,0 +1,225 @@
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+from PyQt6.QtCore import QRectF
+from PyQt6.QtGui import QColor, QImage
+
+from awesome_image_editor.filters.adjustments import (
+    AdjustmentsFilter,
+    CurvesAdjustment,
+    LevelsAdjustment,
+)
+from awesome_image_editor.filters.base import IsCancelledCallback
+from awesome_image_editor.filters.stack import (
+    FilterStageCache,
+    map_filter_stack_rect,
+    render_filter_stack,
+)
+
+# Filters applied by render_filter_stack, in order
+applied_filters: List["PadFilter"] = []
+
+
+class PadFilter(NamedTuple):
+    """Grows the image by `padding` pixels on every side, filled with `color`"""
+
+    KIND = b"TEST_PAD"
+
+    padding: int
+    color: int = 0xFFFF0000
+
+    def map_rect(self, rect: QRectF) -> QRectF:
+        return rect.adjusted(-self.padding, -self.padding, self.padding, self.padding)
+
+    def apply(
+        self,
+        image: QImage,
+        scale: float = 1.0,
+        is_cancelled: Optional[IsCancelledCallback] = None,
+        max_workers: Optional[int] = None,
+    ):
+        applied_filters.append(self)
+        output = QImage(
+            image.width() + 2 * self.padding,
+            image.height() + 2 * self.padding,
+            QImage.Format.Format_ARGB32_Premultiplied,
+        )
+        output.fill(QColor.fromRgba(self.color))
+        return output, self.map_rect(QRectF(image.rect()))
+
+
+class SourceLoader:
+    """Opaque gradient image, counting how many times it is loaded"""
+
+    def __init__(self, width: int = 8, height: int = 4):
+        self.width = width
+        self.height = height
+        self.num_loads = 0
+
+    def __call__(self) -> QImage:
+        self.num_loads += 1
+        image = QImage(
+            self.width, self.height, QImage.Format.Format_ARGB32_Premultiplied
+        )
+        for y in range(self.height):
+            for x in range(self.width):
+                image.setPixelColor(
+                    x, y, QColor(x * 255 // self.width, y * 255 // self.height, 128)
+                )
+        return image
+
+
+def get_pixels(image: QImage) -> np.ndarray:
+    image = image.convertToFormat(QImage.Format.Format_ARGB32)
+    return np.array(
+        [
+            [image.pixel(x, y) for x in range(image.width())]
+            for y in range(image.height())
+        ],
+        np.uint32,
+    )
+
+
+LEVELS = LevelsAdjustment(10.0, 240.0, 1.5, 0.0, 255.0)
+CURVES = CurvesAdjustment(((0, 0), (64, 50.0), (128, 140.0), (192, 210.0), (255, 255)))
+
+
+def setup_function():
+    applied_filters.clear()
+
+
+def test_output_rect_matches_mapped_rect():
+    filters = (PadFilter(2), PadFilter(3))
+    image, rect = render_filter_stack(
+        1, SourceLoader(), filters, cache=FilterStageCache()
+    )
+
+    assert rect == map_filter_stack_rect(QRectF(0, 0, 8, 4), filters)
+    assert rect == QRectF(-5, -5, 18, 14)
+    assert image.width() == 18 and image.height() == 14
+
+
+def test_cached_stack_is_not_rendered_again():
+    cache = FilterStageCache()
+    load_source = SourceLoader()
+    filters = (PadFilter(1), PadFilter(2))
+
+    first_output = render_filter_stack(1, load_source, filters, cache=cache)
+    assert applied_filters == list(filters)
+
+    applied_filters.clear()
+    second_output = render_filter_stack(1, load_source, filters, cache=cache)
+    assert applied_filters == []
+    assert load_source.num_loads == 1
+    assert second_output[0] == first_output[0]
+    assert second_output[1] == first_output[1]
+
+
+def test_changed_filter_only_renders_stages_from_it():
+    cache = FilterStageCache()
+    load_source = SourceLoader()
+    render_filter_stack(1, load_source, (PadFilter(1), PadFilter(2)), cache=cache)
+
+    applied_filters.clear()
+    render_filter_stack(1, load_source, (PadFilter(1), PadFilter(5)), cache=cache)
+    assert applied_filters == [PadFilter(5)]
+    assert load_source.num_loads == 1
+
+    applied_filters.clear()
+    render_filter_stack(1, load_source, (PadFilter(4), PadFilter(5)), cache=cache)
+    assert applied_filters == [PadFilter(4), PadFilter(5)]
+    assert load_source.num_loads == 2
+
+
+def test_changed_source_renders_whole_stack():
+    cache = FilterStageCache()
+    load_source = SourceLoader()
+    filters = (PadFilter(1), PadFilter(2))
+    render_filter_stack(1, load_source, filters, cache=cache)
+
+    applied_filters.clear()
+    render_filter_stack(2, load_source, filters, cache=cache)
+    assert applied_filters == list(filters)
+    assert load_source.num_loads == 2
+
+
+def test_cache_evicts_least_recently_used_outputs():
+    image_size = QImage(10, 10, QImage.Format.Format_ARGB32_Premultiplied).sizeInBytes()
+    cache = FilterStageCache(max_size=2 * image_size)
+    outputs = {}
+    for key in "abc":
+        outputs[key] = (
+            QImage(10, 10, QImage.Format.Format_ARGB32_Premultiplied),
+            QRectF(0, 0, 10, 10),
+        )
+
+    cache.put("a", outputs["a"])
+    cache.put("b", outputs["b"])
+    # Mark "a" as recently used, so that "b" is evicted first
+    assert cache.get("a") is not None
+    cache.put("c", outputs["c"])
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.get_size() == 2 * image_size
+
+
+def test_output_larger_than_cache_is_not_kept():
+    cache = FilterStageCache(max_size=16)
+    cache.put(
+        "a", (QImage(10, 10, QImage.Format.Format_ARGB32_Premultiplied), QRectF())
+    )
+
+    assert cache.get("a") is None
+    assert cache.get_size() == 0
+
+
+def record_adjustments_stages(monkeypatch) -> list:
+    """Adjustments of every adjustments filter stage rendered from now on"""
+    stages = []
+    apply = AdjustmentsFilter.apply
+
+    def recording_apply(self, image, *args, **kwargs):
+        stages.append(self.adjustments)
+        return apply(self, image, *args, **kwargs)
+
+    monkeypatch.setattr(AdjustmentsFilter, "apply", recording_apply)
+    return stages
+
+
+def test_consecutive_adjustments_render_as_one_stage(monkeypatch):
+    stages = record_adjustments_stages(monkeypatch)
+    cache = FilterStageCache()
+    filters = (AdjustmentsFilter((LEVELS,)), AdjustmentsFilter((CURVES,)))
+
+    render_filter_stack(1, SourceLoader(), filters, cache=cache)
+
+    assert stages == [(LEVELS, CURVES)]
+    # Only the output of the merged stage is cached
+    assert cache.get(cache.key(1, filters[:1])) is None
+    assert cache.get(cache.key(1, filters)) is not None
+
+
+def test_adjustments_separated_by_filter_are_not_merged(monkeypatch):
+    stages = record_adjustments_stages(monkeypatch)
+    filters = (AdjustmentsFilter((LEVELS,)), PadFilter(1), AdjustmentsFilter((CURVES,)))
+
+    render_filter_stack(1, SourceLoader(), filters, cache=FilterStageCache())
+
+    assert stages == [(LEVELS,), (CURVES,)]
+
+
+def test_merged_adjustments_match_adjustments_applied_in_sequence():
+    load_source = SourceLoader(64, 32)
+    filters = (AdjustmentsFilter((LEVELS,)), AdjustmentsFilter((CURVES,)))
+
+    merged_image, merged_rect = render_filter_stack(
+        1, load_source, filters, cache=FilterStageCache()
+    )
+
+    image = load_source()
+    for layer_filter in filters:
+        image, _ = layer_filter.apply(image)
+    assert merged_rect == QRectF(0, 0, 64, 32)
+    assert np.array_equal(get_pixels(merged_image), get_pixels(image))
@@ -0,0 +1,147 @@
+import gc
+
+import pytest
+from PyQt6.QtCore import QPointF
+from PyQt6.QtGui import QColor, QImage, QLinearGradient, QPainter
+
+from awesome_image_editor.pixels_memory import PixelsMemoryBudget, TileScratchFile
+from awesome_image_editor.tiled_image import TiledImage
+
+TILE_SIZE = 32
+# Size of a 64x64 image made of 4 non-uniform tiles
+IMAGE_SIZE = 64 * 64 * 4
+
+
+def make_tiled_image(hue: int) -> TiledImage:
+    image = QImage(64, 64, QImage.Format.Format_ARGB32_Premultiplied)
+    gradient = QLinearGradient(QPointF(0, 0), QPointF(64, 64))
+    gradient.setColorAt(0, QColor.fromHsv(hue, 255, 255))
+    gradient.setColorAt(1, QColor.fromHsv((hue + 180) % 360, 255, 128))
+    painter = QPainter(image)
+    painter.fillRect(image.rect(), gradient)
+    painter.end()
+    return TiledImage.from_qimage(image, tile_size=TILE_SIZE)
+
+
+@pytest.fixture
+def budget(tmp_path):
+    return PixelsMemoryBudget(2 * IMAGE_SIZE, lambda: TileScratchFile(str(tmp_path)))
+
+
+def test_least_recently_used_image_is_spilled_past_budget(budget):
+    images = [make_tiled_image(hue) for hue in (0, 120, 240)]
+    for tiled_image in images:
+        budget.use(tiled_image)
+
+    stats = budget.get_stats()
+    assert [tiled_image.is_spilled() for tiled_image in images] == [True, False, False]
+    assert stats.resident_size == 2 * IMAGE_SIZE
+    assert stats.spilled_size == IMAGE_SIZE
+    assert stats.num_images == 3
+    assert stats.num_spilled_images == 1
+
+
+def test_spilled_image_is_restored_when_used(budget):
+    images = [make_tiled_image(hue) for hue in (0, 120, 240)]
+    expected_image = images[0].to_qimage()
+    for tiled_image in images:
+        budget.use(tiled_image)
+
+    budget.use(images[0])
+
+    assert not images[0].is_spilled()
+    assert images[0].to_qimage() == expected_image
+    # The next least recently used image makes room for it
+    assert images[1].is_spilled()
+    assert budget.get_stats().resident_size == 2 * IMAGE_SIZE
+
+
+def test_image_in_use_is_kept_even_over_budget(tmp_path):
+    budget = PixelsMemoryBudget(IMAGE_SIZE // 2, lambda: TileScratchFile(str(tmp_path)))
+    tiled_image = make_tiled_image(0)
+
+    budget.use(tiled_image)
+
+    assert not tiled_image.is_spilled()
+    assert budget.get_stats().resident_size == IMAGE_SIZE
+
+
+def test_shared_tiles_are_counted_once(budget):
+    tiled_image = make_tiled_image(0)
+    copy = tiled_image.copy()
+    budget.use(tiled_image)
+    budget.use(copy)
+
+    stats = budget.get_stats()
+    assert stats.resident_size == IMAGE_SIZE
+    assert stats.num_images == 2
+
+
+def test_changed_image_is_accounted_again(budget):
+    tiled_image = make_tiled_image(0)
+    budget.use(tiled_image)
+
+    tiled_image.set_tile(0, 0, None)
+    budget.use(tiled_image)
+
+    assert budget.get_stats().resident_size == IMAGE_SIZE * 3 // 4
+
+
+def test_evictable_image_is_evicted_instead_of_spilled(budget):
+    evicted = []
+    evictable_image = make_tiled_image(0)
+    budget.use(evictable_image, evict=lambda: evicted.append(True) or True)
+    other_images = [make_tiled_image(hue) for hue in (120, 240)]
+    for tiled_image in other_images:
+        budget.use(tiled_image)
+
+    stats = budget.get_stats()
+    assert evicted == [True]
+    assert not evictable_image.is_spilled()
+    assert stats.spilled_size == 0
+    assert stats.num_images == 2
+
+
+def test_image_that_cannot_be_evicted_is_spilled(budget):
+    evictable_image = make_tiled_image(0)
+    budget.use(evictable_image, evict=lambda: False)
+    other_images = [make_tiled_image(hue) for hue in (120, 240)]
+    for tiled_image in other_images:
+        budget.use(tiled_image)
+
+    assert evictable_image.is_spilled()
+    assert budget.get_stats().spilled_size == IMAGE_SIZE
+
+
+def test_painted_images_are_kept_until_end_of_next_pass(budget):
+    images = [make_tiled_image(hue) for hue in (0, 120, 240)]
+
+    # All visible images are over budget, they are only spilled once they are not painted anymore
+    for i in range(2):
+        budget.begin_pass()
+        for tiled_image in images:
+            budget.use(tiled_image)
+        budget.end_pass()
+        assert not any(tiled_image.is_spilled() for tiled_image in images)
+
+    budget.begin_pass()
+    budget.use(images[2])
+    budget.end_pass()
+    budget.begin_pass()
+    budget.use(images[2])
+    budget.end_pass()
+    budget.set_max_resident_size(2 * IMAGE_SIZE)
+
+    assert [tiled_image.is_spilled() for tiled_image in images] == [True, False, False]
+
+
+def test_released_image_is_forgotten(budget):
+    tiled_image = make_tiled_image(0)
+    budget.use(tiled_image)
+
+    del tiled_image
+    gc.collect()
+
+    stats = budget.get_stats()
+    assert stats.num_images == 0
+    assert stats.resident_size == 0
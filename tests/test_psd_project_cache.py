@@ -0,0 +1,82 @@
+import os
+
+from awesome_image_editor.psd_read.cache import PSDProjectCache
+
+
+def write_file(path, data: bytes, mtime_ns: int):
+    path.write_bytes(data)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_key_is_stable_for_unchanged_file(tmp_path):
+    psd_path = tmp_path / "image.psd"
+    write_file(psd_path, b"8BPS" + bytes(100), 1_000_000_000)
+    cache = PSDProjectCache(tmp_path / "cache")
+
+    assert cache.key(str(psd_path)) == cache.key(str(psd_path))
+
+
+def test_key_changes_with_modification_time(tmp_path):
+    psd_path = tmp_path / "image.psd"
+    write_file(psd_path, b"8BPS" + bytes(100), 1_000_000_000)
+    cache = PSDProjectCache(tmp_path / "cache")
+    key = cache.key(str(psd_path))
+
+    os.utime(psd_path, ns=(2_000_000_000, 2_000_000_000))
+    assert cache.key(str(psd_path)) != key
+
+
+def test_key_changes_with_content_of_same_size_and_time(tmp_path):
+    psd_path = tmp_path / "image.psd"
+    write_file(psd_path, b"8BPS" + bytes(100), 1_000_000_000)
+    cache = PSDProjectCache(tmp_path / "cache")
+    key = cache.key(str(psd_path))
+
+    write_file(psd_path, b"8BPS" + bytes(99) + b"\x01", 1_000_000_000)
+    assert cache.key(str(psd_path)) != key
+
+
+def test_key_changes_with_path(tmp_path):
+    data = b"8BPS" + bytes(100)
+    write_file(tmp_path / "a.psd", data, 1_000_000_000)
+    write_file(tmp_path / "b.psd", data, 1_000_000_000)
+    cache = PSDProjectCache(tmp_path / "cache")
+
+    assert cache.key(str(tmp_path / "a.psd")) != cache.key(str(tmp_path / "b.psd"))
+
+
+def test_stored_entry_is_loaded_by_its_key(tmp_path):
+    psd_path = tmp_path / "image.psd"
+    write_file(psd_path, b"8BPS" + bytes(100), 1_000_000_000)
+    cache = PSDProjectCache(tmp_path / "cache")
+    key = cache.key(str(psd_path))
+
+    assert cache.load(key) is None
+    cache.store_async(key, [], str(psd_path)).result()
+    assert cache.load(key) is not None
+
+
+def test_entry_is_not_stored_if_file_changed_during_conversion(tmp_path):
+    psd_path = tmp_path / "image.psd"
+    write_file(psd_path, b"8BPS" + bytes(100), 1_000_000_000)
+    cache = PSDProjectCache(tmp_path / "cache")
+    key = cache.key(str(psd_path))
+
+    write_file(psd_path, b"8BPS" + bytes(200), 2_000_000_000)
+    cache.store_async(key, [], str(psd_path)).result()
+
+    assert cache.load(key) is None
+    assert cache.load(cache.key(str(psd_path))) is None
+
+
+def test_corrupt_entry_is_dropped(tmp_path):
+    psd_path = tmp_path / "image.psd"
+    write_file(psd_path, b"8BPS" + bytes(100), 1_000_000_000)
+    cache = PSDProjectCache(tmp_path / "cache")
+    key = cache.key(str(psd_path))
+    (tmp_path / "cache").mkdir()
+    entry_path = tmp_path / "cache" / (key + ".aie")
+    entry_path.write_bytes(b"not a project")
+
+    assert cache.load(key) is None
+    assert not entry_path.exists()
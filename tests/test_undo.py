@@ -0,0 +1,109 @@
+from PyQt6.QtCore import QPointF
+from PyQt6.QtGui import QColor, QImage, QLinearGradient, QPainter
+
+from awesome_image_editor.filters.gaussian_blur import GaussianBlurFilter
+from awesome_image_editor.model_view.items.image import AIEImageItem
+from awesome_image_editor.model_view.undo import AIEUndoStack, SetPixelsCommand
+from awesome_image_editor.tiled_image import TiledImage
+
+TILE_SIZE = 32
+
+
+def make_image(width: int, height: int, hue: int) -> QImage:
+    image = QImage(width, height, QImage.Format.Format_ARGB32_Premultiplied)
+    gradient = QLinearGradient(QPointF(0, 0), QPointF(width, height))
+    gradient.setColorAt(0, QColor.fromHsv(hue, 255, 255))
+    gradient.setColorAt(1, QColor.fromHsv((hue + 180) % 360, 255, 128))
+    painter = QPainter(image)
+    painter.fillRect(image.rect(), gradient)
+    painter.end()
+    return image
+
+
+def make_item(width: int = 128, height: int = 64) -> AIEImageItem:
+    tiles = TiledImage.from_qimage(make_image(width, height, 0), tile_size=TILE_SIZE)
+    item = AIEImageItem(tiles, "layer")
+    item.setPos(10, 20)
+    return item
+
+
+def edit_one_tile(tiles: TiledImage) -> TiledImage:
+    """Copy of an image with its first tile painted over"""
+    edited_tiles = tiles.copy()
+    tile = QImage(TILE_SIZE, TILE_SIZE, QImage.Format.Format_ARGB32_Premultiplied)
+    tile.fill(QColor(255, 255, 255))
+    tile.setPixelColor(0, 0, QColor(0, 0, 0))
+    edited_tiles.set_tile(0, 0, tile)
+    return edited_tiles
+
+
+def test_undo_redo_restores_pixels():
+    item = make_item()
+    old_image = item.tiles.to_qimage()
+    old_pixels_key = item.get_pixels_key()
+    new_tiles = edit_one_tile(item.tiles)
+    new_image = new_tiles.to_qimage()
+    undo_stack = AIEUndoStack()
+
+    undo_stack.push(SetPixelsCommand(item, new_tiles))
+    assert item.tiles.to_qimage() == new_image
+    new_pixels_key = item.get_pixels_key()
+
+    undo_stack.undo()
+    assert item.tiles.to_qimage() == old_image
+    # Cached outputs computed from the old pixels stay valid
+    assert item.get_pixels_key() == old_pixels_key
+
+    undo_stack.redo()
+    assert item.tiles.to_qimage() == new_image
+    assert item.get_pixels_key() == new_pixels_key
+
+
+def test_undo_redo_restores_size_position_and_filters():
+    item = make_item()
+    item.set_filters((GaussianBlurFilter(5.0),))
+    new_tiles = TiledImage.from_qimage(make_image(200, 100, 90), tile_size=TILE_SIZE)
+    new_image = new_tiles.to_qimage()
+    undo_stack = AIEUndoStack()
+
+    undo_stack.push(SetPixelsCommand(item, new_tiles, QPointF(-5, -5), ()))
+    assert item.get_pixels_size().width() == 200
+    assert item.pos() == QPointF(-5, -5)
+    assert item.get_filters() == ()
+
+    undo_stack.undo()
+    assert item.get_pixels_size().width() == 128
+    assert item.get_pixels_size().height() == 64
+    assert item.pos() == QPointF(10, 20)
+    assert item.get_filters() == (GaussianBlurFilter(5.0),)
+
+    undo_stack.redo()
+    assert item.tiles.to_qimage() == new_image
+    assert item.pos() == QPointF(-5, -5)
+    assert item.get_filters() == ()
+
+
+def test_only_changed_tiles_are_recorded():
+    item = make_item()
+    one_tile_command = SetPixelsCommand(item, edit_one_tile(item.tiles))
+    all_tiles_command = SetPixelsCommand(
+        item, TiledImage.from_qimage(make_image(128, 64, 90), tile_size=TILE_SIZE)
+    )
+
+    assert 0 < one_tile_command.get_size() < all_tiles_command.get_size() / 4
+
+
+def test_undo_redo_with_spilled_history():
+    item = make_item()
+    old_image = item.tiles.to_qimage()
+    new_tiles = edit_one_tile(item.tiles)
+    new_image = new_tiles.to_qimage()
+    undo_stack = AIEUndoStack(max_history_size=0)
+
+    undo_stack.push(SetPixelsCommand(item, new_tiles))
+    assert undo_stack.get_history_size() == 0
+
+    undo_stack.undo()
+    assert item.tiles.to_qimage() == old_image
+    undo_stack.redo()
+    assert item.tiles.to_qimage() == new_image